@@ -0,0 +1,234 @@
+'''Macro benchmarks for rogalik: map generation, FOV, AI turns, rendering and pathfinding.
+
+Every run uses fixed seeds, so the same arguments always play out the same games. Results are
+printed per phase together with a throughput figure, and compared against the last saved baseline:
+
+	python bench.py                                #run, compare with bench_baseline.json
+	python bench.py --save                         #...and make these results the new baseline
+	python bench.py --sizes 80x43,400x400 --monsters 0,500
+
+A phase whose throughput dropped by more than --threshold is flagged as a regression and the
+exit status is 1.
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from timeit import default_timer as timer
+
+import libtcodpy as libtcod
+import rogalik
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+DEFAULT_SEEDS = '1,2,3'
+DEFAULT_SIZES = '80x43,200x200'
+DEFAULT_MONSTERS = '0,200'
+#dense enough that bigger maps aren't just empty rock
+ROOMS_PER_CELL = float(rogalik.MAX_ROOMS) / (rogalik.MAP_WIDTH * rogalik.MAP_HEIGHT)
+
+#what the random walker does, see play()
+WALK = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+def new_game(seed, width, height, monsters, renderer = None):
+	max_rooms = max(rogalik.MAX_ROOMS, int(ROOMS_PER_CELL * width * height))
+	game = rogalik.Game(renderer, seed, width, height, max_rooms)
+	add_monsters(game, monsters)
+	#nobody wants a benchmark that stops when the player dies
+	game.player.fighter.max_hp = game.player.fighter.hp = 10 ** 9
+	return game
+
+def add_monsters(game, count):
+	#extra kobolds on random free floor tiles, on top of what make_map placed
+	placed = 0
+	tries = 0
+	while placed < count and tries < count * 100:
+		tries += 1
+		x = libtcod.random_get_int(game.rng, 0, game.map.width - 1)
+		y = libtcod.random_get_int(game.rng, 0, game.map.height - 1)
+		if not rogalik.is_blocked(x, y):
+			monster = rogalik.Object(x, y, 'k', 'kobold', libtcod.dark_blue, True, fighter=rogalik.Fighter(10,0,3), ai=rogalik.BasicMelee())
+			rogalik.add_object(monster)
+			placed += 1
+
+def play(game, turns, renderer = None):
+	'''Random walk for a number of turns. Returns the time spent in step() and in rendering.'''
+	step_time = 0.0
+	render_time = 0.0
+	for turn in range(turns):
+		dx, dy = WALK[libtcod.random_get_int(game.rng, 0, len(WALK) - 1)]
+		start = timer()
+		game.step(('move', dx, dy))
+		step_time += timer() - start
+		if renderer is not None:
+			start = timer()
+			renderer.render()
+			render_time += timer() - start
+	return step_time, render_time
+
+#each phase takes (seed, width, height, monsters, reps) and returns (seconds, units done)
+
+def phase_mapgen(seed, width, height, monsters, reps):
+	#whole Game construction: make_map, placing monsters and the initial FOV sync
+	elapsed = 0.0
+	for rep in range(reps):
+		start = timer()
+		game = new_game(seed + rep, width, height, monsters)
+		elapsed += timer() - start
+		game.close()
+	return elapsed, reps
+
+def phase_fov_sync(seed, width, height, monsters, reps):
+	game = new_game(seed, width, height, monsters)
+	start = timer()
+	for rep in range(reps):
+		rogalik.update_fovmap(full = True)
+	elapsed = timer() - start
+	game.close()
+	return elapsed, reps
+
+def phase_fov(seed, width, height, monsters, reps):
+	game = new_game(seed, width, height, monsters)
+	play(game, 5)
+	start = timer()
+	for rep in range(reps * 10):
+		game.compute_fov()
+	elapsed = timer() - start
+	game.close()
+	return elapsed, reps * 10
+
+def phase_ai(seed, width, height, monsters, reps):
+	#the player stands still, so this is the cost of one AI turn for whatever the scheduler has awake
+	game = new_game(seed, width, height, monsters)
+	start = timer()
+	for rep in range(reps * 10):
+		game.step(('wait',))
+	elapsed = timer() - start
+	game.close()
+	return elapsed, reps * 10
+
+def phase_turns(seed, width, height, monsters, reps):
+	game = new_game(seed, width, height, monsters)
+	elapsed, render_time = play(game, reps * 10)
+	game.close()
+	return elapsed, reps * 10
+
+def phase_render(seed, width, height, monsters, reps):
+	#a full frame into an offscreen console after each step, without a window or frame limiter
+	renderer = rogalik.ConsoleRenderer(window = False)
+	game = new_game(seed, width, height, monsters, renderer)
+	renderer.render()
+	step_time, elapsed = play(game, reps * 10, renderer)
+	game.close()
+	return elapsed, reps * 10
+
+def phase_path(seed, width, height, monsters, reps):
+	#hierarchical paths between random rooms; building the room graph happens before the clock starts
+	game = new_game(seed, width, height, monsters)
+	graph = game.room_graph
+	graph.build()
+	rooms = game.rooms
+	start = timer()
+	for rep in range(reps * 10):
+		(x1, y1) = rooms[libtcod.random_get_int(game.rng, 0, len(rooms) - 1)].center()
+		(x2, y2) = rooms[libtcod.random_get_int(game.rng, 0, len(rooms) - 1)].center()
+		graph.find_path(x1, y1, x2, y2)
+	elapsed = timer() - start
+	game.close()
+	return elapsed, reps * 10
+
+PHASES = [
+	('mapgen', phase_mapgen, 'maps/s'),
+	('fov_sync', phase_fov_sync, 'syncs/s'),
+	('fov', phase_fov, 'fovs/s'),
+	('ai_turn', phase_ai, 'turns/s'),
+	('turns', phase_turns, 'turns/s'),
+	('render', phase_render, 'frames/s'),
+	('path', phase_path, 'paths/s'),
+	]
+
+def run(seeds, sizes, monster_counts, reps, phases):
+	results = {}
+	for (width, height) in sizes:
+		for monsters in monster_counts:
+			for (name, function, unit) in PHASES:
+				if phases and name not in phases:
+					continue
+				key = '{0} {1}x{2} m{3}'.format(name, width, height, monsters)
+				seconds = 0.0
+				done = 0
+				for seed in seeds:
+					(elapsed, count) = function(seed, width, height, monsters, reps)
+					seconds += elapsed
+					done += count
+				rate = done / seconds if seconds > 0 else 0.0
+				results[key] = {'seconds': seconds, 'count': done, 'rate': rate, 'unit': unit}
+				print('{0:<32} {1:>10.4f}s {2:>12.1f} {3}'.format(key, seconds, rate, unit))
+				sys.stdout.flush()
+	return results
+
+def compare(results, baseline, threshold):
+	'''Prints the change against the baseline for every phase they share, returns the regressed ones.'''
+	regressions = []
+	old = baseline.get('results', {})
+	for key in sorted(results):
+		if key not in old or old[key]['rate'] <= 0:
+			continue
+		change = results[key]['rate'] / old[key]['rate'] - 1.0
+		flag = ''
+		if change < -threshold:
+			flag = '  REGRESSION'
+			regressions.append(key)
+		print('{0:<32} {1:>+8.1%}{2}'.format(key, change, flag))
+	return regressions
+
+def parse_sizes(text):
+	sizes = []
+	for size in text.split(','):
+		(width, height) = size.lower().split('x')
+		sizes.append((int(width), int(height)))
+	return sizes
+
+def parse_ints(text):
+	return [int(n) for n in text.split(',')]
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = 'Benchmark map generation, FOV, AI turns, rendering and pathfinding.')
+	parser.add_argument('--seeds', default = DEFAULT_SEEDS, help = 'comma separated seeds (default %(default)s)')
+	parser.add_argument('--sizes', default = DEFAULT_SIZES, help = 'comma separated WxH map sizes (default %(default)s)')
+	parser.add_argument('--monsters', default = DEFAULT_MONSTERS, help = 'comma separated extra monster counts (default %(default)s)')
+	parser.add_argument('--reps', type = int, default = 5, help = 'repetitions per seed, some phases do ten times as many (default %(default)s)')
+	parser.add_argument('--phases', default = '', help = 'comma separated subset of: ' + ', '.join(name for (name, function, unit) in PHASES))
+	parser.add_argument('--baseline', default = DEFAULT_BASELINE, help = 'baseline JSON file (default %(default)s)')
+	parser.add_argument('--save', action = 'store_true', help = 'store the results as the new baseline')
+	parser.add_argument('--threshold', type = float, default = 0.1, help = 'throughput drop that counts as a regression (default %(default)s)')
+	args = parser.parse_args(argv)
+
+	phases = [name for name in args.phases.split(',') if name]
+	results = run(parse_ints(args.seeds), parse_sizes(args.sizes), parse_ints(args.monsters), args.reps, phases)
+
+	regressions = []
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		print('\ncompared with {0} ({1}):'.format(args.baseline, baseline.get('created', 'unknown date')))
+		regressions = compare(results, baseline, args.threshold)
+
+	if args.save:
+		baseline = {
+			'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+			'python': sys.version.split()[0],
+			'args': vars(args),
+			'results': results,
+			}
+		with open(args.baseline, 'w') as f:
+			json.dump(baseline, f, indent = 1, sort_keys = True)
+		print('\nsaved baseline to {0}'.format(args.baseline))
+
+	if regressions:
+		print('\n{0} regression(s): {1}'.format(len(regressions), ', '.join(regressions)))
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
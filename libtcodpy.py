@@ -25,9 +25,13 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+import os
 import sys
 import ctypes
 import struct
+import operator
+from array import array
+from itertools import imap, repeat
 from ctypes import *
 
 if not hasattr(ctypes, "c_bool"):   # for Python < 2.6
@@ -39,25 +43,37 @@ try:  #import NumPy if available
 except ImportError:
     numpy_available = False
 
+class _Library(CDLL):
+    # declares each function's prototype (see _PROTOTYPES at the end of this file) the first time
+    # it is looked up, so the parts of libtcod a program never calls cost nothing on import.
+    # Functions looked up before the table is filled in get theirs from _setup_prototypes.
+    _prototypes = {}
+
+    def __getattr__(self, name):
+        function = CDLL.__getattr__(self, name)
+        if name in self._prototypes:
+            _declare_prototype(name, function)
+        return function
+
 LINUX=False
 MAC=False
 MINGW=False
 MSVC=False
 if sys.platform.find('linux') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
+    _lib = _Library('./libtcod.so')
     LINUX=True
 elif sys.platform.find('darwin') != -1:
-    _lib = ctypes.cdll['./libtcod.dylib']
+    _lib = _Library('./libtcod.dylib')
     MAC = True
 elif sys.platform.find('haiku') != -1:
-    _lib = ctypes.cdll['./libtcod.so']
+    _lib = _Library('./libtcod.so')
     HAIKU = True
 else:
     try:
-        _lib = ctypes.cdll['./libtcod-mingw.dll']
+        _lib = _Library('./libtcod-mingw.dll')
         MINGW=True
     except WindowsError:
-        _lib = ctypes.cdll['./libtcod-VS.dll']
+        _lib = _Library('./libtcod-VS.dll')
         MSVC=True
     # On Windows, ctypes doesn't work well with function returning structs,
     # so we have to user the _wrapper functions instead
@@ -91,6 +107,9 @@ class Color(Structure):
     def __eq__(self, c):
         return _lib.TCOD_color_equals(self, c)
 
+    def __ne__(self, c):
+        return not _lib.TCOD_color_equals(self, c)
+
     def __mul__(self, c):
         if isinstance(c,Color):
             return _lib.TCOD_color_multiply(self, c)
@@ -118,21 +137,40 @@ class Color(Structure):
         else:
             setattr(self, "rgb"[i], c)
 
+    def __setattr__(self, name, value):
+        Structure.__setattr__(self, name, value)
+        # the copy the cffi backend keeps (see _cffi_color) is out of date now
+        self.__dict__.pop('_cdata', None)
+
     def __iter__(self):
         yield self.r
         yield self.g
         yield self.b
 
+# _new_color(_pack_rgb(r, g, b)) is a new Color from channels already in 0..255, made without
+# going through __setattr__ for each of them
+_pack_rgb = struct.Struct('BBB').pack
+_new_color = Color.from_buffer_copy
+
+# channel sums and differences clamped to 0..255 like TCOD_color_add and TCOD_color_subtract,
+# indexed by the sum or the difference: negative differences wrap round to the zeros at the end
+_ADDED = range(256) + [255] * 255
+_SUBTRACTED = range(256) + [0] * 256
+
+# libtcod turns its single precision color math into ints the way C on x86 does: anything that
+# isn't a number or doesn't fit in 32 bits comes out as INT_MIN, which then clamps or masks to 0
+_INT_MIN = -2 ** 31
+
+def _int32(x):
+    if _INT_MIN <= x < 2 ** 31:
+        return int(x)
+    return _INT_MIN
+
 # Should be valid on any platform, check it!  Has to be done after Color is defined.
 if MAC:
     from cprotos import setup_protos
     setup_protos(_lib)
 
-_lib.TCOD_color_equals.restype = c_bool
-_lib.TCOD_color_multiply.restype = Color
-_lib.TCOD_color_multiply_scalar.restype = Color
-_lib.TCOD_color_add.restype = Color
-_lib.TCOD_color_subtract.restype = Color
 
 # default colors
 # grey levels
@@ -356,13 +394,14 @@ silver=Color(203,203,203)
 celadon=Color(172,255,175)
 peach=Color(255,159,127)
 
+
 # color functions
-_lib.TCOD_color_lerp.restype = Color
 def color_lerp(c1, c2, a):
     return _lib.TCOD_color_lerp(c1, c2, c_float(a))
 
 def color_set_hsv(c, h, s, v):
     _lib.TCOD_color_set_HSV(byref(c), c_float(h), c_float(s), c_float(v))
+    c.__dict__.pop('_cdata', None)
 
 def color_get_hsv(c):
     h = c_float()
@@ -373,6 +412,7 @@ def color_get_hsv(c):
 
 def color_scale_HSV(c, scoef, vcoef) :
     _lib.TCOD_color_scale_HSV(byref(c),c_float(scoef),c_float(vcoef))
+    c.__dict__.pop('_cdata', None)
 
 def color_gen_map(colors, indexes):
     ccolors = (Color * len(colors))(*colors)
@@ -381,6 +421,76 @@ def color_gen_map(colors, indexes):
     _lib.TCOD_color_gen_map(cres, len(colors), ccolors, cindexes)
     return cres
 
+class ColorGradient:
+    # a color_gen_map kept as a tuple of channel values for each of r, g and b. gradient[i] is the
+    # Color at level i; lookup(levels) takes a whole sequence of levels (a light map, say) to its
+    # colors at once, as array('i')s of r, g and b like the layers of an ArrayConsoleBuffer.
+    def __init__(self, colors, indexes):
+        rgb = bytearray(buffer(color_gen_map(colors, indexes)))
+        self.r = tuple(rgb[0::3])
+        self.g = tuple(rgb[1::3])
+        self.b = tuple(rgb[2::3])
+
+    def __len__(self):
+        return len(self.r)
+
+    def __getitem__(self, i):
+        return _new_color(_pack_rgb(self.r[i], self.g[i], self.b[i]))
+
+    def lookup(self, levels):
+        return (array('i', imap(self.r.__getitem__, levels)),
+                array('i', imap(self.g.__getitem__, levels)),
+                array('i', imap(self.b.__getitem__, levels)))
+
+_gradients = {}
+
+def color_gradient(colors, indexes):
+    # the ColorGradient of color_gen_map(colors, indexes), made the first time it's asked for and
+    # kept, so a renderer can ask for the gradients it needs every frame
+    key = (tuple(tuple(c) for c in colors), tuple(indexes))
+    gradient = _gradients.get(key)
+    if gradient is None:
+        if len(_gradients) >= 256:
+            # something keeps making new ones, don't hold on to all of them
+            _gradients.clear()
+        gradient = _gradients[key] = ColorGradient(colors, indexes)
+    return gradient
+
+# Whole arrays of colors at once. These take one channel (all the r, all the g or all the b values)
+# of one or two arrays of colors of the same length, as sequences of 0..255, and return the result
+# as an array('i') like the layers of an ArrayConsoleBuffer. Each element comes out as it would
+# from the Color operator or color_lerp (single precision, truncated and clamped the same way),
+# without a python call per element.
+def color_add_channels(a, b):
+    return array('i', imap(_ADDED.__getitem__, imap(operator.add, a, b)))
+
+def color_subtract_channels(a, b):
+    return array('i', imap(_SUBTRACTED.__getitem__, imap(operator.sub, a, b)))
+
+def color_multiply_channels(a, b):
+    return array('i', imap(operator.floordiv, imap(operator.mul, a, b), repeat(255)))
+
+def color_scale_channels(a, value):
+    # every element times the number value, brightening or darkening a layer
+    value = c_float(value).value
+    table = [min(255, max(0, _int32(x))) for x in array('f', [i * value for i in range(256)])]
+    return array('i', imap(table.__getitem__, a))
+
+def color_lerp_channels(a, b, coef):
+    # coef is a number, or a sequence of them with one for each element
+    if isinstance(coef, (int, long, float)):
+        coefs = repeat(c_float(coef).value)
+    else:
+        coefs = array('f', coef)
+    steps = array('f', imap(operator.mul, imap(operator.sub, b, a), coefs))
+    values = array('f', imap(operator.add, a, steps))
+    if all(imap(operator.lt, imap(abs, values), repeat(2.0 ** 31))):
+        ints = imap(int, values)
+    else:
+        # huge or not a number somewhere (abs(nan) isn't less than anything)
+        ints = imap(_int32, values)
+    return array('i', imap(operator.and_, ints, repeat(0xff)))
+
 ############################
 # console module
 ############################
@@ -464,8 +574,6 @@ class ConsoleBuffer:
             console_get_height(dest) != self.height):
             raise ValueError('ConsoleBuffer.blit: Destination console has an incorrect size.')
 
-        s = struct.Struct('%di' % len(self.back_r))
-
         if fill_back:
             _lib.TCOD_console_fill_background(dest, (c_int * len(self.back_r))(*self.back_r), (c_int * len(self.back_g))(*self.back_g), (c_int * len(self.back_b))(*self.back_b))
 
@@ -473,15 +581,137 @@ class ConsoleBuffer:
             _lib.TCOD_console_fill_foreground(dest, (c_int * len(self.fore_r))(*self.fore_r), (c_int * len(self.fore_g))(*self.fore_g), (c_int * len(self.fore_b))(*self.fore_b))
             _lib.TCOD_console_fill_char(dest, (c_int * len(self.char))(*self.char))
 
-_lib.TCOD_console_credits_render.restype = c_bool
-_lib.TCOD_console_is_fullscreen.restype = c_bool
-_lib.TCOD_console_is_window_closed.restype = c_bool
-_lib.TCOD_console_get_default_background.restype = Color
-_lib.TCOD_console_get_default_foreground.restype = Color
-_lib.TCOD_console_get_char_background.restype = Color
-_lib.TCOD_console_get_char_foreground.restype = Color
-_lib.TCOD_console_get_fading_color.restype = Color
-_lib.TCOD_console_is_key_pressed.restype = c_bool
+class ArrayConsoleBuffer:
+    # a ConsoleBuffer kept in array('i')s instead of lists. blit() hands libtcod pointers to the
+    # arrays themselves, so nothing is copied on the way; rectangles are filled a row slice at a
+    # time; and copy() is copy-on-write, the two buffers share their arrays until one of them writes.
+    _LAYERS = ('back_r', 'back_g', 'back_b', 'fore_r', 'fore_g', 'fore_b', 'char')
+
+    def __init__(self, width, height, back_r=0, back_g=0, back_b=0, fore_r=0, fore_g=0, fore_b=0, char=' '):
+        self.width = width
+        self.height = height
+        self.clear(back_r, back_g, back_b, fore_r, fore_g, fore_b, char)
+
+    def clear(self, back_r=0, back_g=0, back_b=0, fore_r=0, fore_g=0, fore_b=0, char=' '):
+        # fresh arrays, so whatever shared the old ones keeps them
+        n = self.width * self.height
+        self.back_r = array('i', [back_r]) * n
+        self.back_g = array('i', [back_g]) * n
+        self.back_b = array('i', [back_b]) * n
+        self.fore_r = array('i', [fore_r]) * n
+        self.fore_g = array('i', [fore_g]) * n
+        self.fore_b = array('i', [fore_b]) * n
+        self.char = array('i', [ord(char)]) * n
+        self.shared = False
+
+    def copy(self):
+        # a snapshot of this buffer. it costs nothing until either of them is written to, then the
+        # one written to copies its arrays (a memcpy each).
+        other = ArrayConsoleBuffer(0, 0)
+        other.width = self.width
+        other.height = self.height
+        for name in self._LAYERS:
+            setattr(other, name, getattr(self, name))
+        self.shared = other.shared = True
+        return other
+
+    def _unshare(self):
+        for name in self._LAYERS:
+            setattr(self, name, getattr(self, name)[:])
+        self.shared = False
+
+    def set_fore(self, x, y, r, g, b, char):
+        # set the character and foreground color of one cell.
+        if self.shared:
+            self._unshare()
+        i = self.width * y + x
+        self.fore_r[i] = r
+        self.fore_g[i] = g
+        self.fore_b[i] = b
+        self.char[i] = ord(char)
+
+    def set_back(self, x, y, r, g, b):
+        # set the background color of one cell.
+        if self.shared:
+            self._unshare()
+        i = self.width * y + x
+        self.back_r[i] = r
+        self.back_g[i] = g
+        self.back_b[i] = b
+
+    def set(self, x, y, back_r, back_g, back_b, fore_r, fore_g, fore_b, char):
+        # set the background color, foreground color and character of one cell.
+        if self.shared:
+            self._unshare()
+        i = self.width * y + x
+        self.back_r[i] = back_r
+        self.back_g[i] = back_g
+        self.back_b[i] = back_b
+        self.fore_r[i] = fore_r
+        self.fore_g[i] = fore_g
+        self.fore_b[i] = fore_b
+        self.char[i] = ord(char)
+
+    def fill_rect(self, x, y, w, h, back=None, fore=None, char=None):
+        # fill a rectangle, clipped to the buffer. back and fore are (r, g, b) tuples, char a
+        # string; whatever is None is left alone. a fill that changes nothing leaves a copy shared.
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(self.width, x + w), min(self.height, y + h)
+        if x1 >= x2 or y1 >= y2 or (back is None and fore is None and char is None):
+            return
+        if self.shared:
+            self._unshare()
+        fills = []
+        if back is not None:
+            fills.extend(zip((self.back_r, self.back_g, self.back_b), back))
+        if fore is not None:
+            fills.extend(zip((self.fore_r, self.fore_g, self.fore_b), fore))
+        if char is not None:
+            fills.append((self.char, ord(char)))
+        for (layer, value) in fills:
+            row = array('i', [value]) * (x2 - x1)
+            for cy in range(y1, y2):
+                i = cy * self.width + x1
+                layer[i:i + x2 - x1] = row
+
+    def set_rect(self, x, y, w, h, back=None, fore=None, char=None):
+        # copy whole rectangles of values in. back and fore are (r, g, b) tuples of sequences, char
+        # one of character codes, each w*h long, row by row; whatever is None is left alone. the
+        # rectangle has to lie inside the buffer.
+        if x < 0 or y < 0 or w < 0 or h < 0 or x + w > self.width or y + h > self.height:
+            raise ValueError('ArrayConsoleBuffer.set_rect: Rectangle is outside the buffer.')
+        if self.shared:
+            self._unshare()
+        copies = []
+        if back is not None:
+            copies.extend(zip((self.back_r, self.back_g, self.back_b), back))
+        if fore is not None:
+            copies.extend(zip((self.fore_r, self.fore_g, self.fore_b), fore))
+        if char is not None:
+            copies.append((self.char, char))
+        for (layer, values) in copies:
+            if not isinstance(values, array):
+                values = array('i', values)
+            for row in range(h):
+                i = (y + row) * self.width + x
+                layer[i:i + w] = values[row * w:(row + 1) * w]
+
+    def _pointer(self, layer):
+        return cast(layer.buffer_info()[0], POINTER(c_int))
+
+    def blit(self, dest, fill_fore=True, fill_back=True):
+        # write the whole buffer to a console with libtcod's "fill" functions, straight from the arrays.
+        if (console_get_width(dest) != self.width or
+            console_get_height(dest) != self.height):
+            raise ValueError('ArrayConsoleBuffer.blit: Destination console has an incorrect size.')
+
+        if fill_back:
+            _lib.TCOD_console_fill_background(dest, self._pointer(self.back_r), self._pointer(self.back_g), self._pointer(self.back_b))
+
+        if fill_fore:
+            _lib.TCOD_console_fill_foreground(dest, self._pointer(self.fore_r), self._pointer(self.fore_g), self._pointer(self.fore_b))
+            _lib.TCOD_console_fill_char(dest, self._pointer(self.char))
+
 
 # background rendering modes
 BKGND_NONE = 0
@@ -730,7 +960,7 @@ def console_is_fullscreen():
     return _lib.TCOD_console_is_fullscreen()
 
 def console_set_fullscreen(fullscreen):
-    _lib.TCOD_console_set_fullscreen(c_int(fullscreen))
+    _lib.TCOD_console_set_fullscreen(fullscreen)
 
 def console_is_window_closed():
     return _lib.TCOD_console_is_window_closed()
@@ -745,17 +975,16 @@ def console_credits_reset():
     _lib.TCOD_console_credits_reset()
 
 def console_credits_render(x, y, alpha):
-    return _lib.TCOD_console_credits_render(x, y, c_int(alpha))
+    return _lib.TCOD_console_credits_render(x, y, alpha)
 
 def console_flush():
     _lib.TCOD_console_flush()
 
 # drawing on a console
-def console_set_default_background(con, col):
-    _lib.TCOD_console_set_default_background(con, col)
-
-def console_set_default_foreground(con, col):
-    _lib.TCOD_console_set_default_foreground(con, col)
+# the calls made for every cell or every object drawn go straight to the library, without a
+# python function around them (see _FAST_CALLS at the end of this file)
+console_set_default_background = _lib.TCOD_console_set_default_background
+console_set_default_foreground = _lib.TCOD_console_set_default_foreground
 
 def console_clear(con):
     return _lib.TCOD_console_clear(con)
@@ -768,15 +997,13 @@ def console_put_char(con, x, y, c, flag=BKGND_DEFAULT):
 
 def console_put_char_ex(con, x, y, c, fore, back):
     if type(c) == str or type(c) == bytes:
-        _lib.TCOD_console_put_char_ex(con, x, y, ord(c), fore, back)
-    else:
-        _lib.TCOD_console_put_char_ex(con, x, y, c, fore, back)
+        c = ord(c)
+    _lib.TCOD_console_put_char_ex(con, x, y, c, fore, back)
 
 def console_set_char_background(con, x, y, col, flag=BKGND_SET):
     _lib.TCOD_console_set_char_background(con, x, y, col, flag)
 
-def console_set_char_foreground(con, x, y, col):
-    _lib.TCOD_console_set_char_foreground(con, x, y, col)
+console_set_char_foreground = _lib.TCOD_console_set_char_foreground
 
 def console_set_char(con, x, y, c):
     if type(c) == str or type(c) == bytes:
@@ -827,7 +1054,7 @@ def console_get_height_rect(con, x, y, w, h, fmt):
         return _lib.TCOD_console_get_height_rect_utf(c_void_p(con), x, y, w, h, fmt)
 
 def console_rect(con, x, y, w, h, clr, flag=BKGND_DEFAULT):
-    _lib.TCOD_console_rect(con, x, y, w, h, c_int(clr), flag)
+    _lib.TCOD_console_rect(con, x, y, w, h, clr, flag)
 
 def console_hline(con, x, y, l, flag=BKGND_DEFAULT):
     _lib.TCOD_console_hline( con, x, y, l, flag)
@@ -836,7 +1063,7 @@ def console_vline(con, x, y, l, flag=BKGND_DEFAULT):
     _lib.TCOD_console_vline( con, x, y, l, flag)
 
 def console_print_frame(con, x, y, w, h, clear=True, flag=BKGND_DEFAULT, fmt=0):
-    _lib.TCOD_console_print_frame(c_void_p(con), x, y, w, h, c_int(clear), flag, c_char_p(fmt))
+    _lib.TCOD_console_print_frame(c_void_p(con), x, y, w, h, clear, flag, c_char_p(fmt))
 
 def console_set_color_control(con,fore,back) :
     _lib.TCOD_console_set_color_control(con,fore,back)
@@ -847,21 +1074,16 @@ def console_get_default_background(con):
 def console_get_default_foreground(con):
     return _lib.TCOD_console_get_default_foreground(con)
 
-def console_get_char_background(con, x, y):
-    return _lib.TCOD_console_get_char_background(con, x, y)
-
-def console_get_char_foreground(con, x, y):
-    return _lib.TCOD_console_get_char_foreground(con, x, y)
-
-def console_get_char(con, x, y):
-    return _lib.TCOD_console_get_char(con, x, y)
+console_get_char_background = _lib.TCOD_console_get_char_background
+console_get_char_foreground = _lib.TCOD_console_get_char_foreground
+console_get_char = _lib.TCOD_console_get_char
 
 def console_set_fade(fade, fadingColor):
     _lib.TCOD_console_set_fade(fade, fadingColor)
     ##_lib.TCOD_console_set_fade_wrapper(fade, fadingColor)
 
 def console_get_fade():
-    return _lib.TCOD_console_get_fade().value
+    return _lib.TCOD_console_get_fade()
 
 def console_get_fading_color():
     return _lib.TCOD_console_get_fading_color()
@@ -972,8 +1194,6 @@ def console_save_apf(con, filename) :
 ############################
 # sys module
 ############################
-_lib.TCOD_sys_get_last_frame_length.restype = c_float
-_lib.TCOD_sys_elapsed_seconds.restype = c_float
 
 # high precision time functions
 def sys_set_fps(fps):
@@ -1049,9 +1269,6 @@ def sys_wait_for_event(mask,k,m,flush) :
 ############################
 # line module
 ############################
-_lib.TCOD_line_step.restype = c_bool
-_lib.TCOD_line.restype=c_bool
-_lib.TCOD_line_step_mt.restype = c_bool
 
 def line_init(xo, yo, xd, yd):
     _lib.TCOD_line_init(xo, yo, xd, yd)
@@ -1082,9 +1299,6 @@ def line_iter(xo, yo, xd, yd):
 ############################
 # image module
 ############################
-_lib.TCOD_image_is_pixel_transparent.restype = c_bool
-_lib.TCOD_image_get_pixel.restype = Color
-_lib.TCOD_image_get_mipmap_pixel.restype = Color
 
 def image_new(width, height):
     return _lib.TCOD_image_new(width, height)
@@ -1179,10 +1393,9 @@ class Mouse(Structure):
               ('wheel_down', c_bool),
               ]
 
-_lib.TCOD_mouse_is_cursor_visible.restype = c_bool
 
 def mouse_show_cursor(visible):
-    _lib.TCOD_mouse_show_cursor(c_int(visible))
+    _lib.TCOD_mouse_show_cursor(visible)
 
 def mouse_is_cursor_visible():
     return _lib.TCOD_mouse_is_cursor_visible()
@@ -1198,12 +1411,6 @@ def mouse_get_status():
 ############################
 # parser module
 ############################
-_lib.TCOD_struct_get_name.restype = c_char_p
-_lib.TCOD_struct_is_mandatory.restype = c_bool
-_lib.TCOD_parser_get_bool_property.restype = c_bool
-_lib.TCOD_parser_get_float_property.restype = c_float
-_lib.TCOD_parser_get_string_property.restype = c_char_p
-_lib.TCOD_parser_get_color_property.restype = Color
 
 class Dice(Structure):
     _fields_=[('nb_dices', c_int),
@@ -1391,8 +1598,6 @@ def parser_get_list_property(parser, name, typ):
 ############################
 # random module
 ############################
-_lib.TCOD_random_get_float.restype = c_float
-_lib.TCOD_random_get_double.restype = c_double
 
 RNG_MT = 0
 RNG_CMWC = 1
@@ -1415,8 +1620,7 @@ def random_new_from_seed(seed, algo=RNG_CMWC):
 def random_set_distribution(rnd, dist) :
 	_lib.TCOD_random_set_distribution(rnd, dist)
 
-def random_get_int(rnd, mi, ma):
-    return _lib.TCOD_random_get_int(rnd, mi, ma)
+random_get_int = _lib.TCOD_random_get_int
 
 def random_get_float(rnd, mi, ma):
     return _lib.TCOD_random_get_float(rnd, c_float(mi), c_float(ma))
@@ -1445,12 +1649,6 @@ def random_delete(rnd):
 ############################
 # noise module
 ############################
-_lib.TCOD_noise_get.restype = c_float
-_lib.TCOD_noise_get_ex.restype = c_float
-_lib.TCOD_noise_get_fbm.restype = c_float
-_lib.TCOD_noise_get_fbm_ex.restype = c_float
-_lib.TCOD_noise_get_turbulence.restype = c_float
-_lib.TCOD_noise_get_turbulence_ex.restype = c_float
 
 NOISE_DEFAULT_HURST = 0.5
 NOISE_DEFAULT_LACUNARITY = 2.0
@@ -1488,9 +1686,6 @@ def noise_delete(n):
 ############################
 # fov module
 ############################
-_lib.TCOD_map_is_in_fov.restype = c_bool
-_lib.TCOD_map_is_transparent.restype = c_bool
-_lib.TCOD_map_is_walkable.restype = c_bool
 
 FOV_BASIC = 0
 FOV_DIAMOND = 1
@@ -1516,23 +1711,20 @@ def map_new(w, h):
 def map_copy(source, dest):
     return _lib.TCOD_map_copy(source, dest)
 
+# like the console calls above, these run once per cell. the flags go through bool(): the library
+# keeps them in one bit, where 2 or a string would come out false or at random
 def map_set_properties(m, x, y, isTrans, isWalk):
-    _lib.TCOD_map_set_properties(m, x, y, c_int(isTrans), c_int(isWalk))
+    _lib.TCOD_map_set_properties(m, x, y, bool(isTrans), bool(isWalk))
 
 def map_clear(m,walkable=False,transparent=False):
-    _lib.TCOD_map_clear(m,c_int(walkable),c_int(transparent))
+    _lib.TCOD_map_clear(m,walkable,transparent)
 
 def map_compute_fov(m, x, y, radius=0, light_walls=True, algo=FOV_RESTRICTIVE ):
     _lib.TCOD_map_compute_fov(m, x, y, c_int(radius), c_bool(light_walls), c_int(algo))
 
-def map_is_in_fov(m, x, y):
-    return _lib.TCOD_map_is_in_fov(m, x, y)
-
-def map_is_transparent(m, x, y):
-    return _lib.TCOD_map_is_transparent(m, x, y)
-
-def map_is_walkable(m, x, y):
-    return _lib.TCOD_map_is_walkable(m, x, y)
+map_is_in_fov = _lib.TCOD_map_is_in_fov
+map_is_transparent = _lib.TCOD_map_is_transparent
+map_is_walkable = _lib.TCOD_map_is_walkable
 
 def map_delete(m):
     return _lib.TCOD_map_delete(m)
@@ -1543,12 +1735,140 @@ def map_get_width(map):
 def map_get_height(map):
     return _lib.TCOD_map_get_height(map)
 
+# bulk map access
+# libtcod has no bulk calls for maps, but a map is a plain map_t struct pointing to one cell_t per
+# cell, so whole layers can be copied in and out of it in one go. How the three flags are laid out
+# in a cell depends on how libtcod was built, so _map_layout() tries it out on a scratch map once.
+# If it finds something it doesn't know, the functions below fall back to one call per cell.
+class _MapStruct(Structure):
+    _fields_ = [('width', c_int),
+                ('height', c_int),
+                ('nbcells', c_int),
+                ('cells', c_void_p),
+               ]
+
+_MAP_TRANSPARENT = 0
+_MAP_WALKABLE = 1
+_MAP_FOV = 2
+
+# None until probed, then False or (cell size, ((offset, mask) of each flag))
+_map_cells = None
+# byte -> 0 or 1 tables for str.translate, by mask
+_map_masks = {}
+_TRUTH = '\x00' + '\x01' * 255
+
+def _map_struct(m):
+    return cast(c_void_p(m), POINTER(_MapStruct)).contents
+
+def _map_mask_table(mask):
+    table = _map_masks.get(mask)
+    if table is None:
+        table = _map_masks[mask] = ''.join(chr(1 if i & mask else 0) for i in range(256))
+    return table
+
+def _probe_map_layout():
+    # set one flag at a time on an otherwise blank map and see which bit of which byte changes.
+    # 1.5.1 packs a cell into one byte of bitfields, other builds use a byte per flag.
+    m = _lib.TCOD_map_new(8, 1)
+    try:
+        data = _map_struct(m)
+        if (data.width, data.height, data.nbcells) != (8, 1, 8) or not data.cells:
+            return False
+        flags = []
+        for flag in (_MAP_TRANSPARENT, _MAP_WALKABLE, _MAP_FOV):
+            _lib.TCOD_map_clear(m, 0, 0)
+            if flag == _MAP_FOV:
+                # the origin is always in the fov, nothing else is with every cell opaque
+                _lib.TCOD_map_compute_fov(m, 0, 0, 0, c_bool(False), FOV_BASIC)
+            else:
+                _lib.TCOD_map_set_properties(m, 0, 0, flag == _MAP_TRANSPARENT, flag == _MAP_WALKABLE)
+            raw = bytearray(string_at(data.cells, 6))
+            changed = [(offset, raw[offset]) for offset in range(6) if raw[offset]]
+            if len(changed) != 1 or changed[0][1] & (changed[0][1] - 1):
+                return False
+            flags.append(changed[0])
+        offsets = [offset for (offset, mask) in flags]
+        if offsets == [0, 0, 0] and len(set(mask for (offset, mask) in flags)) == 3:
+            return (1, tuple(flags))
+        if offsets == [0, 1, 2]:
+            return (3, tuple(flags))
+        return False
+    finally:
+        _lib.TCOD_map_delete(m)
+
+def _map_layout():
+    global _map_cells
+    if _map_cells is None:
+        _map_cells = _probe_map_layout()
+    return _map_cells
+
+def _map_values(values, n):
+    # n bytes of 0 or 1 from a NumPy array, anything with the buffer interface or a sequence of bools
+    if numpy_available and isinstance(values, numpy.ndarray):
+        data = numpy.ascontiguousarray(values, dtype=numpy.bool_).tostring()
+    else:
+        data = str(bytearray(values))
+    if len(data) != n:
+        raise ValueError('expected %d cells, got %d' % (n, len(data)))
+    return data.translate(_TRUTH)
+
+def map_set_properties_all(m, transparent, walkable):
+    # sets every cell of m at once. transparent and walkable hold width*height truthy values in
+    # row order: NumPy boolean arrays, bytearrays, array('B')s, lists... the fov is cleared.
+    w = _lib.TCOD_map_get_width(m)
+    h = _lib.TCOD_map_get_height(m)
+    n = w * h
+    transparent = _map_values(transparent, n)
+    walkable = _map_values(walkable, n)
+    layout = _map_layout()
+    if not layout:
+        _lib.TCOD_map_clear(m, 0, 0)
+        for i in range(n):
+            if transparent[i] != '\x00' or walkable[i] != '\x00':
+                _lib.TCOD_map_set_properties(m, i % w, i // w, transparent[i] != '\x00', walkable[i] != '\x00')
+        return
+    (size, ((t_offset, t_mask), (w_offset, w_mask), fov)) = layout
+    if size == 1:
+        # 0/1 to the flag's bit, then both bits together
+        transparent = bytearray(transparent.translate('\x00' + chr(t_mask) * 255))
+        walkable = bytearray(walkable.translate('\x00' + chr(w_mask) * 255))
+        cells = bytearray(map(operator.or_, transparent, walkable))
+    else:
+        cells = bytearray(n * size)
+        cells[t_offset::size] = transparent
+        cells[w_offset::size] = walkable
+    memmove(_map_struct(m).cells, str(cells), n * size)
+
+def _map_get_all(m, flag, getter):
+    layout = _map_layout()
+    if not layout:
+        w = _lib.TCOD_map_get_width(m)
+        h = _lib.TCOD_map_get_height(m)
+        return bytearray(1 if getter(m, x, y) else 0 for y in range(h) for x in range(w))
+    (size, flags) = layout
+    (offset, mask) = flags[flag]
+    data = _map_struct(m)
+    raw = string_at(data.cells, data.nbcells * size)
+    if size > 1:
+        raw = raw[offset::size]
+    return bytearray(raw.translate(_map_mask_table(mask)))
+
+def map_get_fov_all(m):
+    # the fov of m as a bytearray of width*height 0s and 1s in row order.
+    # numpy.frombuffer(a, numpy.bool_).reshape(h, w) turns it into a NumPy array without a copy.
+    return _map_get_all(m, _MAP_FOV, _lib.TCOD_map_is_in_fov)
+
+def map_get_transparent_all(m):
+    # like map_get_fov_all, for transparency
+    return _map_get_all(m, _MAP_TRANSPARENT, _lib.TCOD_map_is_transparent)
+
+def map_get_walkable_all(m):
+    # like map_get_fov_all, for walkability
+    return _map_get_all(m, _MAP_WALKABLE, _lib.TCOD_map_is_walkable)
+
 ############################
 # pathfinding module
 ############################
-_lib.TCOD_path_compute.restype = c_bool
-_lib.TCOD_path_is_empty.restype = c_bool
-_lib.TCOD_path_walk.restype = c_bool
 
 PATH_CBK_FUNC = CFUNCTYPE(c_float, c_int, c_int, c_int, c_int, py_object)
 
@@ -1593,24 +1913,20 @@ def path_is_empty(p):
 def path_walk(p, recompute):
     x = c_int()
     y = c_int()
-    if _lib.TCOD_path_walk(p[0], byref(x), byref(y), c_int(recompute)):
+    if _lib.TCOD_path_walk(p[0], byref(x), byref(y), recompute):
         return x.value, y.value
     return None,None
 
 def path_delete(p):
     _lib.TCOD_path_delete(p[0])
 
-_lib.TCOD_dijkstra_path_set.restype = c_bool
-_lib.TCOD_dijkstra_is_empty.restype = c_bool
-_lib.TCOD_dijkstra_path_walk.restype = c_bool
-_lib.TCOD_dijkstra_get_distance.restype = c_float
 
 def dijkstra_new(m, dcost=1.41):
     return (_lib.TCOD_dijkstra_new(c_void_p(m), c_float(dcost)), None)
 
 def dijkstra_new_using_function(w, h, func, userdata=0, dcost=1.41):
     cbk_func = PATH_CBK_FUNC(func)
-    return (_lib.TCOD_path_dijkstra_using_function(w, h, cbk_func,
+    return (_lib.TCOD_dijkstra_new_using_function(w, h, cbk_func,
             py_object(userdata), c_float(dcost)), cbk_func)
 
 def dijkstra_compute(p, ox, oy):
@@ -1663,13 +1979,6 @@ class _CBsp(Structure):
                 ('horizontal', c_bool),
                 ]
 
-_lib.TCOD_bsp_new_with_size.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_left.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_right.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_father.restype = POINTER(_CBsp)
-_lib.TCOD_bsp_is_leaf.restype = c_bool
-_lib.TCOD_bsp_contains.restype = c_bool
-_lib.TCOD_bsp_find_node.restype = POINTER(_CBsp)
 
 BSP_CBK_FUNC = CFUNCTYPE(c_int, c_void_p, c_void_p)
 
@@ -1726,7 +2035,7 @@ def bsp_new_with_size(x, y, w, h):
     return Bsp(_lib.TCOD_bsp_new_with_size(x, y, w, h))
 
 def bsp_split_once(node, horizontal, position):
-    _lib.TCOD_bsp_split_once(node.p, c_int(horizontal), position)
+    _lib.TCOD_bsp_split_once(node.p, horizontal, position)
 
 def bsp_split_recursive(node, randomizer, nb, minHSize, minVSize, maxHRatio,
                         maxVRatio):
@@ -1794,9 +2103,6 @@ class _CHeightMap(Structure):
               ('values', POINTER(c_float)),
               ]
 
-_lib.TCOD_heightmap_new.restype = POINTER(_CHeightMap)
-_lib.TCOD_heightmap_get_value.restype = c_float
-_lib.TCOD_heightmap_has_land_on_border.restype = c_bool
 
 class HeightMap(object):
     def __init__(self, chm):
@@ -1932,8 +2238,6 @@ def heightmap_delete(hm):
 ############################
 # name generator module
 ############################
-_lib.TCOD_namegen_generate.restype = c_char_p
-_lib.TCOD_namegen_generate_custom.restype = c_char_p
 
 def namegen_parse(filename,random=0) :
     _lib.TCOD_namegen_parse(filename,random)
@@ -1942,7 +2246,7 @@ def namegen_generate(name) :
     return _lib.TCOD_namegen_generate(name, 0)
 
 def namegen_generate_custom(name, rule) :
-    return _lib.TCOD_namegen_generate(name, rule, 0)
+    return _lib.TCOD_namegen_generate_custom(name, rule, 0)
 
 def namegen_get_sets():
     nb=_lib.TCOD_namegen_get_nb_sets_wrapper()
@@ -1955,3 +2259,511 @@ def namegen_destroy() :
     _lib.TCOD_namegen_destroy()
 
 
+
+############################
+# prototypes
+############################
+# return and argument types of every library function used above, set on each function the first
+# time it's looked up (see _Library). With argtypes ctypes converts each argument by a fixed recipe
+# instead of guessing from the python value on every call, and handles (consoles, maps, paths,
+# random generators...) are c_void_p both ways, so they keep all their bits where pointers are
+# wider than an int.
+# None as the argument list means only the return type is set: the variadic calls and the ones
+# taking a callback built on the spot. Color is passed and returned by value.
+# The one deliberate exception is _FAST_CALLS below: those only get their return type and
+# leading handle declared, whatever their entry here says.
+_PROTOTYPES = {
+    # color
+    'TCOD_color_equals': (c_bool, [Color, Color]),
+    'TCOD_color_add': (Color, [Color, Color]),
+    'TCOD_color_subtract': (Color, [Color, Color]),
+    'TCOD_color_multiply': (Color, [Color, Color]),
+    'TCOD_color_multiply_scalar': (Color, [Color, c_float]),
+    'TCOD_color_lerp': (Color, [Color, Color, c_float]),
+    'TCOD_color_set_HSV': (None, [POINTER(Color), c_float, c_float, c_float]),
+    'TCOD_color_get_HSV': (None, [Color, POINTER(c_float), POINTER(c_float), POINTER(c_float)]),
+    'TCOD_color_scale_HSV': (None, [POINTER(Color), c_float, c_float]),
+    'TCOD_color_gen_map': (None, [POINTER(Color), c_int, POINTER(Color), POINTER(c_int)]),
+
+    # console
+    'TCOD_console_init_root': (None, [c_int, c_int, c_char_p, c_bool, c_int]),
+    'TCOD_console_set_custom_font': (None, [c_char_p, c_int, c_int, c_int]),
+    'TCOD_console_map_ascii_code_to_font': (None, [c_int, c_int, c_int]),
+    'TCOD_console_map_ascii_codes_to_font': (None, [c_int, c_int, c_int, c_int]),
+    'TCOD_console_map_string_to_font': (None, [c_char_p, c_int, c_int]),
+    'TCOD_console_map_string_to_font_utf': (None, [c_wchar_p, c_int, c_int]),
+    'TCOD_console_is_fullscreen': (c_bool, []),
+    'TCOD_console_set_fullscreen': (None, [c_bool]),
+    'TCOD_console_is_window_closed': (c_bool, []),
+    'TCOD_console_set_window_title': (None, [c_char_p]),
+    'TCOD_console_credits': (None, []),
+    'TCOD_console_credits_reset': (None, []),
+    'TCOD_console_credits_render': (c_bool, [c_int, c_int, c_bool]),
+    'TCOD_console_flush': (None, []),
+    'TCOD_console_set_default_background': (None, [c_void_p, Color]),
+    'TCOD_console_set_default_foreground': (None, [c_void_p, Color]),
+    'TCOD_console_clear': (None, [c_void_p]),
+    'TCOD_console_put_char': (None, [c_void_p, c_int, c_int, c_int, c_int]),
+    'TCOD_console_put_char_ex': (None, [c_void_p, c_int, c_int, c_int, Color, Color]),
+    'TCOD_console_set_char_background': (None, [c_void_p, c_int, c_int, Color, c_int]),
+    'TCOD_console_set_char_foreground': (None, [c_void_p, c_int, c_int, Color]),
+    'TCOD_console_set_char': (None, [c_void_p, c_int, c_int, c_int]),
+    'TCOD_console_set_background_flag': (None, [c_void_p, c_int]),
+    'TCOD_console_get_background_flag': (c_int, [c_void_p]),
+    'TCOD_console_set_alignment': (None, [c_void_p, c_int]),
+    'TCOD_console_get_alignment': (c_int, [c_void_p]),
+    'TCOD_console_print': (None, None),
+    'TCOD_console_print_utf': (None, None),
+    'TCOD_console_print_ex': (None, None),
+    'TCOD_console_print_ex_utf': (None, None),
+    'TCOD_console_print_rect': (c_int, None),
+    'TCOD_console_print_rect_utf': (c_int, None),
+    'TCOD_console_print_rect_ex': (c_int, None),
+    'TCOD_console_print_rect_ex_utf': (c_int, None),
+    'TCOD_console_get_height_rect': (c_int, None),
+    'TCOD_console_get_height_rect_utf': (c_int, None),
+    'TCOD_console_print_frame': (None, None),
+    'TCOD_console_rect': (None, [c_void_p, c_int, c_int, c_int, c_int, c_bool, c_int]),
+    'TCOD_console_hline': (None, [c_void_p, c_int, c_int, c_int, c_int]),
+    'TCOD_console_vline': (None, [c_void_p, c_int, c_int, c_int, c_int]),
+    'TCOD_console_set_color_control': (None, [c_int, Color, Color]),
+    'TCOD_console_get_default_background': (Color, [c_void_p]),
+    'TCOD_console_get_default_foreground': (Color, [c_void_p]),
+    'TCOD_console_get_char_background': (Color, [c_void_p, c_int, c_int]),
+    'TCOD_console_get_char_foreground': (Color, [c_void_p, c_int, c_int]),
+    'TCOD_console_get_char': (c_int, [c_void_p, c_int, c_int]),
+    'TCOD_console_set_fade': (None, [c_uint8, Color]),
+    'TCOD_console_get_fade': (c_uint8, []),
+    'TCOD_console_get_fading_color': (Color, []),
+    'TCOD_console_wait_for_keypress_wrapper': (None, [POINTER(Key), c_bool]),
+    'TCOD_console_check_for_keypress_wrapper': (c_bool, [POINTER(Key), c_int]),
+    'TCOD_console_is_key_pressed': (c_bool, [c_int]),
+    'TCOD_console_set_keyboard_repeat': (None, [c_int, c_int]),
+    'TCOD_console_disable_keyboard_repeat': (None, []),
+    'TCOD_console_new': (c_void_p, [c_int, c_int]),
+    'TCOD_console_from_file': (c_void_p, [c_char_p]),
+    'TCOD_console_get_width': (c_int, [c_void_p]),
+    'TCOD_console_get_height': (c_int, [c_void_p]),
+    'TCOD_console_blit': (None, [c_void_p, c_int, c_int, c_int, c_int, c_void_p, c_int, c_int, c_float, c_float]),
+    'TCOD_console_set_key_color': (None, [c_void_p, Color]),
+    'TCOD_console_delete': (None, [c_void_p]),
+    # the fill arrays come as ctypes arrays, pointers or packed strings
+    'TCOD_console_fill_foreground': (None, [c_void_p, c_void_p, c_void_p, c_void_p]),
+    'TCOD_console_fill_background': (None, [c_void_p, c_void_p, c_void_p, c_void_p]),
+    'TCOD_console_fill_char': (None, [c_void_p, c_void_p]),
+    'TCOD_console_load_asc': (c_bool, [c_void_p, c_char_p]),
+    'TCOD_console_save_asc': (c_bool, [c_void_p, c_char_p]),
+    'TCOD_console_load_apf': (c_bool, [c_void_p, c_char_p]),
+    'TCOD_console_save_apf': (c_bool, [c_void_p, c_char_p]),
+
+    # sys
+    'TCOD_sys_set_fps': (None, [c_int]),
+    'TCOD_sys_get_fps': (c_int, []),
+    'TCOD_sys_get_last_frame_length': (c_float, []),
+    'TCOD_sys_sleep_milli': (None, [c_uint]),
+    'TCOD_sys_elapsed_milli': (c_uint, []),
+    'TCOD_sys_elapsed_seconds': (c_float, []),
+    'TCOD_sys_set_renderer': (None, [c_int]),
+    'TCOD_sys_get_renderer': (c_int, []),
+    'TCOD_sys_save_screenshot': (None, [c_char_p]),
+    'TCOD_sys_force_fullscreen_resolution': (None, [c_int, c_int]),
+    'TCOD_sys_get_current_resolution': (None, [POINTER(c_int), POINTER(c_int)]),
+    'TCOD_sys_get_char_size': (None, [POINTER(c_int), POINTER(c_int)]),
+    'TCOD_sys_update_char': (None, [c_int, c_int, c_int, c_void_p, c_int, c_int]),
+    'TCOD_sys_register_SDL_renderer': (None, [SDL_RENDERER_FUNC]),
+    'TCOD_sys_check_for_event': (c_int, [c_int, POINTER(Key), POINTER(Mouse)]),
+    'TCOD_sys_wait_for_event': (c_int, [c_int, POINTER(Key), POINTER(Mouse), c_bool]),
+
+    # line
+    'TCOD_line_init': (None, [c_int, c_int, c_int, c_int]),
+    'TCOD_line_step': (c_bool, [POINTER(c_int), POINTER(c_int)]),
+    'TCOD_line': (c_bool, None),
+    'TCOD_line_init_mt': (None, [c_int, c_int, c_int, c_int, c_void_p]),
+    'TCOD_line_step_mt': (c_bool, [POINTER(c_int), POINTER(c_int), c_void_p]),
+
+    # image
+    'TCOD_image_new': (c_void_p, [c_int, c_int]),
+    'TCOD_image_clear': (None, [c_void_p, Color]),
+    'TCOD_image_invert': (None, [c_void_p]),
+    'TCOD_image_hflip': (None, [c_void_p]),
+    'TCOD_image_rotate90': (None, [c_void_p, c_int]),
+    'TCOD_image_vflip': (None, [c_void_p]),
+    'TCOD_image_scale': (None, [c_void_p, c_int, c_int]),
+    'TCOD_image_set_key_color': (None, [c_void_p, Color]),
+    'TCOD_image_get_alpha': (c_int, [c_void_p, c_int, c_int]),
+    'TCOD_image_is_pixel_transparent': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_image_load': (c_void_p, [c_char_p]),
+    'TCOD_image_from_console': (c_void_p, [c_void_p]),
+    'TCOD_image_refresh_console': (None, [c_void_p, c_void_p]),
+    'TCOD_image_get_size': (None, [c_void_p, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_image_get_pixel': (Color, [c_void_p, c_int, c_int]),
+    'TCOD_image_get_mipmap_pixel': (Color, [c_void_p, c_float, c_float, c_float, c_float]),
+    'TCOD_image_put_pixel': (None, [c_void_p, c_int, c_int, Color]),
+    'TCOD_image_blit': (None, [c_void_p, c_void_p, c_float, c_float, c_int, c_float, c_float, c_float]),
+    'TCOD_image_blit_rect': (None, [c_void_p, c_void_p, c_int, c_int, c_int, c_int, c_int]),
+    'TCOD_image_blit_2x': (None, [c_void_p, c_void_p, c_int, c_int, c_int, c_int, c_int, c_int]),
+    'TCOD_image_save': (None, [c_void_p, c_char_p]),
+    'TCOD_image_delete': (None, [c_void_p]),
+
+    # mouse
+    'TCOD_mouse_show_cursor': (None, [c_bool]),
+    'TCOD_mouse_is_cursor_visible': (c_bool, []),
+    'TCOD_mouse_move': (None, [c_int, c_int]),
+    'TCOD_mouse_get_status_wrapper': (None, [POINTER(Mouse)]),
+
+    # parser
+    'TCOD_list_size': (c_int, [c_void_p]),
+    'TCOD_list_get': (c_void_p, [c_void_p, c_int]),
+    'TCOD_parser_new': (c_void_p, []),
+    'TCOD_parser_new_struct': (c_void_p, [c_void_p, c_char_p]),
+    'TCOD_struct_add_flag': (None, [c_void_p, c_char_p]),
+    'TCOD_struct_add_property': (None, [c_void_p, c_char_p, c_int, c_bool]),
+    'TCOD_struct_add_value_list': (None, [c_void_p, c_char_p, POINTER(c_char_p), c_bool]),
+    'TCOD_struct_add_list_property': (None, [c_void_p, c_char_p, c_int, c_bool]),
+    'TCOD_struct_add_structure': (None, [c_void_p, c_void_p]),
+    'TCOD_struct_get_name': (c_char_p, [c_void_p]),
+    'TCOD_struct_is_mandatory': (c_bool, [c_void_p, c_char_p]),
+    'TCOD_struct_get_type': (c_int, [c_void_p, c_char_p]),
+    'TCOD_parser_run': (None, [c_void_p, c_char_p, c_void_p]),
+    'TCOD_parser_delete': (None, [c_void_p]),
+    'TCOD_parser_get_bool_property': (c_bool, [c_void_p, c_char_p]),
+    'TCOD_parser_get_int_property': (c_int, [c_void_p, c_char_p]),
+    'TCOD_parser_get_char_property': (c_int, [c_void_p, c_char_p]),
+    'TCOD_parser_get_float_property': (c_float, [c_void_p, c_char_p]),
+    'TCOD_parser_get_string_property': (c_char_p, [c_void_p, c_char_p]),
+    'TCOD_parser_get_color_property': (Color, [c_void_p, c_char_p]),
+    'TCOD_parser_get_dice_property_py': (None, [c_void_p, c_char_p, POINTER(Dice)]),
+    'TCOD_parser_get_list_property': (c_void_p, [c_void_p, c_char_p, c_int]),
+
+    # random
+    'TCOD_random_get_instance': (c_void_p, []),
+    'TCOD_random_new': (c_void_p, [c_int]),
+    'TCOD_random_new_from_seed': (c_void_p, [c_int, c_uint]),
+    'TCOD_random_set_distribution': (None, [c_void_p, c_int]),
+    'TCOD_random_get_int': (c_int, [c_void_p, c_int, c_int]),
+    'TCOD_random_get_float': (c_float, [c_void_p, c_float, c_float]),
+    'TCOD_random_get_double': (c_double, [c_void_p, c_double, c_double]),
+    'TCOD_random_get_int_mean': (c_int, [c_void_p, c_int, c_int, c_int]),
+    'TCOD_random_get_float_mean': (c_float, [c_void_p, c_float, c_float, c_float]),
+    'TCOD_random_get_double_mean': (c_double, [c_void_p, c_double, c_double, c_double]),
+    'TCOD_random_save': (c_void_p, [c_void_p]),
+    'TCOD_random_restore': (None, [c_void_p, c_void_p]),
+    'TCOD_random_delete': (None, [c_void_p]),
+
+    # noise
+    'TCOD_noise_new': (c_void_p, [c_int, c_float, c_float, c_void_p]),
+    'TCOD_noise_set_type': (None, [c_void_p, c_int]),
+    'TCOD_noise_get_ex': (c_float, [c_void_p, POINTER(c_float), c_int]),
+    'TCOD_noise_get_fbm_ex': (c_float, [c_void_p, POINTER(c_float), c_float, c_int]),
+    'TCOD_noise_get_turbulence_ex': (c_float, [c_void_p, POINTER(c_float), c_float, c_int]),
+    'TCOD_noise_delete': (None, [c_void_p]),
+
+    # fov
+    'TCOD_map_new': (c_void_p, [c_int, c_int]),
+    'TCOD_map_copy': (None, [c_void_p, c_void_p]),
+    'TCOD_map_set_properties': (None, [c_void_p, c_int, c_int, c_bool, c_bool]),
+    'TCOD_map_clear': (None, [c_void_p, c_bool, c_bool]),
+    'TCOD_map_compute_fov': (None, [c_void_p, c_int, c_int, c_int, c_bool, c_int]),
+    'TCOD_map_is_in_fov': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_map_is_transparent': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_map_is_walkable': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_map_delete': (None, [c_void_p]),
+    'TCOD_map_get_width': (c_int, [c_void_p]),
+    'TCOD_map_get_height': (c_int, [c_void_p]),
+
+    # pathfinding
+    'TCOD_path_new_using_map': (c_void_p, [c_void_p, c_float]),
+    'TCOD_path_new_using_function': (c_void_p, [c_int, c_int, PATH_CBK_FUNC, py_object, c_float]),
+    'TCOD_path_compute': (c_bool, [c_void_p, c_int, c_int, c_int, c_int]),
+    'TCOD_path_get_origin': (None, [c_void_p, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_path_get_destination': (None, [c_void_p, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_path_size': (c_int, [c_void_p]),
+    'TCOD_path_reverse': (None, [c_void_p]),
+    'TCOD_path_get': (None, [c_void_p, c_int, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_path_is_empty': (c_bool, [c_void_p]),
+    'TCOD_path_walk': (c_bool, [c_void_p, POINTER(c_int), POINTER(c_int), c_bool]),
+    'TCOD_path_delete': (None, [c_void_p]),
+    'TCOD_dijkstra_new': (c_void_p, [c_void_p, c_float]),
+    'TCOD_dijkstra_new_using_function': (c_void_p, [c_int, c_int, PATH_CBK_FUNC, py_object, c_float]),
+    'TCOD_dijkstra_compute': (None, [c_void_p, c_int, c_int]),
+    'TCOD_dijkstra_path_set': (c_bool, [c_void_p, c_int, c_int]),
+    'TCOD_dijkstra_get_distance': (c_float, [c_void_p, c_int, c_int]),
+    'TCOD_dijkstra_size': (c_int, [c_void_p]),
+    'TCOD_dijkstra_reverse': (None, [c_void_p]),
+    'TCOD_dijkstra_get': (None, [c_void_p, c_int, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_dijkstra_is_empty': (c_bool, [c_void_p]),
+    'TCOD_dijkstra_path_walk': (c_bool, [c_void_p, POINTER(c_int), POINTER(c_int)]),
+    'TCOD_dijkstra_delete': (None, [c_void_p]),
+
+    # bsp
+    'TCOD_bsp_new_with_size': (POINTER(_CBsp), [c_int, c_int, c_int, c_int]),
+    'TCOD_bsp_split_once': (None, [POINTER(_CBsp), c_bool, c_int]),
+    'TCOD_bsp_split_recursive': (None, [POINTER(_CBsp), c_void_p, c_int, c_int, c_int, c_float, c_float]),
+    'TCOD_bsp_resize': (None, [POINTER(_CBsp), c_int, c_int, c_int, c_int]),
+    'TCOD_bsp_left': (POINTER(_CBsp), [POINTER(_CBsp)]),
+    'TCOD_bsp_right': (POINTER(_CBsp), [POINTER(_CBsp)]),
+    'TCOD_bsp_father': (POINTER(_CBsp), [POINTER(_CBsp)]),
+    'TCOD_bsp_is_leaf': (c_bool, [POINTER(_CBsp)]),
+    'TCOD_bsp_contains': (c_bool, [POINTER(_CBsp), c_int, c_int]),
+    'TCOD_bsp_find_node': (POINTER(_CBsp), [POINTER(_CBsp), c_int, c_int]),
+    'TCOD_bsp_traverse_pre_order': (c_bool, [POINTER(_CBsp), BSP_CBK_FUNC, c_void_p]),
+    'TCOD_bsp_traverse_in_order': (c_bool, [POINTER(_CBsp), BSP_CBK_FUNC, c_void_p]),
+    'TCOD_bsp_traverse_post_order': (c_bool, [POINTER(_CBsp), BSP_CBK_FUNC, c_void_p]),
+    'TCOD_bsp_traverse_level_order': (c_bool, [POINTER(_CBsp), BSP_CBK_FUNC, c_void_p]),
+    'TCOD_bsp_traverse_inverted_level_order': (c_bool, [POINTER(_CBsp), BSP_CBK_FUNC, c_void_p]),
+    'TCOD_bsp_remove_sons': (None, [POINTER(_CBsp)]),
+    'TCOD_bsp_delete': (None, [POINTER(_CBsp)]),
+
+    # heightmap
+    'TCOD_heightmap_new': (POINTER(_CHeightMap), [c_int, c_int]),
+    'TCOD_heightmap_set_value': (None, [POINTER(_CHeightMap), c_int, c_int, c_float]),
+    'TCOD_heightmap_add': (None, [POINTER(_CHeightMap), c_float]),
+    'TCOD_heightmap_scale': (None, [POINTER(_CHeightMap), c_float]),
+    'TCOD_heightmap_clear': (None, [POINTER(_CHeightMap)]),
+    'TCOD_heightmap_clamp': (None, [POINTER(_CHeightMap), c_float, c_float]),
+    'TCOD_heightmap_copy': (None, [POINTER(_CHeightMap), POINTER(_CHeightMap)]),
+    'TCOD_heightmap_normalize': (None, [POINTER(_CHeightMap), c_float, c_float]),
+    'TCOD_heightmap_lerp_hm': (None, [POINTER(_CHeightMap), POINTER(_CHeightMap), POINTER(_CHeightMap), c_float]),
+    'TCOD_heightmap_add_hm': (None, [POINTER(_CHeightMap), POINTER(_CHeightMap), POINTER(_CHeightMap)]),
+    'TCOD_heightmap_multiply_hm': (None, [POINTER(_CHeightMap), POINTER(_CHeightMap), POINTER(_CHeightMap)]),
+    'TCOD_heightmap_add_hill': (None, [POINTER(_CHeightMap), c_float, c_float, c_float, c_float]),
+    'TCOD_heightmap_dig_hill': (None, [POINTER(_CHeightMap), c_float, c_float, c_float, c_float]),
+    'TCOD_heightmap_rain_erosion': (None, [POINTER(_CHeightMap), c_int, c_float, c_float, c_void_p]),
+    'TCOD_heightmap_kernel_transform': (None, [POINTER(_CHeightMap), c_int, POINTER(c_int), POINTER(c_int), POINTER(c_float), c_float, c_float]),
+    'TCOD_heightmap_add_voronoi': (None, [POINTER(_CHeightMap), c_int, c_int, POINTER(c_float), c_void_p]),
+    'TCOD_heightmap_add_fbm': (None, [POINTER(_CHeightMap), c_void_p, c_float, c_float, c_float, c_float, c_float, c_float, c_float]),
+    'TCOD_heightmap_scale_fbm': (None, [POINTER(_CHeightMap), c_void_p, c_float, c_float, c_float, c_float, c_float, c_float, c_float]),
+    'TCOD_heightmap_dig_bezier': (None, [POINTER(_CHeightMap), POINTER(c_int), POINTER(c_int), c_float, c_float, c_float, c_float]),
+    'TCOD_heightmap_get_value': (c_float, [POINTER(_CHeightMap), c_int, c_int]),
+    'TCOD_heightmap_get_interpolated_value': (c_float, [POINTER(_CHeightMap), c_float, c_float]),
+    'TCOD_heightmap_get_slope': (c_float, [POINTER(_CHeightMap), c_int, c_int]),
+    'TCOD_heightmap_get_normal': (None, [POINTER(_CHeightMap), c_float, c_float, POINTER(c_float), c_float]),
+    'TCOD_heightmap_count_cells': (c_int, [POINTER(_CHeightMap), c_float, c_float]),
+    'TCOD_heightmap_has_land_on_border': (c_bool, [POINTER(_CHeightMap), c_float]),
+    'TCOD_heightmap_get_minmax': (None, [POINTER(_CHeightMap), POINTER(c_float), POINTER(c_float)]),
+    'TCOD_heightmap_delete': (None, [POINTER(_CHeightMap)]),
+
+    # name generator
+    'TCOD_namegen_parse': (None, [c_char_p, c_void_p]),
+    'TCOD_namegen_generate': (c_char_p, [c_char_p, c_bool]),
+    'TCOD_namegen_generate_custom': (c_char_p, [c_char_p, c_char_p, c_bool]),
+    'TCOD_namegen_get_nb_sets_wrapper': (c_int, []),
+    'TCOD_namegen_get_sets_wrapper': (None, [POINTER(c_char_p)]),
+    'TCOD_namegen_destroy': (None, []),
+    }
+
+# on Windows these names were pointed at the _wrapper functions at the top of this file, which
+# don't share the argument types of the functions they replace
+_WINDOWS_WRAPPED = ['TCOD_color_multiply', 'TCOD_color_add', 'TCOD_color_multiply_scalar',
+    'TCOD_color_subtract', 'TCOD_color_lerp', 'TCOD_console_get_default_background',
+    'TCOD_console_get_default_foreground', 'TCOD_console_get_char_background',
+    'TCOD_console_get_char_foreground', 'TCOD_console_get_fading_color',
+    'TCOD_image_get_pixel', 'TCOD_image_get_mipmap_pixel', 'TCOD_parser_get_color_property']
+
+# the calls made once per cell or once per object drawn only get their leading handle declared, on
+# purpose. Declared arguments go through a from_param call each, which makes these calls 1.4 to 2.1
+# times slower (map_is_in_fov 430 -> 920 ns, console_put_char_ex 1010 -> 1880 ns on CPython 2.7)
+# than leaving them to ctypes' own conversion, and that already passes ints, bools and Colors the
+# way these functions take them. Their full prototypes above still say what each one takes.
+_FAST_CALLS = ['TCOD_map_is_in_fov', 'TCOD_map_is_transparent', 'TCOD_map_is_walkable',
+    'TCOD_map_set_properties', 'TCOD_console_set_default_background',
+    'TCOD_console_set_default_foreground', 'TCOD_console_put_char', 'TCOD_console_put_char_ex',
+    'TCOD_console_set_char_background', 'TCOD_console_set_char_foreground', 'TCOD_console_set_char',
+    'TCOD_console_get_char', 'TCOD_console_get_char_background', 'TCOD_console_get_char_foreground',
+    'TCOD_random_get_int']
+
+def _declare_prototype(name, function):
+    (restype, argtypes) = _PROTOTYPES[name]
+    function.restype = restype
+    if argtypes is None or ((MINGW or MSVC) and name in _WINDOWS_WRAPPED):
+        return
+    if name in _FAST_CALLS:
+        argtypes = argtypes[:1]
+    function.argtypes = argtypes
+
+def _setup_prototypes(lib):
+    # the functions already looked up (the aliases above, the Windows wrappers...) are declared
+    # now, the rest by _Library as they're first used. A function missing from an older or trimmed
+    # down build fails when called, as it always did.
+    for name in list(vars(lib)):
+        if name in _PROTOTYPES:
+            _declare_prototype(name, getattr(lib, name))
+    lib._prototypes = _PROTOTYPES
+
+_setup_prototypes(_lib)
+
+############################
+# cffi backend
+############################
+# The calls in _FAST_CALLS can go through cffi's ABI mode instead of ctypes. cffi converts the
+# arguments from the C declarations below in one go, which is cheaper than ctypes on CPython, and
+# PyPy's JIT sees through it where ctypes calls are slow. Everything else stays on ctypes, on the
+# same library, so both share handles, Colors and results: handles are declared intptr_t to take
+# the ints ctypes hands out, and Colors are copied into a cffi struct once (see _cffi_color).
+# Set LIBTCODPY_BACKEND to cffi or ctypes to pick one; by default cffi is used if it's installed.
+
+_CFFI_DECLARATIONS = """
+typedef struct { uint8_t r, g, b; } TCOD_color_t;
+bool TCOD_map_is_in_fov(intptr_t map, int x, int y);
+bool TCOD_map_is_transparent(intptr_t map, int x, int y);
+bool TCOD_map_is_walkable(intptr_t map, int x, int y);
+void TCOD_map_set_properties(intptr_t map, int x, int y, bool is_transparent, bool is_walkable);
+void TCOD_console_set_default_background(intptr_t con, TCOD_color_t col);
+void TCOD_console_set_default_foreground(intptr_t con, TCOD_color_t col);
+void TCOD_console_put_char(intptr_t con, int x, int y, int c, int flag);
+void TCOD_console_put_char_ex(intptr_t con, int x, int y, int c, TCOD_color_t fore, TCOD_color_t back);
+void TCOD_console_set_char_background(intptr_t con, int x, int y, TCOD_color_t col, int flag);
+void TCOD_console_set_char_foreground(intptr_t con, int x, int y, TCOD_color_t col);
+void TCOD_console_set_char(intptr_t con, int x, int y, int c);
+int TCOD_console_get_char(intptr_t con, int x, int y);
+int TCOD_random_get_int(intptr_t mersenne, int min, int max);
+"""
+
+# the names the cffi backend takes over, and their ctypes versions, kept to check the two against each other
+_BACKEND_CALLS = ['map_is_in_fov', 'map_is_transparent', 'map_is_walkable', 'map_set_properties',
+    'console_set_default_background', 'console_set_default_foreground', 'console_put_char',
+    'console_put_char_ex', 'console_set_char_background', 'console_set_char_foreground',
+    'console_set_char', 'console_get_char', 'random_get_int']
+_CTYPES_CALLS = dict((name, globals()[name]) for name in _BACKEND_CALLS)
+
+_ffi = None
+_backend = os.environ.get('LIBTCODPY_BACKEND', '')
+if _backend not in ('', 'cffi', 'ctypes'):
+    raise ValueError('LIBTCODPY_BACKEND must be cffi or ctypes, not %r' % _backend)
+
+def _cffi_color(col):
+    # Colors are ctypes structs; the cffi copy is kept on the Color until one of its fields is set.
+    # Colors changed behind python's back (through byref or memmove) have to be made anew.
+    # The wrappers below look up col._cdata themselves first, this only runs when it's missing.
+    cdata = col.__dict__['_cdata'] = _ffi.new('TCOD_color_t *', (col.r, col.g, col.b))[0]
+    return cdata
+
+def _cffi_calls():
+    # the cffi versions of the names in _BACKEND_CALLS, or None if cffi can't be used
+    global _ffi
+    try:
+        import cffi
+        ffi = cffi.FFI()
+        ffi.cdef(_CFFI_DECLARATIONS)
+        flib = ffi.dlopen(_lib._name)
+    except (ImportError, AttributeError, OSError):
+        # no cffi, or a library ctypes can load but cffi can't find
+        if _backend == 'cffi':
+            raise
+        return None
+    _ffi = ffi
+
+    is_in_fov = flib.TCOD_map_is_in_fov
+    is_transparent = flib.TCOD_map_is_transparent
+    is_walkable = flib.TCOD_map_is_walkable
+    set_properties = flib.TCOD_map_set_properties
+    get_char = flib.TCOD_console_get_char
+    get_int = flib.TCOD_random_get_int
+    set_default_background = flib.TCOD_console_set_default_background
+    set_default_foreground = flib.TCOD_console_set_default_foreground
+    put_char = flib.TCOD_console_put_char
+    put_char_ex = flib.TCOD_console_put_char_ex
+    set_char_background = flib.TCOD_console_set_char_background
+    set_char_foreground = flib.TCOD_console_set_char_foreground
+    set_char = flib.TCOD_console_set_char
+
+    # ctypes passes None as a NULL handle (the root console, libtcod's own random generator) and
+    # any truthy value as a flag. cffi's intptr_t only takes ints and its bool only 0 and 1, so
+    # handles go through `or 0` and flags through bool() to get the same results
+    def map_is_in_fov(m, x, y):
+        return is_in_fov(m or 0, x, y)
+
+    def map_is_transparent(m, x, y):
+        return is_transparent(m or 0, x, y)
+
+    def map_is_walkable(m, x, y):
+        return is_walkable(m or 0, x, y)
+
+    def map_set_properties(m, x, y, isTrans, isWalk):
+        set_properties(m or 0, x, y, bool(isTrans), bool(isWalk))
+
+    def console_get_char(con, x, y):
+        return get_char(con or 0, x, y)
+
+    def random_get_int(rnd, mi, ma):
+        return get_int(rnd or 0, mi, ma)
+
+    def console_set_default_background(con, col):
+        try:
+            cdata = col._cdata
+        except AttributeError:
+            cdata = _cffi_color(col)
+        set_default_background(con or 0, cdata)
+
+    def console_set_default_foreground(con, col):
+        try:
+            cdata = col._cdata
+        except AttributeError:
+            cdata = _cffi_color(col)
+        set_default_foreground(con or 0, cdata)
+
+    def console_put_char(con, x, y, c, flag=BKGND_DEFAULT):
+        if type(c) == str or type(c) == bytes:
+            c = ord(c)
+        put_char(con or 0, x, y, c, flag)
+
+    def console_put_char_ex(con, x, y, c, fore, back):
+        if type(c) == str or type(c) == bytes:
+            c = ord(c)
+        try:
+            cfore = fore._cdata
+        except AttributeError:
+            cfore = _cffi_color(fore)
+        try:
+            cback = back._cdata
+        except AttributeError:
+            cback = _cffi_color(back)
+        put_char_ex(con or 0, x, y, c, cfore, cback)
+
+    def console_set_char_background(con, x, y, col, flag=BKGND_SET):
+        try:
+            cdata = col._cdata
+        except AttributeError:
+            cdata = _cffi_color(col)
+        set_char_background(con or 0, x, y, cdata, flag)
+
+    def console_set_char_foreground(con, x, y, col):
+        try:
+            cdata = col._cdata
+        except AttributeError:
+            cdata = _cffi_color(col)
+        set_char_foreground(con or 0, x, y, cdata)
+
+    def console_set_char(con, x, y, c):
+        if type(c) == str or type(c) == bytes:
+            c = ord(c)
+        set_char(con or 0, x, y, c)
+
+    return {
+        'map_is_in_fov': map_is_in_fov,
+        'map_is_transparent': map_is_transparent,
+        'map_is_walkable': map_is_walkable,
+        'map_set_properties': map_set_properties,
+        'console_set_default_background': console_set_default_background,
+        'console_set_default_foreground': console_set_default_foreground,
+        'console_put_char': console_put_char,
+        'console_put_char_ex': console_put_char_ex,
+        'console_set_char_background': console_set_char_background,
+        'console_set_char_foreground': console_set_char_foreground,
+        'console_set_char': console_set_char,
+        'console_get_char': console_get_char,
+        'random_get_int': random_get_int,
+        }
+
+def _choose_backend():
+    # BACKEND and the _BACKEND_CALLS it goes with, by name
+    calls = None
+    if _backend != 'ctypes':
+        calls = _cffi_calls()
+    if calls is None:
+        calls = dict(_CTYPES_CALLS, BACKEND='ctypes')
+    else:
+        calls['BACKEND'] = 'cffi'
+    return calls
+
+globals().update(_choose_backend())
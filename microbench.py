@@ -0,0 +1,109 @@
+'''Micro benchmark for the libtcodpy calls made once per cell or once per object drawn.
+
+Every call is timed twice: through libtcodpy as it is, with the prototypes it declares for the
+library, and the way the wrappers made it before there were any, on a second, undeclared handle of
+the same library where ctypes works out every argument from its python type:
+
+	python microbench.py
+	python microbench.py --calls 500000 --repeat 5
+	LIBTCODPY_BACKEND=ctypes python microbench.py
+
+The old wrappers passed handles as plain ints, which cuts them down on 64 bit builds, so the
+"before" calls get theirs as c_void_p; everything else is as they did it.
+'''
+import argparse
+import ctypes
+import sys
+from ctypes import c_bool, c_int, c_void_p
+from itertools import repeat
+from timeit import default_timer as timer
+
+import libtcodpy as libtcod
+
+def old_wrappers(lib):
+	'''The hot wrappers as they were without prototypes, calling into lib.'''
+	lib.TCOD_map_is_in_fov.restype = c_bool
+	lib.TCOD_map_is_transparent.restype = c_bool
+	lib.TCOD_console_get_char_background.restype = libtcod.Color
+
+	def map_is_in_fov(m, x, y):
+		return lib.TCOD_map_is_in_fov(m, x, y)
+	def map_is_transparent(m, x, y):
+		return lib.TCOD_map_is_transparent(m, x, y)
+	def map_set_properties(m, x, y, isTrans, isWalk):
+		lib.TCOD_map_set_properties(m, x, y, c_int(isTrans), c_int(isWalk))
+	def console_set_default_foreground(con, col):
+		lib.TCOD_console_set_default_foreground(con, col)
+	def console_set_char_foreground(con, x, y, col):
+		lib.TCOD_console_set_char_foreground(con, x, y, col)
+	def console_set_char_background(con, x, y, col, flag=libtcod.BKGND_SET):
+		lib.TCOD_console_set_char_background(con, x, y, col, flag)
+	def console_put_char(con, x, y, c, flag=libtcod.BKGND_DEFAULT):
+		if type(c) == str or type(c) == bytes:
+			lib.TCOD_console_put_char(con, x, y, ord(c), flag)
+		else:
+			lib.TCOD_console_put_char(con, x, y, c, flag)
+	def console_put_char_ex(con, x, y, c, fore, back):
+		if type(c) == str or type(c) == bytes:
+			lib.TCOD_console_put_char_ex(con, x, y, ord(c), fore, back)
+		else:
+			lib.TCOD_console_put_char_ex(con, x, y, c, fore, back)
+	def console_get_char_background(con, x, y):
+		return lib.TCOD_console_get_char_background(con, x, y)
+	def random_get_int(rnd, mi, ma):
+		return lib.TCOD_random_get_int(rnd, mi, ma)
+	return locals()
+
+def cases(m, con, rng):
+	#(wrapper name, handle, the other arguments); the handles are given as libtcodpy returns them
+	return [
+		('map_is_in_fov', m, (3, 4)),
+		('map_is_transparent', m, (3, 4)),
+		('map_set_properties', m, (3, 4, True, False)),
+		('console_set_default_foreground', con, (libtcod.white,)),
+		('console_set_char_foreground', con, (3, 4, libtcod.white)),
+		('console_set_char_background', con, (3, 4, libtcod.dark_blue, libtcod.BKGND_SET)),
+		('console_put_char', con, (3, 4, '@', libtcod.BKGND_SET)),
+		('console_put_char_ex', con, (3, 4, '@', libtcod.white, libtcod.black)),
+		('console_get_char_background', con, (3, 4)),
+		('random_get_int', rng, (0, 100)),
+		]
+
+def calls_per_second(function, args, calls, repeats):
+	best = None
+	for rep in range(repeats):
+		start = timer()
+		for ignored in repeat(None, calls):
+			function(*args)
+		elapsed = timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return calls / best if best > 0 else 0.0
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = 'Time the hot libtcodpy calls with and without declared prototypes.')
+	parser.add_argument('--calls', type = int, default = 200000, help = 'calls per timing (default %(default)s)')
+	parser.add_argument('--repeat', type = int, default = 3, help = 'timings per call, the best one counts (default %(default)s)')
+	args = parser.parse_args(argv)
+
+	old = old_wrappers(ctypes.CDLL(libtcod._lib._name))
+	m = libtcod.map_new(10, 10)
+	con = libtcod.console_new(10, 10)
+	rng = libtcod.random_new_from_seed(1)
+
+	print('libtcodpy backend: {0}\n'.format(libtcod.BACKEND))
+	print('{0:<32} {1:>14} {2:>14} {3:>8}'.format('call', 'before/s', 'after/s', 'speedup'))
+	for (name, handle, rest) in cases(m, con, rng):
+		#the old calls need their handles wrapped, see the docstring
+		before = calls_per_second(old[name], (c_void_p(handle),) + rest, args.calls, args.repeat)
+		after = calls_per_second(getattr(libtcod, name), (handle,) + rest, args.calls, args.repeat)
+		print('{0:<32} {1:>14.0f} {2:>14.0f} {3:>7.2f}x'.format(name, before, after, after / before if before > 0 else 0.0))
+		sys.stdout.flush()
+
+	libtcod.map_delete(m)
+	libtcod.console_delete(con)
+	libtcod.random_delete(rng)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
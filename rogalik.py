@@ -1,6 +1,13 @@
 import libtcodpy as libtcod
 from math import sqrt
 import textwrap
+import string
+import zlib
+import heapq
+import operator
+from collections import deque, OrderedDict
+from array import array
+from itertools import imap, izip, repeat
 
 DIRECTIONS = {
 	libtcod.KEY_UP:		(0, -1),
@@ -16,6 +23,8 @@ DIRECTIONS = {
 	libtcod.KEY_KP8:	(0, -1),
 	libtcod.KEY_KP9:	(1, -1)
 	}
+#the eight steps around a tile, straight ones first
+NEIGHBOURS = [(0, -1), (-1, 0), (1, 0), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]
 
 #window size
 SCREEN_WIDTH = 80
@@ -33,16 +42,44 @@ ROOM_MIN_SIZE = 6
 MAX_ROOMS = 30
 MAX_ROOM_MONSTERS = 3
 MAX_ROOM_ITEMS = 2
+#bucket size of the RoomGrid used for overlap tests while placing rooms
+ROOM_GRID_SIZE = 16
 
 FOV_ALGO = 0
 FOV_LIGHT_WALLS = True
 TORCH_RADIUS = 10
+#fov is computed on a window this much wider than the light on every side, see Game.compute_fov
+FOV_SLACK = 8
+FOV_WINDOW = 2 * (TORCH_RADIUS + FOV_SLACK) + 1
+#monsters see as far as the torch lights, see Perception
+MONSTER_SIGHT = TORCH_RADIUS
+PERCEPTION_POOL = 32
+
+#lights, see Lighting. falloff is the power the light dies away with towards its radius, 1 is linear
+TORCH_COLOR = libtcod.Color(255, 220, 170)
+TORCH_FALLOFF = 0.5
+WALL_TORCH_RADIUS = 6
+WALL_TORCH_COLOR = libtcod.Color(255, 150, 60)
+WALL_TORCH_FALLOFF = 1.0
+#bucket size of the grid Lighting keeps lights that stay put in
+LIGHT_GRID_SIZE = 16
 
 #GUI specs
 BAR_WIDTH = 20
 PANEL_HEIGHT = 7
 PANEL_Y = SCREEN_HEIGHT - PANEL_HEIGHT
 INVENTORY_WIDTH = 50
+#the map is seen through a camera the size of the screen above the panel
+VIEW_WIDTH = SCREEN_WIDTH
+VIEW_HEIGHT = SCREEN_HEIGHT - PANEL_HEIGHT
+CAMERA_MARGIN = 10
+#draw layers for objects, bottom to top. terrain is under all of them, overlays (the targeting reticle) on top
+Z_ITEMS = 0
+Z_CORPSES = 1
+Z_ACTORS = 2
+Z_LAYERS = 3
+#background of the empty cells of a layer console, left out when it's blitted over the layers below
+LAYER_KEY = libtcod.magenta
 
 MSG_X = BAR_WIDTH + 2
 MSG_WIDTH = SCREEN_WIDTH - BAR_WIDTH - 2
@@ -50,6 +87,12 @@ MSG_HEIGHT = PANEL_HEIGHT - 1
 
 LIMIT_FPS = 20
 
+#turn scheduling: a player turn is TURN_TICKS long, an actor with speed s acts every TURN_TICKS*NORMAL_SPEED/s ticks
+TURN_TICKS = 100
+NORMAL_SPEED = 100
+#actors further than this from the player are frozen instead of simulated
+ACTIVE_RADIUS = 30
+
 #Item specs
 LIGHTNING_DAMAGE = 20
 LIGHTNING_RANGE = 5
@@ -58,12 +101,17 @@ CONFUSE_RANGE = 8
 FIREBALL_DAMAGE = 12
 FIREBALL_RADIUS = 3
 FIREBALL_RANGE = 5
+#the light of the blast, for the turn after it
+FLASH_RADIUS = FIREBALL_RADIUS + 3
+FLASH_COLOR = libtcod.Color(255, 120, 20)
+FLASH_TURNS = 1
 
-class Object:
+class Object(object):
 	'''a generic object: player/monster/item/stairs/whatever. always represented by a character.'''
+	#slotted like the components below, so big maps full of monsters don't carry a dict for each of them
+	__slots__ = ('x', 'y', 'char', 'name', 'color', 'known', 'blocks', 'speed', 'fighter', 'ai', 'item', 'handle', 'layer')
 
-	global fov_map
-	def __init__(self, x, y, char='@', name='OBJECT', color=libtcod.red, blocks=False, fighter=None, ai=None, item=None, interact=None):
+	def __init__(self, x, y, char='@', name='OBJECT', color=libtcod.red, blocks=False, fighter=None, ai=None, item=None, interact=None, speed=NORMAL_SPEED, layer=None):
 		self.x = x
 		self.y = y
 		self.char = char
@@ -71,6 +119,9 @@ class Object:
 		self.color = color
 		self.known = False
 		self.blocks = blocks
+		self.speed = speed
+		#set by the EntityStore while the object is on the map
+		self.handle = None
 		self.fighter = fighter
 		if self.fighter:
 			self.fighter.owner = self
@@ -80,27 +131,32 @@ class Object:
 		self.item = item
 		if self.item:
 			self.item.owner = self
+		if layer is None:
+			layer = Z_ITEMS if item else Z_ACTORS
+		self.layer = layer
 		
 	def move(self, dx, dy, ghost = False, leash = 0):
 		#move by a given amount. returns a bool for messages and checks
 		nx = self.x+dx
 		ny = self.y+dy
 		
-		if leash > 0 and distance(player.x, player.y, nx, ny) > leash - 1:
+		if leash > 0 and distance(game.player.x, game.player.y, nx, ny) > leash - 1:
 			return False
 		
-		if nx < MAP_WIDTH and ny < MAP_HEIGHT and nx >= 0 and ny >= 0:
+		if game.map.in_bounds(nx, ny):
 			if not is_blocked(nx, ny) or ghost:
-				self.x = nx
-				self.y = ny
+				self.place(nx, ny)
 				return True
 		
 		return False
 		
 	def place(self, x, y):
 		#move without any checks
+		ox, oy = self.x, self.y
 		self.x = x
 		self.y = y
+		game.index.relocate(self, ox, oy)
+		self.changed()
 
 	def distance_to(self, other):
 		dx = other.x - self.x
@@ -117,32 +173,37 @@ class Object:
 		dy = int(round(dy / distance))
 		self.move(dx, dy)
 		
-	def draw(self):
-		if not self.known and libtcod.map_is_in_fov(fov_map, self.x, self.y):
+	def draw(self, con, camera):
+		#anything off screen is skipped before asking fov, so big maps don't pay for every object
+		if not camera.in_view(self.x, self.y):
+			return
+		if not self.known and in_fov(self.x, self.y):
 			self.known = True
 		if self.known:
 			libtcod.console_set_default_foreground(con, self.color)
-			libtcod.console_put_char(con, self.x, self.y, self.char, libtcod.BKGND_SET)
-	
-	def send_to_back(self):
-		#make this object drawn first, so it's covered by any other object
-		global objects
-		objects.remove(self)
-		objects.insert(0, self)
+			libtcod.console_put_char(con, self.x - camera.x, self.y - camera.y, self.char, libtcod.BKGND_SET)
 	
-	def clear(self):
-		if self.known:
-			libtcod.console_put_char(con, self.x, self.y, map[self.x][self.y].symbol, libtcod.BKGND_NONE)
+	def set_layer(self, layer):
+		#move to another draw layer, e.g. Z_CORPSES when dying
+		self.changed()
+		self.layer = layer
+		self.changed()
+		
+	def changed(self):
+		#call after changing anything that shows on screen, so its draw layer gets redrawn
+		if self.handle is not None:
+			game.objects.touch(self.layer)
 		
 
 #####################
 # OBJECT SUBCLASSES #
 #####################
 
-class Fighter:
+class Fighter(object):
 	#this is a widget with all the functionality for fighting.
 	#it includes stats (see init), functions for taking damage and attacking.
 	#dying and possibly skills will be relegated to outside functions.
+	__slots__ = ('owner', 'max_hp', 'hp', 'defence', 'power', 'death_function')
 
 	def __init__(self, hp, defence, power, death_function = None):
 		#all ints except death_function, which is a function
@@ -156,6 +217,9 @@ class Fighter:
 		#apply damage if possible. damage is an int.
 		if damage > 0:
 			self.hp -= damage
+			if self.owner.ai:
+				#getting hurt wakes anybody up
+				game.scheduler.wake(self.owner)
 			if self.hp <= 0:
 				function = self.death_function
 				if function is not None:
@@ -182,12 +246,12 @@ class Fighter:
 			
 def player_death(player):
 	#the game ends
-	global game_state
 	message('You died!', libtcod.red)
-	game_state = 'dead'
+	game.state = 'dead'
 	
 	player.char = '%'
 	player.color = libtcod.dark_red
+	player.changed()
 	
 def monster_death(monster):
 	#transform monster into a corpse that doesn't block
@@ -198,18 +262,21 @@ def monster_death(monster):
 	monster.fighter = None
 	monster.ai = None
 	monster.name = 'remains of ' + monster.name
-	monster.send_to_back()
+	monster.set_layer(Z_CORPSES)
+	
+class Item(object):
+	__slots__ = ('owner', 'use_function')
 	
-class Item:
 	def __init__(self, use_function=None):
 		self.use_function = use_function
 
 	def pick_up(self):
+		inventory = game.inventory
 		if len(inventory) >= 26:
 			message('Your inventory is full, cannot pick up {0}.'.format(self.owner.name), libtcod.red)
 		else:
 			inventory.append(self.owner)
-			objects.remove(self.owner)
+			remove_object(self.owner)
 			message('You pick up a {0}.'.format(self.owner.name), libtcod.green)
 			
 	def use(self):
@@ -217,18 +284,20 @@ class Item:
 			message('You cannot use this right now!')
 		else:
 			if self.use_function() != False:
-				inventory.remove(self.owner)
+				game.inventory.remove(self.owner)
 				
 	def drop(self):
 		#add item to map at player's coords and remove from inventory
-		objects.append(self.owner)
-		inventory.remove(self.owner)
-		self.owner.place(player.x, player.y)
+		game.inventory.remove(self.owner)
+		self.owner.place(game.player.x, game.player.y)
+		add_object(self.owner)
 		message("Dropped a {0}.".format(self.owner.name), libtcod.yellow)
 				
-class Interact:
+class Interact(object):
 	#A subtype for implementing usable objects, such as doors or NPCs. If use_command is None, it activates when the player moves into it.
 	#TODO: some actual NPCs that take advantage of this; doors were eventually implemented in a different way
+	__slots__ = ('owner', 'use_command', 'use_action')
+	
 	def __init__(self, use_command=None, use_action=None):
 		self.use_command = use_command
 		self.use_action = use_action
@@ -239,21 +308,32 @@ class Interact:
 ##############
 # AI CLASSES #
 ##############
-#Each of those must have a take_turn method.
+#Each of those must have a take_turn method. Returning 'sleep' from it takes the actor out of the
+#Scheduler until something wakes it up again. An optional catch_up(turns) is called when an actor
+#frozen outside the active zone thaws, with the number of turns it missed.
 
-class BasicMelee:
+class BasicMelee(object):
 	'''AI for a generic monster that approaches the player and attacks them.'''
+	__slots__ = ('owner',)
+	
 	def take_turn(self):
-		#turn of a basic monster. they run on ostrich logic, see player only if player sees them
+		#turn of a basic monster. it chases the player for as long as it can see them
 		monster = self.owner
-		if libtcod.map_is_in_fov(fov_map, monster.x, monster.y):
+		player = game.player
+		#anything out of sight range can't be seen, no need to ask libtcod
+		if max(abs(monster.x - player.x), abs(monster.y - player.y)) <= MONSTER_SIGHT and game.perception.sees(monster, player.x, player.y):
 			if monster.distance_to(player) >= 2:
-				monster.move_towards(player.x, player.y)
+				game.chase.step(monster)
 			elif player.fighter.hp > 0:
 				monster.fighter.attack(player)
+		else:
+			#out of sight, out of mind. Game.wake_watchers wakes it once it sees the player again
+			return 'sleep'
 
-class Confused:
+class Confused(object):
 	'''AI for a confused monster. Moves in a random direction and lasts a set number of turns.'''
+	__slots__ = ('owner', 'old_ai', 'num_turns')
+	
 	def __init__(self, old_ai, num_turns = CONFUSE_NUM_TURNS):
 		self.old_ai = old_ai
 		self.num_turns = num_turns
@@ -261,18 +341,23 @@ class Confused:
 	def take_turn(self):
 		if self.num_turns > 0:
 			#print a message if move fails
-			if not self.owner.move(libtcod.random_get_int(0, -1, 1), libtcod.random_get_int(0, -1, 1)):
+			if not self.owner.move(libtcod.random_get_int(game.rng, -1, 1), libtcod.random_get_int(game.rng, -1, 1)):
 				message('The {0} stumbles in its confusion!'.format(self.owner.name), libtcod.light_grey)
 			self.num_turns -= 1
 		else:
 			self.owner.ai = self.old_ai
 			message('The {0} is no longer confused!'.format(self.owner.name), libtcod.red)
+			
+	def catch_up(self, turns):
+		#after being frozen, the confusion wore off for the turns missed without any stumbling
+		self.num_turns = max(0, self.num_turns - turns)
 
 ################
 # MAP HANDLING #
 ################
 class Tile:
-	#a tile of the map and its properties
+	#a tile of the map and its properties. the map itself doesn't keep these around,
+	#it copies them into its layers when a Tile is assigned with map[x][y] = Tile(...)
 	
 	def __init__(self, blocked, block_sight = None, symbol = '&', usable=None):
 		#the default state is just a normal wall.
@@ -285,6 +370,229 @@ class Tile:
 		if self.usable:
 			self.usable.owner = self
 
+#maps are stored in square chunks, see GameMap
+CHUNK_SHIFT = 5
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_CELLS = CHUNK_SIZE * CHUNK_SIZE
+#chunks further than this many chunks from the player get packed
+ACTIVE_CHUNKS = 2
+LAYERS = ('blocked', 'block_sight', 'explored', 'glyph')
+
+class Chunk:
+	'''CHUNK_SIZE x CHUNK_SIZE tiles of the map. Every layer is a flat array indexed by ly*CHUNK_SIZE + lx,
+	or, while the chunk is packed, all layers together are one zlib string in packed.'''
+	
+	def __init__(self):
+		#the default state is just a normal wall.
+		self.blocked = array('B', [1]) * CHUNK_CELLS
+		self.block_sight = array('B', [1]) * CHUNK_CELLS
+		self.explored = array('B', [0]) * CHUNK_CELLS
+		self.glyph = array('B', [ord('&')]) * CHUNK_CELLS
+		self.packed = None
+		
+	def pack(self):
+		self.packed = zlib.compress(''.join(getattr(self, layer).tostring() for layer in LAYERS))
+		for layer in LAYERS:
+			setattr(self, layer, None)
+			
+	def unpack(self):
+		data = zlib.decompress(self.packed)
+		for (n, layer) in enumerate(LAYERS):
+			layer_array = array('B')
+			layer_array.fromstring(data[n * CHUNK_CELLS:(n + 1) * CHUNK_CELLS])
+			setattr(self, layer, layer_array)
+		self.packed = None
+
+#stands in for every chunk nothing was ever dug in. only ever read, never written
+SOLID_CHUNK = Chunk()
+
+class GameMap:
+	'''Chunked map storage. Tiles live in Chunks keyed by (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT), which are
+	only allocated once something in them is dug, and packed with zlib while they are away from the player.'''
+	#blocked, block_sight and explored are 0/1 bytes, glyph holds the ord() of the symbol.
+	#a tile is still named by its index y*width + x wherever a single key is needed: usables (doors)
+	#are few, so they live in a dict keyed by it, and the dirty sets hold it too.
+	#changes to blocked/block_sight are remembered in fov_dirty so update_fovmap only pushes those;
+	#bulk edits just set fov_stale and get a full rebuild instead. render_dirty/render_stale
+	#do the same for tiles whose look changed, for the RenderCache.
+	
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		self.chunks = {}
+		self.usable = {}
+		self.fov_dirty = set()
+		self.fov_stale = True
+		self.render_dirty = set()
+		self.render_stale = True
+		
+	def __getitem__(self, x):
+		#map[x][y] still works, it just hands out views instead of stored objects
+		return MapColumn(self, x)
+		
+	def index(self, x, y):
+		return y * self.width + x
+		
+	def in_bounds(self, x, y):
+		return 0 <= x < self.width and 0 <= y < self.height
+		
+	def chunk(self, x, y):
+		#the chunk holding x, y, for reading. untouched chunks are all SOLID_CHUNK
+		chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+		if chunk is None:
+			return SOLID_CHUNK
+		if chunk.packed is not None:
+			chunk.unpack()
+		return chunk
+		
+	def chunk_for_write(self, x, y):
+		key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+		chunk = self.chunks.get(key)
+		if chunk is None:
+			chunk = self.chunks[key] = Chunk()
+		elif chunk.packed is not None:
+			chunk.unpack()
+		return chunk
+		
+	def locate(self, x, y):
+		'''Returns (chunk, i) so that chunk.<layer>[i] is the tile at x, y. The chunk may only be read from.'''
+		return self.chunk(x, y), ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+		
+	def get(self, layer, x, y):
+		return getattr(self.chunk(x, y), layer)[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+		
+	def set(self, layer, x, y, value):
+		getattr(self.chunk_for_write(x, y), layer)[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] = value
+		
+	def set_tile(self, x, y, tile):
+		#copy a Tile template into the layers
+		chunk = self.chunk_for_write(x, y)
+		j = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+		chunk.blocked[j] = bool(tile.blocked)
+		chunk.block_sight[j] = bool(tile.block_sight)
+		chunk.explored[j] = bool(tile.explored)
+		chunk.glyph[j] = ord(tile.symbol)
+		i = y * self.width + x
+		self.set_usable(i, tile.usable)
+		self.fov_dirty.add(i)
+		self.render_dirty.add(i)
+		
+	def set_usable(self, i, usable):
+		if usable:
+			#rebind the usable to a live view so its function can change the tile
+			usable.owner = TileView(self, i % self.width, i // self.width)
+			self.usable[i] = usable
+		else:
+			self.usable.pop(i, None)
+			
+	def spans(self, x1, y1, x2, y2, allocate = False):
+		'''Splits the half-open rectangle [x1, x2) x [y1, y2) along chunk borders. Yields
+		(chunk, x, y, start, w) for every row piece: chunk.<layer>[start:start+w] are the tiles x..x+w-1 of row y.
+		Without allocate, pieces in untouched chunks are skipped.'''
+		x1, y1 = max(x1, 0), max(y1, 0)
+		x2, y2 = min(x2, self.width), min(y2, self.height)
+		for cy in range(y1 >> CHUNK_SHIFT, ((y2 - 1) >> CHUNK_SHIFT) + 1):
+			top = max(y1, cy << CHUNK_SHIFT)
+			bottom = min(y2, (cy + 1) << CHUNK_SHIFT)
+			for cx in range(x1 >> CHUNK_SHIFT, ((x2 - 1) >> CHUNK_SHIFT) + 1):
+				if allocate:
+					chunk = self.chunk_for_write(cx << CHUNK_SHIFT, cy << CHUNK_SHIFT)
+				elif (cx, cy) in self.chunks:
+					chunk = self.chunk(cx << CHUNK_SHIFT, cy << CHUNK_SHIFT)
+				else:
+					continue
+				left = max(x1, cx << CHUNK_SHIFT)
+				w = min(x2, (cx + 1) << CHUNK_SHIFT) - left
+				for y in range(top, bottom):
+					yield chunk, left, y, ((y & CHUNK_MASK) << CHUNK_SHIFT) | (left & CHUNK_MASK), w
+	
+	def fill_rect(self, x1, y1, x2, y2, blocked, block_sight, symbol):
+		'''Set every tile in the half-open rectangle [x1, x2) x [y1, y2) in one go, a row slice at a time.'''
+		if x2 <= x1 or y2 <= y1:
+			return
+		rows = {}
+		for (chunk, x, y, start, w) in self.spans(x1, y1, x2, y2, allocate = True):
+			if w not in rows:
+				rows[w] = (array('B', [bool(blocked)]) * w, array('B', [bool(block_sight)]) * w, array('B', [ord(symbol)]) * w)
+			(blocked_row, sight_row, glyph_row) = rows[w]
+			chunk.blocked[start:start+w] = blocked_row
+			chunk.block_sight[start:start+w] = sight_row
+			chunk.glyph[start:start+w] = glyph_row
+		self.fov_stale = True
+		self.render_stale = True
+			
+	def dig(self, x1, y1, x2, y2):
+		#turn a rectangle into plain floor
+		self.fill_rect(x1, y1, x2, y2, False, False, '.')
+		
+	def compact(self, x, y, reach = ACTIVE_CHUNKS):
+		'''Packs every chunk more than reach chunks away from the one holding x, y. Returns how many were packed.'''
+		(px, py) = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+		packed = 0
+		for ((cx, cy), chunk) in self.chunks.items():
+			if chunk.packed is None and max(abs(cx - px), abs(cy - py)) > reach:
+				chunk.pack()
+				packed += 1
+		return packed
+
+class MapColumn:
+	#what map[x] returns, only there so map[x][y] can be read and assigned
+	def __init__(self, gamemap, x):
+		self.map = gamemap
+		self.x = x
+		
+	def __getitem__(self, y):
+		return TileView(self.map, self.x, y)
+		
+	def __setitem__(self, y, tile):
+		self.map.set_tile(self.x, y, tile)
+
+class TileView(object):
+	'''A thin per-cell view into a GameMap, with the same attributes Tile has.'''
+	__slots__ = ('map', 'x', 'y', 'i')
+	
+	def __init__(self, gamemap, x, y):
+		self.map = gamemap
+		self.x = x
+		self.y = y
+		self.i = y * gamemap.width + x
+		
+	def _get_blocked(self):
+		return bool(self.map.get('blocked', self.x, self.y))
+	def _set_blocked(self, value):
+		self.map.set('blocked', self.x, self.y, bool(value))
+		self.map.fov_dirty.add(self.i)
+	blocked = property(_get_blocked, _set_blocked)
+	
+	def _get_block_sight(self):
+		return bool(self.map.get('block_sight', self.x, self.y))
+	def _set_block_sight(self, value):
+		self.map.set('block_sight', self.x, self.y, bool(value))
+		self.map.fov_dirty.add(self.i)
+		self.map.render_dirty.add(self.i)
+	block_sight = property(_get_block_sight, _set_block_sight)
+	
+	def _get_explored(self):
+		return bool(self.map.get('explored', self.x, self.y))
+	def _set_explored(self, value):
+		self.map.set('explored', self.x, self.y, bool(value))
+		self.map.render_dirty.add(self.i)
+	explored = property(_get_explored, _set_explored)
+	
+	def _get_symbol(self):
+		return chr(self.map.get('glyph', self.x, self.y))
+	def _set_symbol(self, value):
+		self.map.set('glyph', self.x, self.y, ord(value))
+		self.map.render_dirty.add(self.i)
+	symbol = property(_get_symbol, _set_symbol)
+	
+	def _get_usable(self):
+		return self.map.usable.get(self.i)
+	def _set_usable(self, value):
+		self.map.set_usable(self.i, value)
+	usable = property(_get_usable, _set_usable)
+
 class Usable:
 	def __init__(self, use_function):
 		self.use_function = use_function
@@ -294,7 +602,7 @@ class Usable:
 		
 def open_door(door):
 	#a creak for flavour
-	if libtcod.random_get_int(0, 1, 4) > 3:
+	if libtcod.random_get_int(game.rng, 1, 4) > 3:
 		message('The door creaks loudly!', libtcod.light_grey)
 	door.symbol = '\''
 	door.block_sight = False
@@ -327,47 +635,75 @@ class Rect:
 		return (self.x1 <= other.x2 and self.x2 >= other.x1 and self.y1 <= other.y2 and self.y2 >= other.y1)
 		
 	def borders(self):
-		#for placing doors and custom walls!
+		#for placing doors and custom walls! only walks the perimeter, in the same order a full scan would
 		border = []
 		for x in range(self.x1, self.x2+1):
-			for y in range(self.y1, self.y2+1):
-				if (x, y) not in self:
+			if x == self.x1 or x == self.x2:
+				for y in range(self.y1, self.y2+1):
 					border.append((x,y))
+			else:
+				border.append((x, self.y1))
+				border.append((x, self.y2))
 		return border
+
+class RoomGrid:
+	'''Buckets rooms by the ROOM_GRID_SIZE squares they touch, so an overlap test only looks at rooms nearby
+	instead of every room placed so far.'''
+	
+	def __init__(self):
+		self.cells = {}
+		
+	def cells_of(self, room):
+		#x2/y2 count as part of the room here, the same as in intersect()
+		for gx in range(room.x1 // ROOM_GRID_SIZE, room.x2 // ROOM_GRID_SIZE + 1):
+			for gy in range(room.y1 // ROOM_GRID_SIZE, room.y2 // ROOM_GRID_SIZE + 1):
+				yield (gx, gy)
+				
+	def add(self, room):
+		for cell in self.cells_of(room):
+			self.cells.setdefault(cell, []).append(room)
+			
+	def intersects(self, room):
+		for cell in self.cells_of(room):
+			for other in self.cells.get(cell, ()):
+				if room.intersect(other):
+					return True
+		return False
+		
+	def room_at(self, x, y):
+		#the room whose floor or walls include x, y, if any. walls count, so rooms never share a tile
+		for room in self.cells.get((x // ROOM_GRID_SIZE, y // ROOM_GRID_SIZE), ()):
+			if room.x1 <= x <= room.x2 and room.y1 <= y <= room.y2:
+				return room
+		return None
 		
 def create_room(room, doors = False):
-	global map
-	
-	for x in range(room.x1+1, room.x2):
-		for y in range(room.y1+1, room.y2):
-			map[x][y].blocked = False
-			map[x][y].block_sight = False
-			map[x][y].symbol = '.'
+	game.map.dig(room.x1+1, room.y1+1, room.x2, room.y2)
 
 def place_objects(room):
-	num_monsters = libtcod.random_get_int(0, 0, MAX_ROOM_MONSTERS)
-	num_items = libtcod.random_get_int(0, 0, MAX_ROOM_ITEMS)
+	num_monsters = libtcod.random_get_int(game.rng, 0, MAX_ROOM_MONSTERS)
+	num_items = libtcod.random_get_int(game.rng, 0, MAX_ROOM_ITEMS)
 	
 	for i in range(num_monsters):
-		x = libtcod.random_get_int(0, room.x1+1, room.x2-1)
-		y = libtcod.random_get_int(0, room.y1+1, room.y2-1)
+		x = libtcod.random_get_int(game.rng, room.x1+1, room.x2-1)
+		y = libtcod.random_get_int(game.rng, room.y1+1, room.y2-1)
 		
 		if not is_blocked(x, y):
 		#create monster if tile is free. TODO: will have to delegate the monster stats to a table or something later
-			dice = libtcod.random_get_int(0, 0, 100)
+			dice = libtcod.random_get_int(game.rng, 0, 100)
 			if dice < 80:
 				#kobold
 				monster = Object(x, y, 'k', 'kobold', libtcod.dark_blue, True, fighter=Fighter(10,0,3), ai=BasicMelee())
 			else:
 				#dragon
 				monster = Object(x, y, 'D', 'dragon', libtcod.darker_green, True, fighter=Fighter(16,1,4), ai=BasicMelee())
-			objects.append(monster)
+			add_object(monster)
 			
 	for i in range(num_items):
-		x = libtcod.random_get_int(0, room.x1+1, room.x2-1)
-		y = libtcod.random_get_int(0, room.y1+1, room.y2-1)
+		x = libtcod.random_get_int(game.rng, room.x1+1, room.x2-1)
+		y = libtcod.random_get_int(game.rng, room.y1+1, room.y2-1)
 		if not is_blocked(x, y):
-			dice = libtcod.random_get_int(0, 0, 100)
+			dice = libtcod.random_get_int(game.rng, 0, 100)
 			if dice < 60:
 				#potion
 				item = Object(x, y, "!", "healing potion", libtcod.flame, item=Item(cast_heal))
@@ -380,25 +716,15 @@ def place_objects(room):
 			else:
 				#scroll of fireball
 				item = Object(x, y, "?", "scroll of fireball", libtcod.red, item=Item(cast_fireball))
-			objects.append(item)
-			item.send_to_back()
+			add_object(item)
 
 def create_h_tunnel(x1, x2, y):
-	global map
 	#horizontal tunnel
-	
-	for x in range(min(x1, x2), max(x1, x2)+1):
-		map[x][y].blocked = False
-		map[x][y].block_sight = False
-		map[x][y].symbol = '.'
+	game.map.dig(min(x1, x2), y, max(x1, x2)+1, y+1)
 
 def create_v_tunnel(y1, y2, x):
-	global map
 	#vertical tunnel
-	for y in range(min(y1, y2), max(y1, y2)+1):
-		map[x][y].blocked = False
-		map[x][y].block_sight = False
-		map[x][y].symbol = '.'
+	game.map.dig(x, min(y1, y2), x+1, max(y1, y2)+1)
 
 	
 def connect_rooms(room1, room2):
@@ -406,7 +732,7 @@ def connect_rooms(room1, room2):
 	(prev_x, prev_y) = room1.center()
 	(new_x, new_y) = room2.center()
 	
-	if libtcod.random_get_int(0,0,1) == 1:
+	if libtcod.random_get_int(game.rng,0,1) == 1:
 		#flip a coin: either create h tunnel first and v second
 		create_h_tunnel(prev_x, new_x, prev_y)
 		create_v_tunnel(prev_y, new_y, new_x)
@@ -418,46 +744,319 @@ def connect_rooms(room1, room2):
 def is_blocked(x, y):
 	#check if given tile is blocked
 	#test for impassable terrain
-	if x >= MAP_WIDTH or y >= MAP_HEIGHT:
+	map = game.map
+	if not map.in_bounds(x, y):
 		return True
 		
-	if map[x][y].blocked:
+	if map.get('blocked', x, y):
 		return True
 		
 	#test for impassable objects
-	for object in objects:
-		if object.blocks and object.x == x and object.y == y:
-			return True
+	if game.index.blocker_at(x, y) is not None:
+		return True
 			
 	return False
+
+class ChaseField:
+	'''Distances to the player over the fov window, from a single Dijkstra run kept until the player moves,
+	the window moves or its opacity changes. A chasing monster just steps to its closest free neighbour,
+	so there's no pathfinding per monster however many chase.'''
+	#monsters only chase what they see, and fov never reaches past the window, so the window is enough.
+	#the walkable tiles come from the fov_map, already kept in sync by update_fovmap. libtcod 1.5.1's own
+	#dijkstra_compute can expand queue slots it never filled, handing tiles next to them distances like 0.99
+	#that depend on whatever was in memory, so the search is done here, with its costs (100 and 141 a step).
+	
+	def __init__(self, fov_map):
+		self.fov_map = fov_map
+		#the window with a wall all around it, so neighbours never need bounds checks
+		self.width = FOV_WINDOW + 2
+		self.dist = array('i', [-1]) * (self.width * self.width)
+		self.steps = [(dy * self.width + dx, 141 if dx and dy else 100) for (dx, dy) in NEIGHBOURS]
+		self.key = None	#(player x, player y, fov_offset, opacity version) the distances were computed for
+		
+	def update(self):
+		#built by the first monster that asks, and only again once the player or the window moved or a tile in it
+		#changed (update_fovmap bumps game.opacity_version for walkability too). monsters aren't walls here
+		key = (game.player.x, game.player.y, game.fov_offset, game.opacity_version)
+		if key != self.key:
+			(ox, oy) = game.fov_offset
+			self.compute(game.player.x - ox, game.player.y - oy)
+			self.key = key
+			
+	def compute(self, x, y):
+		w = self.width
+		walkable = bytearray(w * w)
+		cells = libtcod.map_get_walkable_all(self.fov_map)
+		for row in range(FOV_WINDOW):
+			walkable[(row + 1) * w + 1:(row + 1) * w + 1 + FOV_WINDOW] = cells[row * FOV_WINDOW:(row + 1) * FOV_WINDOW]
+		dist = self.dist = array('i', [-1]) * (w * w)
+		start = (y + 1) * w + x + 1
+		dist[start] = 0
+		queue = [(0, start)]
+		steps = self.steps
+		while queue:
+			(d, c) = heapq.heappop(queue)
+			if d > dist[c]:
+				continue
+			for (offset, cost) in steps:
+				n = c + offset
+				if walkable[n] and (dist[n] < 0 or d + cost < dist[n]):
+					dist[n] = d + cost
+					heapq.heappush(queue, (d + cost, n))
+					
+	def distance(self, x, y):
+		#-1 for walls and anything the player can't be reached from
+		(ox, oy) = game.fov_offset
+		x -= ox
+		y -= oy
+		if not (0 <= x < FOV_WINDOW and 0 <= y < FOV_WINDOW):
+			return -1
+		d = self.dist[(y + 1) * self.width + x + 1]
+		return d / 100.0 if d >= 0 else -1
+		
+	def step(self, obj):
+		'''Moves obj one step downhill. Returns False if no free neighbour is any closer.'''
+		self.update()
+		best = self.distance(obj.x, obj.y)
+		if best < 0:
+			best = float('inf')
+		move = None
+		for (dx, dy) in NEIGHBOURS:
+			d = self.distance(obj.x + dx, obj.y + dy)
+			if 0 <= d < best and not is_blocked(obj.x + dx, obj.y + dy):
+				best = d
+				move = (dx, dy)
+		if move is None:
+			return False
+		return obj.move(*move)
+		
+class Perception:
+	'''Monster sight. Every viewer gets its own FOV map from a pool, covering the same window as game.fov_map,
+	and keeps it until it moves or the window's opacity changes (update_fovmap bumps game.opacity_version,
+	so opening a door counts). A monster that stands still doesn't compute anything, and the window is
+	copied over in one call instead of being filled tile by tile. The least recently used map gets reused.'''
+	
+	def __init__(self, size = PERCEPTION_POOL):
+		self.size = size
+		self.views = OrderedDict()	#viewer -> [fov map, (x, y, opacity version)], least recently used first
 		
+	def look(self, viewer):
+		#the viewer's fov map, brought up to date
+		view = self.views.pop(viewer, None)
+		if view is None:
+			if len(self.views) >= self.size:
+				(ignored, view) = self.views.popitem(last = False)
+			else:
+				view = [libtcod.map_new(FOV_WINDOW, FOV_WINDOW), None]
+		self.views[viewer] = view
+		key = (viewer.x, viewer.y, game.opacity_version)
+		if view[1] != key:
+			(ox, oy) = game.fov_offset
+			libtcod.map_copy(game.fov_map, view[0])
+			libtcod.map_compute_fov(view[0], viewer.x - ox, viewer.y - oy, MONSTER_SIGHT, FOV_LIGHT_WALLS, FOV_ALGO)
+			view[1] = key
+		return view[0]
+		
+	def sees(self, viewer, x, y):
+		'''True if viewer can see map tile x, y. Only what's inside the fov window can be seen, which always
+		includes the player and anything close enough to see them.'''
+		(ox, oy) = game.fov_offset
+		if not (0 <= viewer.x - ox < FOV_WINDOW and 0 <= viewer.y - oy < FOV_WINDOW):
+			return False
+		if not (0 <= x - ox < FOV_WINDOW and 0 <= y - oy < FOV_WINDOW):
+			return False
+		return libtcod.map_is_in_fov(self.look(viewer), x - ox, y - oy)
+		
+	def close(self):
+		for (fov_map, key) in self.views.values():
+			libtcod.map_delete(fov_map)
+		self.views.clear()
+		
+################
+# OBJECT INDEX #
+################
+INDEX_CELL_SIZE = 8
+
+class SpatialIndex:
+	'''Keeps track of where objects on the map are, so nobody has to scan the whole objects list.'''
+	#two levels: cells maps (x, y) to the objects standing there, grid maps coarse
+	#INDEX_CELL_SIZE squares to their objects for radius and nearest queries.
+	#buckets are lists rather than sets so that queries come out in a repeatable order.
+	
+	def __init__(self, cell_size = INDEX_CELL_SIZE):
+		self.size = cell_size
+		self.cells = {}
+		self.grid = {}
+		
+	def add(self, obj):
+		self.cells.setdefault((obj.x, obj.y), []).append(obj)
+		self.grid.setdefault((obj.x // self.size, obj.y // self.size), []).append(obj)
+		
+	def remove(self, obj):
+		self._discard(self.cells, (obj.x, obj.y), obj)
+		self._discard(self.grid, (obj.x // self.size, obj.y // self.size), obj)
+		
+	def relocate(self, obj, ox, oy):
+		#call after obj moved away from (ox, oy). objects that were never added (cursors, carried items) are ignored
+		bucket = self.cells.get((ox, oy))
+		if bucket is None or obj not in bucket:
+			return
+		self._discard(self.cells, (ox, oy), obj)
+		self.cells.setdefault((obj.x, obj.y), []).append(obj)
+		old_key = (ox // self.size, oy // self.size)
+		new_key = (obj.x // self.size, obj.y // self.size)
+		if old_key != new_key:
+			self._discard(self.grid, old_key, obj)
+			self.grid.setdefault(new_key, []).append(obj)
+			
+	def _discard(self, buckets, key, obj):
+		bucket = buckets[key]
+		bucket.remove(obj)
+		if not bucket:
+			del buckets[key]
+			
+	def at(self, x, y):
+		#a copy, so callers can pick up or kill what they find while iterating
+		return list(self.cells.get((x, y), ()))
+		
+	def blocker_at(self, x, y):
+		for obj in self.cells.get((x, y), ()):
+			if obj.blocks:
+				return obj
+		return None
+		
+	def in_rect(self, x, y, w, h):
+		'''All objects inside the w by h rectangle with its top left corner at (x, y).'''
+		s = self.size
+		found = []
+		for bx in range(x // s, (x + w - 1) // s + 1):
+			for by in range(y // s, (y + h - 1) // s + 1):
+				for obj in self.grid.get((bx, by), ()):
+					if x <= obj.x < x + w and y <= obj.y < y + h:
+						found.append(obj)
+		return found
+		
+	def in_radius(self, x, y, radius):
+		'''All objects no further than radius from (x, y).'''
+		s = self.size
+		found = []
+		for bx in range((x - radius) // s, (x + radius) // s + 1):
+			for by in range((y - radius) // s, (y + radius) // s + 1):
+				for obj in self.grid.get((bx, by), ()):
+					if distance(x, y, obj.x, obj.y) <= radius:
+						found.append(obj)
+		return found
+		
+	def nearest(self, x, y, max_dist, check = None):
+		'''The object closest to (x, y) that is nearer than max_dist and passes check, or None.'''
+		#walk rings of grid squares outwards and stop once a ring can't hold anything closer
+		s = self.size
+		bx, by = x // s, y // s
+		best = None
+		best_dist = max_dist
+		for ring in range(int(max_dist) // s + 2):
+			if (ring - 1) * s >= best_dist:
+				break
+			for key in grid_ring(bx, by, ring):
+				for obj in self.grid.get(key, ()):
+					dist = distance(x, y, obj.x, obj.y)
+					if dist < best_dist and (check is None or check(obj)):
+						best = obj
+						best_dist = dist
+		return best
+
+def grid_ring(cx, cy, ring):
+	#grid squares exactly ring steps away from (cx, cy), in a fixed order
+	if ring == 0:
+		return [(cx, cy)]
+	keys = []
+	for dx in range(-ring, ring + 1):
+		keys.append((cx + dx, cy - ring))
+		keys.append((cx + dx, cy + ring))
+	for dy in range(-ring + 1, ring):
+		keys.append((cx - ring, cy + dy))
+		keys.append((cx + ring, cy + dy))
+	return keys
+
+class EntityStore:
+	'''Every object on the map, each under an integer handle that stays the same for as long as it's there.'''
+	#a removed object's slot goes on a free list for the next one added, so adding and removing are O(1)
+	#whatever the number of objects. versions counts the changes to each draw layer, so the renderer
+	#knows which ones need redrawing.
+	
+	def __init__(self):
+		self.slots = []
+		self.free = []
+		self.count = 0
+		self.versions = [0] * Z_LAYERS
+		
+	def add(self, obj):
+		if self.free:
+			handle = self.free.pop()
+			self.slots[handle] = obj
+		else:
+			handle = len(self.slots)
+			self.slots.append(obj)
+		obj.handle = handle
+		self.count += 1
+		self.touch(obj.layer)
+		return handle
+		
+	def remove(self, obj):
+		self.slots[obj.handle] = None
+		self.free.append(obj.handle)
+		obj.handle = None
+		self.count -= 1
+		self.touch(obj.layer)
+		
+	def touch(self, layer):
+		self.versions[layer] += 1
+		
+	def get(self, handle):
+		return self.slots[handle]
+		
+	def __contains__(self, obj):
+		return obj.handle is not None and self.slots[obj.handle] is obj
+		
+	def __len__(self):
+		return self.count
+		
+	def __iter__(self):
+		#in handle order. a snapshot, so objects can be added or removed while iterating
+		return iter([obj for obj in self.slots if obj is not None])
+	
+def add_object(obj):
+	#put an object on the map. always use this instead of objects.add so the index stays in sync.
+	game.objects.add(obj)
+	game.index.add(obj)
+	
+def remove_object(obj):
+	game.objects.remove(obj)
+	game.index.remove(obj)
+
 #map size and creation
 MAP_WIDTH = 80
 MAP_HEIGHT = 43
-rooms = []
 
-def make_map():
-	global map, player
-	
-	#fill map with unblocked tiles
-	map = [[ Tile(True) for y in range(MAP_HEIGHT)] for x in range(MAP_WIDTH)]
+def make_map(width = MAP_WIDTH, height = MAP_HEIGHT, max_rooms = MAX_ROOMS):
+	player = game.player
+	rooms = game.rooms
 	
+	#fill map with blocked tiles
+	map = game.map = GameMap(width, height)
+	grid = RoomGrid()
 	
 	num_rooms = 0
-	for r in range(MAX_ROOMS):
+	for r in range(max_rooms):
 		#randomize size
-		w = libtcod.random_get_int(0, ROOM_MIN_SIZE, ROOM_MAX_SIZE)
-		h = libtcod.random_get_int(0, ROOM_MIN_SIZE, ROOM_MAX_SIZE)
+		w = libtcod.random_get_int(game.rng, ROOM_MIN_SIZE, ROOM_MAX_SIZE)
+		h = libtcod.random_get_int(game.rng, ROOM_MIN_SIZE, ROOM_MAX_SIZE)
 		#restrict position to within map
-		x = libtcod.random_get_int(0,0,MAP_WIDTH - w - 1)
-		y = libtcod.random_get_int(0,0,MAP_HEIGHT - h - 1)
+		x = libtcod.random_get_int(game.rng,0,width - w - 1)
+		y = libtcod.random_get_int(game.rng,0,height - h - 1)
 		#check if it intersects
 		new_room = Rect(x, y, w, h)
-		failed = False
-		for other_room in rooms:
-			if new_room.intersect(other_room):
-				failed = True
-				break
+		failed = grid.intersects(new_room)
 		
 		if not failed:
 			create_room(new_room)
@@ -465,9 +1064,8 @@ def make_map():
 			
 			#DEBUG OPTION: identifies room creation order
 			if DEBUG_ON == True:
-				room_no = Object(new_x, new_y, chr(65+num_rooms), 'room number', libtcod.white)
-				objects.insert(0, room_no)
-				room_no.send_to_back()
+				room_no = Object(new_x, new_y, chr(65+num_rooms), 'room number', libtcod.white, layer=Z_ITEMS)
+				add_object(room_no)
 			
 			if num_rooms == 0:
 				#the first room always contains the player
@@ -482,31 +1080,335 @@ def make_map():
 			#append created room to rooms list
 			place_objects(new_room)
 			rooms.append(new_room)
+			grid.add(new_room)
 			num_rooms += 1
 	
 	#create doors
 	for room in rooms:
 		entrances = []
 		for (x, y) in room.borders():
-			if not map[x][y].blocked: entrances.append((x, y))
+			if not map.get('blocked', x, y): entrances.append((x, y))
 		if len(entrances) < 5:
 		#to prevent having entire walls of doors where corridors and rooms touch
 			for (x, y) in entrances:
 				door = Usable(open_door)
 				map[x][y] = Tile(True, True, '+', door)
+	
+	#a torch on the middle of every room's top wall, unless a corridor or a door took its place
+	for room in rooms:
+		(x, y) = (room.center()[0], room.y1)
+		if map.get('block_sight', x, y) and map.index(x, y) not in map.usable:
+			game.lighting.add(Light(x, y, WALL_TORCH_RADIUS, WALL_TORCH_COLOR, WALL_TORCH_FALLOFF))
+	
+	game.room_graph = RoomGraph(map, rooms, grid)
+
+###############
+# PATHFINDING #
+###############
+#how many corridor cells find_path looks through from an end that isn't in a room
+CORRIDOR_SEARCH = 500
+#what RoomGraph.build sorts the cells into
+PATH_WALL = 0
+PATH_CORRIDOR = 1
+PATH_PORTAL = 2
+PATH_FLOOR = 3
+
+class RoomGraph:
+	'''The structure make_map builds: rooms, their portals (the cells where doors and corridors go through a
+	room's wall) and the corridors linking portals. find_path plans over whole rooms, then fills in the cells
+	one room or one corridor at a time, so long paths cost about as much as the rooms on them. Routes between
+	two rooms are kept.'''
+	#built on the first query rather than in make_map, so games that never ask don't pay for it.
+	#doors count as passable, since walking into one opens it; monsters are ignored.
+	
+	def __init__(self, gamemap, rooms, grid):
+		self.map = gamemap
+		self.rooms = rooms
+		self.grid = grid
+		self.built = False
+		self.kind = None	#flat bytearray of PATH_* per cell
+		self.parent = None	#corridor cell -> the next cell towards its nearest portal, or -1
+		self.centers = {}	#room -> its center
+		self.portals = {}	#room -> its portal cells
+		self.owner = {}		#portal -> room
+		self.adjacent = {}	#room -> {room: cost from center to center} for rooms a corridor leads to
+		self.crossings = {}	#(room, room) -> (portal, portal, meet), the cheapest corridor between them
+		self.routes = {}	#(room, room) -> [(portal, meet)], see plan
+		
+	def build(self):
+		'''Sorts every cell into wall, room floor, portal or corridor, then floods the corridors from all portals
+		at once. Where two floods meet, the portals they started from are linked, so the map is walked only once.'''
+		m = self.map
+		w = m.width
+		n = w * m.height
+		kind = self.kind = bytearray(n)
+		to_corridor = string.maketrans('\x00\x01', chr(PATH_CORRIDOR) + chr(PATH_WALL))
+		for (chunk, x, y, start, length) in m.spans(0, 0, m.width, m.height):
+			i = y * w + x
+			kind[i:i+length] = chunk.blocked[start:start+length].tostring().translate(to_corridor)
+		for i in m.usable:
+			kind[i] = PATH_CORRIDOR
+		#nothing is ever dug on the edge of the map, making sure of it means neighbours never need bounds checks
+		kind[0:w] = kind[n-w:n] = bytearray(w)
+		for i in range(0, n, w):
+			kind[i] = kind[i+w-1] = PATH_WALL
+			
+		source = array('i', [-1]) * n
+		dist = array('i', [0]) * n
+		parent = self.parent = array('i', [-1]) * n
+		owner = {}
+		queue = deque()
+		for room in self.rooms:
+			self.centers[room] = room.center()
+			self.adjacent[room] = {}
+			portals = self.portals[room] = [(x, y) for (x, y) in room.borders() if kind[y * w + x]]
+			for (x, y) in portals:
+				self.owner[(x, y)] = owner[y * w + x] = room
+				kind[y * w + x] = PATH_PORTAL
+				source[y * w + x] = y * w + x
+				queue.append(y * w + x)
+			floor = bytearray(chr(PATH_FLOOR) * (room.x2 - room.x1 - 1))
+			for y in range(room.y1 + 1, room.y2):
+				kind[y * w + room.x1 + 1:y * w + room.x2] = floor
+				
+		offsets = [dy * w + dx for (dx, dy) in NEIGHBOURS]
+		meets = {}
+		while queue:
+			c = queue.popleft()
+			a = source[c]
+			for o in offsets:
+				i = c + o
+				b = source[i]
+				if b >= 0:
+					if b != a and owner[a] is not owner[b]:
+						cost = dist[c] + 1 + dist[i]
+						if (a, b) not in meets or cost < meets[(a, b)][0]:
+							meets[(a, b)] = (cost, c, i)
+				elif kind[i] == PATH_CORRIDOR:
+					source[i] = a
+					dist[i] = dist[c] + 1
+					parent[i] = c
+					queue.append(i)
+					
+		for ((a, b), (cost, c, i)) in meets.items():
+			#both directions get recorded by the flood, keep the cheaper one once
+			if (b, a) in meets and (meets[(b, a)][0], b) < (cost, a):
+				continue
+			(p, q) = ((a % w, a // w), (b % w, b // w))
+			(room_p, room_q) = (owner[a], owner[b])
+			cost += chebyshev(self.centers[room_p], p) + chebyshev(q, self.centers[room_q])
+			if cost < self.adjacent[room_p].get(room_q, cost + 1):
+				self.adjacent[room_p][room_q] = self.adjacent[room_q][room_p] = cost
+				self.crossings[(room_p, room_q)] = (p, q, (c, i))
+				self.crossings[(room_q, room_p)] = (q, p, (i, c))
+		self.built = True
+		
+	def corridor_cells(self, (near, far), portal):
+		#the cells of a corridor link: up the flood tree to near, across to far and down to portal
+		w = self.map.width
+		cells = unwind(self.parent, near) + list(reversed(unwind(self.parent, far)))
+		return [(i % w, i // w) for i in cells] + [portal]
+		
+	def entries(self, (x, y), goal = None):
+		'''Returns ([(portal, cells)], path): the portals x, y leads to, with the cells walked to get there
+		(None for the portals of the room x, y is in), and the cells to goal if that was found on the way.'''
+		room = self.grid.room_at(x, y)
+		if room is not None:
+			return [(p, None) for p in self.portals[room]], None
+		#in a corridor: look along it, but not forever
+		w = self.map.width
+		kind = self.kind
+		start = y * w + x
+		parent = {start: -1}
+		queue = deque([start])
+		found = []
+		goal = goal[1] * w + goal[0] if goal is not None else None
+		while queue and len(parent) < CORRIDOR_SEARCH:
+			c = queue.popleft()
+			if c == goal or kind[c] == PATH_PORTAL:
+				cells = [(i % w, i // w) for i in unwind(parent, c)]
+				if c == goal:
+					return found, cells
+				found.append((cells[-1], cells))
+				continue
+			for (dx, dy) in NEIGHBOURS:
+				i = c + dy * w + dx
+				if i not in parent and (kind[i] == PATH_CORRIDOR or kind[i] == PATH_PORTAL):
+					parent[i] = c
+					queue.append(i)
+		return found, None
+		
+	def find_path(self, x1, y1, x2, y2):
+		'''A list of cells leading from x1, y1 to x2, y2 (without the start), or None if there's no way.'''
+		if not self.built:
+			self.build()
+		(start, goal) = ((x1, y1), (x2, y2))
+		m = self.map
+		if not (m.in_bounds(x1, y1) and m.in_bounds(x2, y2)):
+			return None
+		if not self.kind[m.index(x1, y1)] or not self.kind[m.index(x2, y2)]:
+			return None
+		if start == goal:
+			return []
+		start_room = self.grid.room_at(x1, y1)
+		goal_room = self.grid.room_at(x2, y2)
+		if start_room is not None and start_room is goal_room:
+			return self.walk_room(start_room, start, goal)
+		(start_entries, path) = self.entries(start, goal)
+		if path is not None:
+			return path
+		(goal_entries, ignored) = self.entries(goal)
+		
+		#a route between two rooms doesn't depend on where exactly in the rooms the ends are, so it's kept
+		key = (start_room, goal_room)
+		route = self.routes.get(key) if None not in key else None
+		if route is None:
+			route = self.plan(start, goal, start_entries, goal_entries)
+			if route is None:
+				return None
+			if None not in key:
+				self.routes[key] = route
+				
+		path = self.leg(start, route[0][0], start_entries)
+		for ((p, meet), (q, ignored)) in zip(route, route[1:]):
+			path.extend(self.corridor_cells(meet, q) if meet is not None else self.walk_room(self.owner[p], p, q))
+		(last, ignored) = route[-1]
+		path.extend(reversed(self.leg(goal, last, goal_entries)[:-1]))
+		#a goal that is a portal itself was already reached by the corridor or room leading to it
+		if not path or path[-1] != goal:
+			path.append(goal)
+		return path
+		
+	def leg(self, cell, portal, entries):
+		#cells from cell to one of its entry portals
+		for (p, cells) in entries:
+			if p == portal and cells is not None:
+				return list(cells)
+		return self.walk_room(self.owner[portal], cell, portal)
+		
+	def entry_cost(self, cell, portal, cells):
+		return len(cells) if cells is not None else chebyshev(cell, portal)
+		
+	def plan(self, start, goal, start_entries, goal_entries):
+		'''A* over rooms, from center to center. Returns [(portal, meet)]: every portal on the way, with the
+		corridor link leading on to the next one, or None where the next one is across a room.'''
+		open_costs = {}
+		first = {}
+		for (p, cells) in start_entries:
+			room = self.owner[p]
+			cost = self.entry_cost(start, p, cells) + chebyshev(p, self.centers[room])
+			if cost < open_costs.get(room, cost + 1):
+				open_costs[room] = cost
+				first[room] = p
+		goal_costs = {}
+		last = {}
+		for (p, cells) in goal_entries:
+			room = self.owner[p]
+			cost = self.entry_cost(goal, p, cells) + chebyshev(p, self.centers[room])
+			if cost < goal_costs.get(room, cost + 1):
+				goal_costs[room] = cost
+				last[room] = p
+		came = dict((room, None) for room in open_costs)
+		if search(open_costs, came, lambda room: self.adjacent[room].iteritems(), goal_costs, lambda room: chebyshev(self.centers[room], goal)) is None:
+			return None
+		rooms = []
+		room = came[None]
+		while room is not None:
+			rooms.append(room)
+			room = came[room]
+		rooms.reverse()
+		
+		#ends in a corridor come in through the portal they were costed with
+		route = []
+		if start_entries[0][1] is not None:
+			route.append((first[rooms[0]], None))
+		for (room, next_room) in zip(rooms, rooms[1:]):
+			(p, q, meet) = self.crossings[(room, next_room)]
+			route.append((p, meet))
+			route.append((q, None))
+		if goal_entries[0][1] is not None:
+			route.append((last[rooms[-1]], None))
+		return route
+		
+	def walk_room(self, room, a, b):
+		#cells from a to b inside room, where a and b are in its interior or portals in its wall
+		path = []
+		(x, y) = a
+		while (x, y) != b:
+			nx = x + cmp(b[0], x)
+			ny = y + cmp(b[1], y)
+			if (nx, ny) != b:
+				#stay off the walls until the very end
+				nx = max(room.x1 + 1, min(nx, room.x2 - 1))
+				ny = max(room.y1 + 1, min(ny, room.y2 - 1))
+			(x, y) = (nx, ny)
+			path.append((x, y))
+		return path
+
+def search(open_costs, came, steps, goal_costs, estimate):
+	'''A* from the nodes in open_costs (node -> cost so far) to any node in goal_costs (node -> cost from there
+	to the goal). steps(node) yields (next node, cost). came gets the node each one was reached from, with
+	came[None] the last node before the goal. Returns the total cost, or None if the goal can't be reached.'''
+	frontier = []
+	best = dict(open_costs)
+	seq = 0
+	for (node, cost) in open_costs.items():
+		seq += 1
+		heapq.heappush(frontier, (cost + estimate(node), cost, seq, node))
+	while frontier:
+		(f, g, ignored, node) = heapq.heappop(frontier)
+		if node is None:
+			return g
+		if g > best[node]:
+			continue
+		for (other, cost) in steps(node):
+			if g + cost < best.get(other, g + cost + 1):
+				best[other] = g + cost
+				came[other] = node
+				seq += 1
+				heapq.heappush(frontier, (g + cost + estimate(other), g + cost, seq, other))
+		if node in goal_costs and g + goal_costs[node] < best.get(None, g + goal_costs[node] + 1):
+			best[None] = g + goal_costs[node]
+			came[None] = node
+			seq += 1
+			heapq.heappush(frontier, (best[None], best[None], seq, None))
+	return None
+
+def unwind(parent, cell):
+	#the cells from the root of a parent tree (whose parent is -1) to cell, without the root
+	cells = []
+	while parent[cell] >= 0:
+		cells.append(cell)
+		cell = parent[cell]
+	cells.reverse()
+	return cells
+
+def chebyshev((x1, y1), (x2, y2)):
+	#steps between two cells when diagonal moves cost the same as straight ones
+	return max(abs(x1 - x2), abs(y1 - y2))
 
 #########
 # INPUT #
 #########
 def targeting(size=1, maxrange=None):
-	global player
+	player = game.player
+	
+	if game.target is not None:
+		#the target came with the action (headless runs, bots), no need to ask
+		(x, y) = game.target
+		game.target = None
+		if maxrange > 0 and distance(player.x, player.y, x, y) > maxrange - 1:
+			return None
+		return Area(x, y, size)
+	if not game.renderer.interactive:
+		return None
+	
 	cursor = Object(player.x, player.y, ' ', 'cursor')
 	
 	while not libtcod.console_is_window_closed():
-		draw_target(cursor, size, maxrange)
-		render_all()
-		libtcod.console_flush()
-		clear_target(cursor, maxrange, size)
+		#the reticle goes on top of the freshly composed map every frame, so it never needs clearing
+		game.renderer.render(lambda: draw_target(cursor, size, maxrange))
+		game.renderer.flush()
 		
 		libtcod.sys_check_for_event(libtcod.EVENT_KEY_PRESS|libtcod.EVENT_MOUSE,key,mouse)
 		input = key.vk
@@ -517,93 +1419,91 @@ def targeting(size=1, maxrange=None):
 		elif input == libtcod.KEY_ESCAPE:
 			return None
 		elif input == libtcod.KEY_ENTER:
-			clear_all()
+			game.renderer.clear()
 			return Area(cursor.x, cursor.y, size)
 	
 class Area:
 	#Container for specific points of the map. Can be used to retrieve their coordinates and contained objects.
-	global objects
 	def __init__(self, x, y, size=1):
 		self.x = x
 		self.y = y
 		self.size = size
 		self.caught = []
-		for object in objects:
-			if (object.x, object.y) in circle(self.x, self.y, self.size):
-				self.caught.append(object)
+		for (cx, cy) in circle(self.x, self.y, self.size):
+			self.caught.extend(game.index.at(cx, cy))
+		(self.x1, self.y1, self.w, self.h, self.mask) = circle_mask(self.x, self.y, self.size)
+		
+	def __contains__(self, (x, y)):
+		#constant time, straight from the mask
+		dx = x - self.x1
+		dy = y - self.y1
+		return 0 <= dx < self.w and 0 <= dy < self.h and self.mask[dy * self.w + dx] == 1
 
 def draw_target(cursor, size=1, maxrange=None):
 	global hint
+	player = game.player
+	con = game.renderer.con
+	camera = game.renderer.camera
 	#draw reticle of stated size
 	if maxrange > 0:
-		for tile in circle(player.x, player.y, maxrange):
-			libtcod.console_set_char_background(con, tile[0], tile[1], libtcod.darkest_red, flag=libtcod.BKGND_LIGHTEN)
+		for (x, y) in circle(player.x, player.y, maxrange):
+			if camera.in_view(x, y):
+				libtcod.console_set_char_background(con, x - camera.x, y - camera.y, libtcod.darkest_red, flag=libtcod.BKGND_LIGHTEN)
 	
-	for tile in circle(cursor.x, cursor.y, size):
-		libtcod.console_set_char_background(con, tile[0], tile[1], libtcod.darkest_yellow, flag=libtcod.BKGND_ADD)
+	for (x, y) in circle(cursor.x, cursor.y, size):
+		if camera.in_view(x, y):
+			libtcod.console_set_char_background(con, x - camera.x, y - camera.y, libtcod.darkest_yellow, flag=libtcod.BKGND_ADD)
 		
 	hint = get_names(cursor.x, cursor.y)
-	
-			
-def clear_target(cursor, crange, size):
-	if crange > 0:
-		#clear the highlighted range
-		for tile in circle(player.x, player.y, crange):
-			libtcod.console_set_char_background(con, tile[0], tile[1], libtcod.black, flag=libtcod.BKGND_SET)
-	for tile in circle(cursor.x, cursor.y, size):
-		#clear the reticle itself
-		libtcod.console_set_char_background(con, tile[0], tile[1], libtcod.black, flag=libtcod.BKGND_SET)
-
+		
 
 def handle_keys():
+	'''Turns the last key press into an action for game.step, or deals with it here if it only
+	concerns the interface. Returns 'exit', 'didnt-take-turn' or whatever step returned.'''
 	global key #necessary only for mouse support
-	global game_state
+	player = game.player
 	
 	#key = libtcod.console_wait_for_keypress(True)
 	input = key.vk
 	if input == libtcod.KEY_ENTER and key.lalt:
 		#Alt+Enter: toggle fullscreen
 		libtcod.console_set_fullscreen(not libtcod.console_is_fullscreen())
+		return 'didnt-take-turn'
 		
 	elif input == libtcod.KEY_ESCAPE:
 		return 'exit'
 	
-	elif game_state == 'playing':
+	elif game.state == 'playing':
 		if input in DIRECTIONS:
 			dxy = DIRECTIONS[input]
-			player_move_or_attack(dxy[0], dxy[1])
+			return game.step(('move', dxy[0], dxy[1]))
 		
 		elif input == libtcod.KEY_KP5: #wait
-			fov_recompute = False
+			return game.step(('wait',))
 			
 		elif chr(key.c) == 'g':
-			for object in objects: #picks up items in random order
-				if object.x == player.x and object.y == player.y and object.item:
-					object.item.pick_up()
-					break
-			else:
-				message("Nothing to get.")
+			return game.step(('get',))
 				
 		elif chr(key.c) == 'w': #WHERE AM I
 			message(str((player.x, player.y)))
 			room_id = None
-			for index, room in enumerate(rooms):
+			for index, room in enumerate(game.rooms):
 				if (player.x, player.y) in room:
 					room_id = index+1
 					message("You are in room {0}.".format(room_id))
 					break
 			if room_id == None:
 				message("You are not anywhere in particular.")
+			return game.step(('wait',))
 				
 		elif chr(key.c) == 'f': #FIREBALL
-			if not cast_fireball(): return 'didnt-take-turn'
+			return game.step(('fireball',))
 			
 		else: #everything that doesn't take a turn but happens in player turn
 			if chr(key.c) == "i": #INVENTORY
 				chosen_item = inventory_menu("Backpack (press key to use)")
 				if chosen_item is not None:
-					chosen_item.use()
-					return
+					return game.step(('use', game.inventory.index(chosen_item.owner)))
 					
 			if chr(key.c) == 'x': #EXAMINE
 				act_examine()
@@ -614,22 +1514,17 @@ def handle_keys():
 			return "didnt-take-turn"
 
 def resume_game():
-	global game_state
-	
-	if game_state != 'dead':
-		game_state = 'playing'
+	if game.state != 'dead':
+		game.state = 'playing'
 			
 def player_move_or_attack(dx, dy):
-	global fov_recompute
+	player = game.player
+	map = game.map
 	
 	x = player.x + dx
 	y = player.y + dy
 	
-	target = None
-	for object in objects:
-		if object.x == x and object.y == y and object.blocks:
-			target = object
-			break
+	target = game.index.blocker_at(x, y)
 			
 	if target is not None:
 		if target.fighter:
@@ -638,16 +1533,17 @@ def player_move_or_attack(dx, dy):
 			#for theoretical nonfighter objects
 			message("You stumble into the {0}!".format(target.name))
 	else:
-		if not map[x][y].usable:
+		usable = map.usable.get(y * map.width + x)
+		if not usable:
 			player.move(dx, dy)
 		else:
-			map[x][y].usable.activate()
-		fov_recompute = True
+			usable.activate()
+		game.fov_recompute = True
 
 def menu(header, options, width):
 	if len(options) > 26: raise ValueError("Cannot have a menu with more than 26 options.") #TODO: expand inventory.
 	
-	header_height = libtcod.console_get_height_rect(con, 0, 0, width, SCREEN_HEIGHT, header)
+	header_height = libtcod.console_get_height_rect(game.renderer.con, 0, 0, width, SCREEN_HEIGHT, header)
 	height = len(options) + header_height
 	
 	window = libtcod.console_new(width, height)
@@ -669,6 +1565,7 @@ def menu(header, options, width):
 	libtcod.console_flush()
 
 	key = libtcod.console_wait_for_keypress(True)
+	libtcod.console_delete(window)
 	index = key.c - ord("a")
 	if index >= 0 and index < len(options):
 		return index
@@ -676,6 +1573,7 @@ def menu(header, options, width):
 		return None
 
 def inventory_menu(header):
+	inventory = game.inventory
 	if len(inventory) == 0:
 		options = ["EMPTY"]
 	else:
@@ -689,115 +1587,427 @@ def inventory_menu(header):
 #######
 # GUI #
 #######
-def render_all():
-	render_map()
-	render_gui()
-
-def render_map():
-	global fov_map, color_dark_wall, color_lit_wall
-	global color_dark_ground, color_lit_ground
-	global fov_recompute
-
-	#draw all objects	
-	if fov_recompute:
-		#recompute fov if needed
-		fov_recompute = False
-		libtcod.map_compute_fov(fov_map, player.x, player.y, TORCH_RADIUS, FOV_LIGHT_WALLS, FOV_ALGO)
+class NullRenderer:
+	'''Renderer for headless games: no window, no frame limiter and no console_flush.'''
+	interactive = False
+	con = None
 	
-		#for now only supports two types of terrain: wall and notwall. now also door!
-		for y in range(MAP_HEIGHT):
-			for x in range(MAP_WIDTH):
-				visible = libtcod.map_is_in_fov(fov_map, x, y)
-				wall = map[x][y].block_sight
-				symbol = map[x][y].symbol
-				if not visible:
-					if map[x][y].explored:
-						if wall:
-							libtcod.console_put_char_ex(con,x,y,symbol, color_dark_wall, libtcod.black)
-						else:
-							libtcod.console_put_char_ex(con,x,y,symbol, color_dark_ground, libtcod.black)
-				else:
-					map[x][y].explored = True
-					if wall:
-						libtcod.console_put_char_ex(con,x,y,symbol, color_lit_wall, libtcod.black)
-					else:
-						libtcod.console_put_char_ex(con,x,y,symbol, color_lit_ground, libtcod.black)
-	
-	#eventually i'm gonna need a better system of drawing priority (several lists?) but this'll do for now
-	for object in objects:
-		if object != player:
-			object.draw()
-	player.draw()
-	
-	libtcod.console_blit(con,0,0,SCREEN_WIDTH,SCREEN_HEIGHT,0,0,0)
-
-def render_gui():
-	#render GUI
-	global game_msgs, hint
-	libtcod.console_set_default_background(panel, libtcod.black)
-	libtcod.console_clear(panel)
-	y = 1
-	
-	for (line, color) in game_msgs:
-		libtcod.console_set_default_foreground(panel, color)
-		libtcod.console_print_ex(panel, MSG_X, y, libtcod.BKGND_NONE, libtcod.LEFT, line)
-		y += 1
-	
-	render_bar(1, 1, BAR_WIDTH, "HP", player.fighter.hp, player.fighter.max_hp, libtcod.light_red, libtcod.darker_red)
-	#render the mouseview hint
-	if hint == "":
-		hint = get_names_under_mouse().capitalize()
+	def attach(self, game):
+		pass
 		
-	libtcod.console_set_default_foreground(panel, libtcod.light_gray)
-	libtcod.console_print_ex(panel, 1, 0, libtcod.BKGND_NONE, libtcod.LEFT, hint)
-	
-	#render turncount
-	libtcod.console_print_ex(panel, 1, 3, libtcod.BKGND_NONE, libtcod.LEFT, "Turn {0}".format(turncount))
-	libtcod.console_blit(panel, 0, 0, SCREEN_WIDTH, PANEL_HEIGHT, 0, 0, PANEL_Y)
-	
-def clear_all():
-	libtcod.console_set_default_background(panel, libtcod.black)
-	libtcod.console_clear(panel)
-	#clear objects
-	for object in objects:
-		object.clear()
+	def render(self, overlay = None):
+		pass
+		
+	def flush(self):
+		pass
+		
+	def clear(self):
+		pass
+		
+	def close(self):
+		pass
 
-def update_fovmap():
-	'''Call whenever a tile changes its block_sight status.'''
-	global fov_map
+class ConsoleRenderer:
+	'''Draws the game in a libtcod window. Creating one opens the window, unless window is False:
+	then everything is drawn the same way into an offscreen console, which is what benchmarks want.'''
+	interactive = True
 	
-	for y in range(MAP_HEIGHT):
-		for x in range(MAP_WIDTH):
-			libtcod.map_set_properties(fov_map, x, y, not map[x][y].block_sight, not map[x][y].blocked)
+	def __init__(self, window = True):
+		#even offscreen libtcod needs the font: that's where its character mapping, which the console fills use, comes from
+		libtcod.console_set_custom_font('resource/celtic_garamond_10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
+		if window:
+			libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, 'Testowy Rogalik', False)
+			libtcod.sys_set_fps(LIMIT_FPS)
+			self.root = 0
+		else:
+			self.interactive = False
+			self.root = libtcod.console_new(SCREEN_WIDTH, SCREEN_HEIGHT)
+		self.con = libtcod.console_new(SCREEN_WIDTH, SCREEN_HEIGHT)
+		self.panel = libtcod.console_new(SCREEN_WIDTH, PANEL_HEIGHT)
+		self.camera = None
+		self.cache = None
+		#one console per draw layer, see render_layers
+		self.layers = []
+		for z in range(Z_LAYERS):
+			layer = libtcod.console_new(VIEW_WIDTH, VIEW_HEIGHT)
+			libtcod.console_set_key_color(layer, LAYER_KEY)
+			self.layers.append(layer)
+		
+	def attach(self, game):
+		#called by the game once its map exists
+		self.camera = Camera(VIEW_WIDTH, VIEW_HEIGHT, game.map.width, game.map.height)
+		self.camera.follow(game.player.x, game.player.y)
+		if self.cache is not None:
+			self.cache.close()
+		self.cache = RenderCache(game.map, self.camera)
+		self.fov_seen = None
+		self.layer_seen = [None] * Z_LAYERS
+		self.layer_empty = [True] * Z_LAYERS
+		
+	def render(self, overlay = None):
+		self.render_map(overlay)
+		self.render_gui()
+		
+	def flush(self):
+		if self.root == 0:
+			libtcod.console_flush()
+		
+	def clear(self):
+		libtcod.console_set_default_background(self.panel, libtcod.black)
+		libtcod.console_clear(self.panel)
+		
+	def close(self):
+		#free the consoles. the window's root console is libtcod's own, deleting it would close the window
+		if self.con is None:
+			return
+		if self.cache is not None:
+			self.cache.close()
+			self.cache = None
+		consoles = [self.con, self.panel] + self.layers
+		if self.root != 0:
+			consoles.append(self.root)
+		for con in consoles:
+			libtcod.console_delete(con)
+		self.con = self.panel = None
+		self.layers = []
+		
+	def render_map(self, overlay = None):
+		con = self.con
+		player = game.player
+		camera = self.camera
+		
+		camera.follow(player.x, player.y)
+		if game.fov_recompute:
+			#recompute fov if needed
+			game.compute_fov()
+		lighting = game.lighting
+		lighting.update()
+		if self.fov_seen != (game.fov_version, lighting.version):
+			(x, y) = game.fov_origin
+			(ox, oy) = game.fov_offset
+			self.cache.update_light(visibility(), lighting, ox, oy, x, y, TORCH_RADIUS)
+			self.fov_seen = (game.fov_version, lighting.version)
+		self.cache.refresh()
+		
+		#terrain comes from the backing console in a single blit, which also wipes last frame's objects
+		libtcod.console_blit(self.cache.con, 0, 0, camera.width, camera.height, con, 0, 0)
+		
+		#then the object layers bottom to top, and whatever the overlay puts over all of it
+		self.render_layers()
+		for z in range(Z_LAYERS):
+			if not self.layer_empty[z]:
+				libtcod.console_blit(self.layers[z], 0, 0, camera.width, camera.height, con, 0, 0)
+		
+		if overlay is not None:
+			overlay()
+		
+		libtcod.console_blit(con,0,0,SCREEN_WIDTH,SCREEN_HEIGHT,self.root,0,0)
+		
+	def render_layers(self):
+		'''Redraws the layer consoles whose objects changed since the last frame. Scrolling or a new fov
+		(which decides what's known) redraws all of them.'''
+		camera = self.camera
+		versions = game.objects.versions
+		seen = (camera.x, camera.y, game.fov_version)
+		stale = [z for z in range(Z_LAYERS) if self.layer_seen[z] != (seen, versions[z])]
+		if not stale:
+			return
+			
+		buckets = [[] for z in range(Z_LAYERS)]
+		for obj in game.index.in_rect(camera.x, camera.y, camera.width, camera.height):
+			buckets[obj.layer].append(obj)
+		#the player goes over everything else on its layer
+		player = game.player
+		if player in buckets[player.layer]:
+			buckets[player.layer].remove(player)
+			buckets[player.layer].append(player)
+			
+		for z in stale:
+			layer = self.layers[z]
+			libtcod.console_set_default_background(layer, LAYER_KEY)
+			libtcod.console_clear(layer)
+			#objects are drawn on black, like they always were
+			libtcod.console_set_default_background(layer, libtcod.black)
+			for obj in buckets[z]:
+				obj.draw(layer, camera)
+			self.layer_empty[z] = not buckets[z]
+			self.layer_seen[z] = (seen, versions[z])
 
-def render_bar(x, y, total_width, name, value, maximum, bar_color, back_color):
-	global panel
-	#render a bar
-	bar_width = int(float(value) / maximum * total_width)
+	def render_gui(self):
+		#render GUI
+		global hint
+		panel = self.panel
+		player = game.player
+		libtcod.console_set_default_background(panel, libtcod.black)
+		libtcod.console_clear(panel)
+		y = 1
+		
+		for (line, color) in game.messages:
+			libtcod.console_set_default_foreground(panel, color)
+			libtcod.console_print_ex(panel, MSG_X, y, libtcod.BKGND_NONE, libtcod.LEFT, line)
+			y += 1
+		
+		self.render_bar(1, 1, BAR_WIDTH, "HP", player.fighter.hp, player.fighter.max_hp, libtcod.light_red, libtcod.darker_red)
+		#render the mouseview hint
+		if hint == "":
+			hint = get_names_under_mouse().capitalize()
+			
+		libtcod.console_set_default_foreground(panel, libtcod.light_gray)
+		libtcod.console_print_ex(panel, 1, 0, libtcod.BKGND_NONE, libtcod.LEFT, hint)
+		
+		#render turncount
+		libtcod.console_print_ex(panel, 1, 3, libtcod.BKGND_NONE, libtcod.LEFT, "Turn {0}".format(game.turncount))
+		libtcod.console_blit(panel, 0, 0, SCREEN_WIDTH, PANEL_HEIGHT, self.root, 0, PANEL_Y)
+		
+	def render_bar(self, x, y, total_width, name, value, maximum, bar_color, back_color):
+		#render a bar
+		panel = self.panel
+		bar_width = int(float(value) / maximum * total_width)
+		
+		libtcod.console_set_default_background(panel, back_color)
+		libtcod.console_rect(panel, x, y, total_width, 1, False, libtcod.BKGND_SCREEN)
+		
+		libtcod.console_set_default_background(panel, bar_color)
+		if bar_width > 0:
+			libtcod.console_rect(panel, x, y, bar_width, 1, False, libtcod.BKGND_SCREEN)
+			
+		#text
+		libtcod.console_set_default_foreground(panel, libtcod.white)
+		libtcod.console_print_ex(panel, x+total_width/2, y, libtcod.BKGND_NONE, libtcod.CENTER, "{0}: {1}/{2}".format(name, value, maximum))
+
+class Camera:
+	'''The part of the map that is on screen: map tile x, y is drawn at console x - camera.x, y - camera.y.'''
 	
-	libtcod.console_set_default_background(panel, back_color)
-	libtcod.console_rect(panel, x, y, total_width, 1, False, libtcod.BKGND_SCREEN)
+	def __init__(self, width, height, map_width, map_height):
+		self.width = width
+		self.height = height
+		self.map_width = map_width
+		self.map_height = map_height
+		self.x = 0
+		self.y = 0
+		
+	def follow(self, x, y):
+		'''Recentres on x, y once it gets closer than CAMERA_MARGIN to an edge of the view, so the view
+		jumps now and then instead of scrolling every step. Returns True if it moved.'''
+		(nx, ny) = (self.x, self.y)
+		if not self.x + CAMERA_MARGIN <= x < self.x + self.width - CAMERA_MARGIN:
+			nx = x - self.width / 2
+		if not self.y + CAMERA_MARGIN <= y < self.y + self.height - CAMERA_MARGIN:
+			ny = y - self.height / 2
+		#never show anything past the edges of the map
+		nx = max(0, min(nx, self.map_width - self.width))
+		ny = max(0, min(ny, self.map_height - self.height))
+		if (nx, ny) == (self.x, self.y):
+			return False
+		(self.x, self.y) = (nx, ny)
+		return True
+		
+	def in_view(self, x, y):
+		return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+		
+	def to_map(self, x, y):
+		#console coordinates (the mouse) to map coordinates
+		return x + self.x, y + self.y
+
+#how a tile looks, for RenderCache.draw_rect: these flags or'ed with the light on it (0..255) index its shade tables
+SHADE_WALL = 1 << 8
+SHADE_EXPLORED = 1 << 9
+SHADE_SEEN = 1 << 10
+
+class RenderCache:
+	'''Keeps the terrain in view on its own persistent console and only redraws tiles whose look changed.'''
+	#a tile looks dark (explored but out of sight) or not at all, and a seen one is brought from dark up
+	#to lit by the light on it, see Lighting. the box the player saw last time is kept, so a new fov or
+	#new light only redraws that box and the new one. the console is the size of the camera; when the
+	#camera moves everything in view is redrawn. tiles are shaded a rectangle at a time into an
+	#ArrayConsoleBuffer, which goes to the console in one bulk fill per frame.
 	
-	libtcod.console_set_default_background(panel, bar_color)
-	if bar_width > 0:
-		libtcod.console_rect(panel, x, y, bar_width, 1, False, libtcod.BKGND_SCREEN)
+	def __init__(self, gamemap, camera):
+		self.map = gamemap
+		self.camera = camera
+		self.con = libtcod.console_new(camera.width, camera.height)
+		self.buffer = libtcod.ArrayConsoleBuffer(camera.width, camera.height)
+		self.changed = False
+		self.lit = set()
+		self.view = None
+		self.box = None
+		self.light = None
+		#a table per channel with the color of every look a tile can have, see draw_rect
+		self.shades = []
+		for (dark, lit) in zip(zip(color_dark_ground, color_dark_wall), zip(color_lit_ground, color_lit_wall)):
+			shade = array('i', [0]) * (SHADE_SEEN << 1)
+			for wall in (0, 1):
+				for light in range(256):
+					shade[SHADE_WALL * wall | SHADE_EXPLORED | light] = dark[wall]
+					shade[SHADE_WALL * wall | SHADE_EXPLORED | SHADE_SEEN | light] = dark[wall] + (lit[wall] - dark[wall]) * light // 255
+			self.shades.append(shade)
+		
+	def update_light(self, visible, lighting, ox, oy, x, y, radius):
+		#visible is the fov window (see visibility) whose top left corner is map tile ox, oy, and lighting
+		#covers the same window. fov never reaches past the torch radius, so only that box has to be looked at
+		m = self.map
+		x1, y1 = max(0, x - radius, ox), max(0, y - radius, oy)
+		x2, y2 = min(m.width, x + radius + 1, ox + FOV_WINDOW), min(m.height, y + radius + 1, oy + FOV_WINDOW)
+		
+		lit = set()
+		for cy in range(y1, y2):
+			row = cy * m.width
+			window = (cy - oy) * FOV_WINDOW - ox
+			for cx in range(x1, x2):
+				if visible[window + cx]:
+					lit.add(row + cx)
+		for i in lit - self.lit:
+			m.set('explored', i % m.width, i // m.width, True)
+		self.lit = lit
+		
+		self.light = (visible, lighting, ox, oy)
+		box = (x1, y1, x2, y2)
+		old = self.box or box
+		self.box = box
+		self.draw_rect(min(x1, old[0]), min(y1, old[1]), max(x2, old[2]), max(y2, old[3]))
+			
+	def refresh(self):
+		#redraw tiles the map changed under us (doors), or everything in view after a bulk edit or a scroll
+		m = self.map
+		camera = self.camera
+		if m.render_stale or self.view != (camera.x, camera.y):
+			self.buffer.clear()
+			self.draw_rect(camera.x, camera.y, camera.x + camera.width, camera.y + camera.height)
+			m.render_stale = False
+			self.view = (camera.x, camera.y)
+		else:
+			for i in m.render_dirty:
+				self.draw_tile(i)
+		m.render_dirty.clear()
+		if self.changed:
+			self.buffer.blit(self.con)
+			self.changed = False
 		
-	#text
-	libtcod.console_set_default_foreground(panel, libtcod.white)
-	libtcod.console_print_ex(panel, x+total_width/2, y, libtcod.BKGND_NONE, libtcod.CENTER, "{0}: {1}/{2}".format(name, value, maximum))
+	def draw_tile(self, i):
+		x, y = i % self.map.width, i // self.map.width
+		self.draw_rect(x, y, x + 1, y + 1)
+		
+	def draw_rect(self, x1, y1, x2, y2):
+		'''Redraws the half-open rectangle [x1, x2) x [y1, y2) of the map, clipped to the view. Its block_sight,
+		explored, glyph and light are gathered into flat arrays a row piece at a time, shaded all together with
+		no python call per tile, and put back into the buffer row by row.'''
+		#for now only supports two types of terrain: wall and notwall. now also door!
+		#a tile's color is the shade table entry of its look, the SHADE_ flags or'ed with the light on it
+		m = self.map
+		camera = self.camera
+		buffer = self.buffer
+		x1, y1 = max(x1, camera.x), max(y1, camera.y)
+		x2, y2 = min(x2, camera.x + camera.width), min(y2, camera.y + camera.height)
+		if x2 <= x1 or y2 <= y1:
+			return
+		w = x2 - x1
+		n = w * (y2 - y1)
+		#untouched chunks are unexplored wall, and spans() skips them
+		walls = array('B', [1]) * n
+		explored = array('B', [0]) * n
+		glyphs = array('B', [0]) * n
+		for (chunk, x, y, start, pw) in m.spans(x1, y1, x2, y2):
+			k = (y - y1) * w + x - x1
+			walls[k:k + pw] = chunk.block_sight[start:start + pw]
+			explored[k:k + pw] = chunk.explored[start:start + pw]
+			glyphs[k:k + pw] = chunk.glyph[start:start + pw]
+		(seen, lights) = self.light_rect(x1, y1, x2, y2)
+		looks = array('i', imap(operator.or_, imap(operator.mul, walls, repeat(SHADE_WALL)),
+			imap(operator.or_, imap(operator.mul, explored, repeat(SHADE_EXPLORED)), imap(operator.mul, seen, repeat(SHADE_SEEN)))))
+		
+		fore = [array('i', imap(shade.__getitem__, imap(operator.or_, looks, light))) for (shade, light) in zip(self.shades, lights)]
+		#tiles never explored stay blank
+		chars = array('i', imap(tuple.__getitem__, izip(repeat(ord(' ')), glyphs), explored))
+		buffer.set_rect(x1 - camera.x, y1 - camera.y, w, y2 - y1, fore = fore, char = chars)
+		self.changed = True
+		
+	def light_rect(self, x1, y1, x2, y2):
+		#which tiles of a rectangle of the map the player sees, and the r, g and b light on them, as flat arrays
+		w = x2 - x1
+		n = w * (y2 - y1)
+		seen = bytearray(n)
+		lights = [array('i', [0]) * n for channel in range(3)]
+		if self.light is None:
+			return (seen, lights)
+		(visible, lighting, ox, oy) = self.light
+		a, b = max(x1, ox), min(x2, ox + FOV_WINDOW)
+		if a < b:
+			for y in range(max(y1, oy), min(y2, oy + FOV_WINDOW)):
+				k = (y - y1) * w + a - x1
+				j = (y - oy) * FOV_WINDOW + a - ox
+				seen[k:k + b - a] = visible[j:j + b - a]
+				for (light, window) in zip(lights, (lighting.r, lighting.g, lighting.b)):
+					light[k:k + b - a] = window[j:j + b - a]
+		return (seen, lights)
+		
+	def close(self):
+		if self.con is not None:
+			libtcod.console_delete(self.con)
+			self.con = None
+
+#swaps 0 and 1, turning the map's blocked and block_sight into libtcod's walkable and transparent
+FLIP = string.maketrans('\x00\x01', '\x01\x00')
+
+def update_fovmap(full = False):
+	'''Call whenever a tile changes its block_sight status. fov_map only covers the window at
+	game.fov_offset: the changed tiles inside it are sent over, or the whole window is refilled
+	if full is set or the map was rebuilt in bulk.'''
+	map = game.map
+	fov_map = game.fov_map
+	(ox, oy) = game.fov_offset
 	
+	width = map.width
+	full = full or map.fov_stale
+	if full:
+		#bulk path: the window is put together row by row and sent over in one call. everything starts out
+		#as wall; untouched chunks and whatever lies past the map edges are all wall, so spans() doesn't even visit them
+		transparent = bytearray(FOV_WINDOW * FOV_WINDOW)
+		walkable = bytearray(FOV_WINDOW * FOV_WINDOW)
+		for (chunk, x, y, start, w) in map.spans(ox, oy, ox + FOV_WINDOW, oy + FOV_WINDOW):
+			i = (y - oy) * FOV_WINDOW + x - ox
+			transparent[i:i + w] = chunk.block_sight[start:start + w].tostring().translate(FLIP)
+			walkable[i:i + w] = chunk.blocked[start:start + w].tostring().translate(FLIP)
+		libtcod.map_set_properties_all(fov_map, transparent, walkable)
+		map.fov_stale = False
+	else:
+		for i in map.fov_dirty:
+			x, y = i % width, i // width
+			if ox <= x < ox + FOV_WINDOW and oy <= y < oy + FOV_WINDOW:
+				(chunk, j) = map.locate(x, y)
+				libtcod.map_set_properties(fov_map, x - ox, y - oy, not chunk.block_sight[j], not chunk.blocked[j])
+	if full or map.fov_dirty:
+		#whatever was computed on a copy of the old window is out of date now
+		game.opacity_version += 1
+	map.fov_dirty.clear()
+
+def visibility():
+	'''The player's fov as a FOV_WINDOW square bytearray laid out like fov_map, 1 where a tile is seen.
+	It's copied out of libtcod in one go once per fov, the first time anybody asks, so in_fov and the
+	renderer don't each have to ask libtcod tile by tile.'''
+	if game.visible is None:
+		game.visible = libtcod.map_get_fov_all(game.fov_map)
+	return game.visible
+
+def in_fov(x, y):
+	'''True if the player sees map tile x, y.'''
+	(ox, oy) = game.fov_offset
+	x -= ox
+	y -= oy
+	return 0 <= x < FOV_WINDOW and 0 <= y < FOV_WINDOW and visibility()[y * FOV_WINDOW + x] == 1
+
 def message(new_msg, color = libtcod.white):
 	#split if necessary
 	new_msg_lines = textwrap.wrap(new_msg, MSG_WIDTH)
 	
+	game_msgs = game.messages
 	for line in new_msg_lines:
 		if len(game_msgs) == MSG_HEIGHT:
 			del game_msgs[0]
 		game_msgs.append((line, color))
 		
 def get_names(x, y):
-	names = [obj.name for obj in objects
-		if obj.x == x and obj.y == y and libtcod.map_is_in_fov(fov_map, obj.x, obj.y)]
+	names = [obj.name for obj in game.index.at(x, y)
+		if in_fov(obj.x, obj.y)]
 	names = ', '.join(names)
 	
 	return names
@@ -805,7 +2015,11 @@ def get_names(x, y):
 		
 def get_names_under_mouse():
 	global mouse
-	return get_names(mouse.cx, mouse.cy)
+	camera = game.renderer.camera
+	(x, y) = camera.to_map(mouse.cx, mouse.cy)
+	if not camera.in_view(x, y):
+		return ''
+	return get_names(x, y)
 	
 		
 ####################
@@ -821,6 +2035,7 @@ def act_examine():
 		message('Examined the {2} at {0}, {1}.'.format(target.x, target.y, name))
 
 def cast_heal():
+	player = game.player
 	if player.fighter.hp == player.fighter.max_hp:
 		message('You are already at full health.', libtcod.red)
 		return 'no-use'
@@ -848,6 +2063,7 @@ def cast_confuse():
 		old_ai = monster.ai
 		monster.ai = Confused(old_ai)
 		monster.ai.owner = monster
+		game.scheduler.wake(monster)
 		message("The {0}'s eyes unfocus and glaze over...".format(monster.name), libtcod.light_green)
 		return True
 
@@ -871,87 +2087,512 @@ def cast_fireball():
 				else:
 					message("You hear a yelp!")
 				victim.fighter.take_damage(FIREBALL_DAMAGE)
+			game.lighting.add(Light(aoe.x, aoe.y, FLASH_RADIUS, FLASH_COLOR, turns = FLASH_TURNS))
 		return True
 
 def closest_monster(max_range):
 	'''Finds the closest visible enemy up to a maximum range'''
-	closest_enemy = None
-	closest_dist = max_range + 1
-	for object in objects: #can be later changed to exclude friendly NPCs, if any
-		if object.fighter and not object == player and libtcod.map_is_in_fov(fov_map, object.x, object.y):
-			dist = player.distance_to(object)
-			if dist < closest_dist:
-				closest_enemy = object
-				closest_dist = dist
-	return closest_enemy
+	#can be later changed to exclude friendly NPCs, if any
+	player = game.player
+	def is_target(object):
+		return object.fighter and not object == player and in_fov(object.x, object.y)
+	return game.index.nearest(player.x, player.y, max_range + 1, is_target)
 
 def distance(x, y, x2, y2):
 	return sqrt((x - x2) ** 2 + (y - y2) ** 2)
 	
-def circle(x, y, radius):
-	'''Returns a list of coordinates within a circle of a certain radius from the center point.'''
-	cornerx = x - radius
-	cornery = y - radius
-	coords = []
+#circles of the same radius are always the same shape, so their offsets are worked out once and kept here
+disc_stencils = {}
+disc_masks = {}
+
+def disc(radius):
+	'''Offsets (dx, dy) of every tile within radius - 1 of a center point, as covered by circle().'''
+	stencil = disc_stencils.get(radius)
+	if stencil is None:
+		reach = radius - 1
+		stencil = tuple((dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+			if dx ** 2 + dy ** 2 <= reach ** 2)
+		disc_stencils[radius] = stencil
+	return stencil
 	
-	for dx in range(cornerx, cornerx + 2*radius):
-		for dy in range(cornery, cornery + 2*radius):
-			if distance(x, y, dx, dy) <= (radius - 1):
-				coords.append((dx, dy))
-		
-	return coords
+def disc_mask(radius):
+	#the same disc as a square bytearray, side 2 * radius - 1, centered on the middle tile
+	mask = disc_masks.get(radius)
+	if mask is None:
+		reach = max(radius - 1, 0)
+		side = 2 * reach + 1 if radius > 0 else 0
+		mask = bytearray(side * side)
+		for (dx, dy) in disc(radius):
+			mask[(dy + reach) * side + dx + reach] = 1
+		disc_masks[radius] = mask
+	return mask
 	
-##################
-# INITIALIZATION #
-##################
+def circle(x, y, radius):
+	'''Returns a list of coordinates within a circle of a certain radius from the center point, clipped to the map.'''
+	width = game.map.width
+	height = game.map.height
+	return [(x + dx, y + dy) for (dx, dy) in disc(radius)
+		if 0 <= x + dx < width and 0 <= y + dy < height]
 		
-libtcod.console_set_custom_font('resource/celtic_garamond_10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
-libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, 'Testowy Rogalik', False)
-libtcod.sys_set_fps(LIMIT_FPS)
-con = libtcod.console_new(SCREEN_WIDTH, SCREEN_HEIGHT)
-panel = libtcod.console_new(SCREEN_WIDTH, PANEL_HEIGHT)
+def circle_mask(x, y, radius):
+	'''The same circle as a boolean mask clipped to the map. Returns (x1, y1, w, h, mask) where mask is a
+	bytearray of w*h with a 1 for every covered tile, row by row from the (x1, y1) corner.'''
+	reach = max(radius - 1, 0)
+	full = disc_mask(radius)
+	side = 2 * reach + 1 if radius > 0 else 0
+	x1, y1 = max(x - reach, 0), max(y - reach, 0)
+	x2, y2 = min(x - reach + side, game.map.width), min(y - reach + side, game.map.height)
+	if x2 <= x1 or y2 <= y1:
+		return (x1, y1, 0, 0, bytearray())
+	mask = bytearray()
+	for my in range(y1, y2):
+		start = (my - y + reach) * side + x1 - x + reach
+		mask += full[start:start + x2 - x1]
+	return (x1, y1, x2 - x1, y2 - y1, mask)
+	
+############
+# LIGHTING #
+############
+#how much of its color a light gives the tiles around it, by (radius, falloff, color), see light_stencil
+light_stencils = {}
 
+def light_stencil(radius, falloff, color):
+	'''The light color gives the square of side 2 * radius + 1 around it, as one array('i') per channel.
+	Full at the middle, dying away with the falloff power of the distance, and nothing past radius.'''
+	key = (radius, falloff, tuple(color))
+	stencil = light_stencils.get(key)
+	if stencil is None:
+		levels = array('i')
+		for dy in range(-radius, radius + 1):
+			for dx in range(-radius, radius + 1):
+				d = sqrt(dx ** 2 + dy ** 2)
+				levels.append(int(255 * (1.0 - d / (radius + 1)) ** falloff) if d <= radius else 0)
+		stencil = light_stencils[key] = tuple(libtcod.color_multiply_channels(levels, repeat(channel)) for channel in color)
+	return stencil
 
-game_state = 'playing'
-player_action = None
+def same_objects(a, b):
+	#True if the two lists hold the very same objects in the same order
+	return len(a) == len(b) and all(imap(operator.is_, a, b))
+	
+def add_share(totals, share):
+	#adds a light's share (see Lighting.share) to the r, g and b window arrays in totals, clamped at 255
+	(key, (x1, y1, w, h), channels) = share
+	for (total, channel) in zip(totals, channels):
+		box = array('i')
+		for row in range(h):
+			i = (y1 + row) * FOV_WINDOW + x1
+			box.extend(total[i:i + w])
+		box = libtcod.color_add_channels(box, channel)
+		for row in range(h):
+			i = (y1 + row) * FOV_WINDOW + x1
+			total[i:i + w] = box[row * w:(row + 1) * w]
 
-#player = Object(SCREEN_WIDTH/2, SCREEN_HEIGHT/2, '@', 'player', libtcod.white, True, fighter = Fighter(hp=30, defence=2, power=5, death_function=player_death))
+class Light(object):
+	'''A light source with a radius, a falloff (see light_stencil) and a color. It stays at x, y, or is carried
+	by owner wherever that goes. One made with turns goes out that many turns after the current one.'''
+	
+	def __init__(self, x, y, radius, color, falloff = 1.0, owner = None, turns = None):
+		self.x = x
+		self.y = y
+		self.radius = radius
+		self.color = color
+		self.falloff = falloff
+		self.owner = owner
+		self.expires = None if turns is None else game.turncount + turns
+		
+	def position(self):
+		if self.owner is not None:
+			return (self.owner.x, self.owner.y)
+		return (self.x, self.y)
 
-inventory = [] #TODO: maybe eventually an inventory for every actor? bound to Fighter???
-game_msgs = []
-hint = ""
-player = Object(SCREEN_WIDTH/2, SCREEN_HEIGHT/2, '@', 'player', libtcod.white, True, fighter = Fighter(hp=30, defence=2, power=5, death_function=player_death))
-objects = [player]
-make_map()
+class Lighting:
+	'''The light over the fov window, summed up from every light that reaches it. r, g and b are FOV_WINDOW
+	square array('i')s laid out like visibility(), 0..255 a channel. Each light's share is kept along with
+	what it was worked out from (where the light is, the window and its opacity) and only worked out again
+	once one of those changed, so a step only lights again what moved; the kept shares are then added up in
+	a handful of row slices. Only lights that can reach something the player sees are looked at.'''
+	#lights that stay put are bucketed by LIGHT_GRID_SIZE squares, carried ones are few and kept in a list.
+	#update() is only called by the renderer, and the fov map for the lights' own fov is only made when
+	#the first one needs it, so headless games never pay for lighting.
+	
+	def __init__(self):
+		self.buckets = {}
+		self.carried = []
+		self.timed = []
+		self.reach = 0
+		self.shares = {}	#light -> (key, (x1, y1, w, h) in window coordinates, (r, g, b) over that box)
+		self.fixed = []
+		self.carried_shares = []
+		self.base = [array('i', [0]) * (FOV_WINDOW * FOV_WINDOW) for channel in range(3)]
+		(self.r, self.g, self.b) = [channel[:] for channel in self.base]
+		self.fov_map = None
+		self.version = 0
+		
+	def add(self, light):
+		if light.owner is not None:
+			self.carried.append(light)
+		else:
+			self.buckets.setdefault((light.x // LIGHT_GRID_SIZE, light.y // LIGHT_GRID_SIZE), []).append(light)
+		if light.expires is not None:
+			self.timed.append(light)
+		self.reach = max(self.reach, light.radius)
+		
+	def remove(self, light):
+		if light.owner is not None:
+			self.carried.remove(light)
+		else:
+			self.buckets[(light.x // LIGHT_GRID_SIZE, light.y // LIGHT_GRID_SIZE)].remove(light)
+		if light.expires is not None:
+			self.timed.remove(light)
+		self.shares.pop(light, None)
+		
+	def near(self, x, y, reach):
+		#every light that might be within reach of x, y, and then some
+		for light in self.carried:
+			yield light
+		for gx in range((x - reach) // LIGHT_GRID_SIZE, (x + reach) // LIGHT_GRID_SIZE + 1):
+			for gy in range((y - reach) // LIGHT_GRID_SIZE, (y + reach) // LIGHT_GRID_SIZE + 1):
+				for light in self.buckets.get((gx, gy), ()):
+					yield light
+					
+	def update(self):
+		'''Brings r, g and b up to date with the lights and the fov window. version goes up if they changed.'''
+		for light in [light for light in self.timed if light.expires < game.turncount]:
+			self.remove(light)
+		(px, py) = game.fov_origin
+		found = []
+		for light in self.near(px, py, self.reach + TORCH_RADIUS):
+			(x, y) = light.position()
+			if max(abs(x - px), abs(y - py)) <= light.radius + TORCH_RADIUS:
+				share = self.share(light, x, y)
+				if share is not None:
+					found.append((light, share))
+		#shares of lights that are too far now are dropped, they are worked out again when they're back
+		self.shares = dict(found)
+		
+		#the player's torch moves every step, the rest hardly ever: those are summed up on their own and
+		#kept in base, so most steps only add the carried lights to a copy of it
+		fixed = [share for (light, share) in found if light.owner is None]
+		carried = [share for (light, share) in found if light.owner is not None]
+		if not same_objects(fixed, self.fixed):
+			self.fixed = fixed
+			self.base = [array('i', [0]) * (FOV_WINDOW * FOV_WINDOW) for channel in range(3)]
+			for share in fixed:
+				add_share(self.base, share)
+		elif same_objects(carried, self.carried_shares):
+			return
+		self.carried_shares = carried
+		totals = [channel[:] for channel in self.base]
+		for share in carried:
+			add_share(totals, share)
+		(self.r, self.g, self.b) = totals
+		self.version += 1
+		
+	def share(self, light, x, y):
+		#the light's part of the buffer, kept in shares. None if it is outside the window
+		(ox, oy) = game.fov_offset
+		(lx, ly) = (x - ox, y - oy)
+		if not (0 <= lx < FOV_WINDOW and 0 <= ly < FOV_WINDOW):
+			return None
+		#a light where the player stands sees what the player does, anything else needs a fov of its own
+		own = (x, y) != game.fov_origin or light.radius > TORCH_RADIUS
+		key = (x, y, game.fov_offset, game.opacity_version if own else game.fov_version)
+		share = self.shares.get(light)
+		if share is not None and share[0] == key:
+			return share
+			
+		if own:
+			if self.fov_map is None:
+				self.fov_map = libtcod.map_new(FOV_WINDOW, FOV_WINDOW)
+			libtcod.map_copy(game.fov_map, self.fov_map)
+			libtcod.map_compute_fov(self.fov_map, lx, ly, light.radius, FOV_LIGHT_WALLS, FOV_ALGO)
+			visible = libtcod.map_get_fov_all(self.fov_map)
+		else:
+			visible = visibility()
+		radius = light.radius
+		side = 2 * radius + 1
+		stencil = light_stencil(radius, light.falloff, light.color)
+		x1, y1 = max(lx - radius, 0), max(ly - radius, 0)
+		x2, y2 = min(lx + radius + 1, FOV_WINDOW), min(ly + radius + 1, FOV_WINDOW)
+		w = x2 - x1
+		#the part of the stencil inside the window and the fov over it, gathered row by row, then lit in one go
+		seen = bytearray()
+		levels = (array('i'), array('i'), array('i'))
+		for wy in range(y1, y2):
+			seen += visible[wy * FOV_WINDOW + x1:wy * FOV_WINDOW + x2]
+			start = (wy - ly + radius) * side + x1 - lx + radius
+			for (level, full) in zip(levels, stencil):
+				level.extend(full[start:start + w])
+		channels = tuple(array('i', imap(operator.mul, level, seen)) for level in levels)
+		return (key, (x1, y1, w, y2 - y1), channels)
+		
+	def close(self):
+		if self.fov_map is not None:
+			libtcod.map_delete(self.fov_map)
+			self.fov_map = None
+
+##############
+# SCHEDULING #
+##############
+class Scheduler:
+	'''The actors that are awake, in a heap keyed by the tick they act next. Only actors that are due get
+	called, and sleeping ones aren't in the heap at all, so they cost nothing until wake() is called.
+	Actors that come up further than active_radius from the player are frozen instead: they leave the heap
+	and thaw() brings them back, caught up on the turns they missed, once the player is near again.'''
+	#entries are (time, seq, actor). seq breaks ties in the order actors were scheduled, and awake maps
+	#every actor to the seq of its live entry, so entries left behind by sleep() are just skipped.
+	#frozen maps actors to the tick they froze at.
+	
+	def __init__(self, active_radius = ACTIVE_RADIUS):
+		self.queue = []
+		self.awake = {}
+		self.frozen = {}
+		self.seq = 0
+		self.time = 0
+		self.active_radius = active_radius
+		
+	def schedule(self, actor, time):
+		self.seq += 1
+		self.awake[actor] = self.seq
+		heapq.heappush(self.queue, (time, self.seq, actor))
+		
+	def wake(self, actor):
+		#make a sleeping actor act as soon as possible. does nothing to one that's already awake
+		if actor in self.frozen:
+			self.unfreeze(actor)
+		elif actor not in self.awake:
+			self.schedule(actor, self.time)
+			
+	def sleep(self, actor):
+		self.awake.pop(actor, None)
+		
+	def unfreeze(self, actor):
+		turns = (self.time - self.frozen.pop(actor)) // TURN_TICKS
+		if actor.ai is None:
+			return
+		catch_up = getattr(actor.ai, 'catch_up', None)
+		if turns > 0 and catch_up is not None:
+			catch_up(turns)
+		self.schedule(actor, self.time)
+		
+	def thaw(self, x, y):
+		'''Unfreezes every frozen actor within active_radius of x, y, counted in king moves the way run()
+		freezes them, so nobody right at the edge freezes and thaws on alternate turns. Only looks at
+		objects nearby.'''
+		if not self.frozen:
+			return
+		r = self.active_radius
+		for obj in game.index.in_rect(x - r, y - r, 2 * r + 1, 2 * r + 1):
+			if obj in self.frozen:
+				self.unfreeze(obj)
+		
+	def run(self, until):
+		'''Lets every actor due before tick until take its turn, in order of time. Faster actors come up
+		more than once. Returns how many turns were taken.'''
+		queue = self.queue
+		awake = self.awake
+		taken = 0
+		while queue and queue[0][0] < until:
+			(time, seq, actor) = heapq.heappop(queue)
+			if awake.get(actor) != seq:
+				continue
+			del awake[actor]
+			if actor.ai is None:
+				#died or otherwise stopped being an actor
+				continue
+			self.time = time
+			if max(abs(actor.x - game.player.x), abs(actor.y - game.player.y)) > self.active_radius:
+				self.frozen[actor] = time
+				continue
+			taken += 1
+			if actor.ai.take_turn() == 'sleep':
+				continue
+			if actor.ai is not None and actor not in awake:
+				self.schedule(actor, time + TURN_TICKS * NORMAL_SPEED // actor.speed)
+		self.time = until
+		return taken
 
-fov_recompute = True
+########
+# GAME #
+########
+class Game:
+	'''Everything that makes up one running game: map, objects, player, inventory, messages and turn count.
+	Creating a Game makes it the current one, which the rest of the module reaches through the game global.'''
+	
+	def __init__(self, renderer = None, seed = None, width = MAP_WIDTH, height = MAP_HEIGHT, max_rooms = MAX_ROOMS):
+		global game
+		game = self
+		
+		if renderer is None:
+			renderer = NullRenderer()
+		self.renderer = renderer
+		if seed is None:
+			self.rng = 0 #libtcod's default generator
+		else:
+			self.rng = libtcod.random_new_from_seed(seed)
+		
+		self.state = 'playing'
+		self.turncount = 0
+		self.inventory = [] #TODO: maybe eventually an inventory for every actor? bound to Fighter???
+		self.messages = []
+		self.target = None
+		self.objects = EntityStore()
+		self.index = SpatialIndex()
+		self.scheduler = Scheduler()
+		self.rooms = []
+		self.room_graph = None
+		self.map = None
+		
+		self.player = Object(width/2, height/2, '@', 'player', libtcod.white, True, fighter = Fighter(hp=30, defence=2, power=5, death_function=player_death))
+		add_object(self.player)
+		#the player carries the torch, make_map puts up the rest of the lights
+		self.lighting = Lighting()
+		self.lighting.add(Light(self.player.x, self.player.y, TORCH_RADIUS, TORCH_COLOR, TORCH_FALLOFF, owner = self.player))
+		make_map(width, height, max_rooms)
+		
+		self.fov_map = libtcod.map_new(FOV_WINDOW, FOV_WINDOW)
+		self.chase = ChaseField(self.fov_map)
+		self.perception = Perception()
+		self.opacity_version = 0
+		self.fov_offset = None
+		self.fov_version = 0
+		#the player's fov, see visibility()
+		self.visible = None
+		self.compute_fov()
+		self.wake_watchers()
+		self.active_chunk = None
+		self.compact_map()
+		
+		renderer.attach(self)
+		
+	def compute_fov(self):
+		'''FOV is computed on a FOV_WINDOW square fov_map with its top left corner on map tile fov_offset,
+		so its cost depends on the torch radius instead of the map size. The window only moves (and gets
+		refilled from the map) once the light would reach past it, which is every FOV_SLACK steps at most.'''
+		self.fov_recompute = False
+		(x, y) = self.fov_origin = (self.player.x, self.player.y)
+		reach = FOV_WINDOW - TORCH_RADIUS
+		if self.fov_offset is None or not (self.fov_offset[0] + TORCH_RADIUS <= x < self.fov_offset[0] + reach
+				and self.fov_offset[1] + TORCH_RADIUS <= y < self.fov_offset[1] + reach):
+			self.fov_offset = (x - FOV_WINDOW / 2, y - FOV_WINDOW / 2)
+			update_fovmap(full = True)
+		else:
+			update_fovmap()
+		(ox, oy) = self.fov_offset
+		libtcod.map_compute_fov(self.fov_map, x - ox, y - oy, TORCH_RADIUS, FOV_LIGHT_WALLS, FOV_ALGO)
+		self.visible = None
+		self.fov_version += 1
+		
+	def wake_watchers(self):
+		#monsters sleep while they can't see the player (see BasicMelee). the ones that can now, by the
+		#same Perception test, get to act again. run every player turn, not just when the player's own fov
+		#changed: whatever changes what a sleeping monster sees, like a door somebody else opened, counts too
+		player = self.player
+		for object in self.index.in_rect(player.x - MONSTER_SIGHT, player.y - MONSTER_SIGHT, 2 * MONSTER_SIGHT + 1, 2 * MONSTER_SIGHT + 1):
+			if object.ai and object not in self.scheduler.awake and self.perception.sees(object, player.x, player.y):
+				self.scheduler.wake(object)
+		
+	def compact_map(self):
+		#pack the chunks the player left behind, once per chunk border crossed
+		chunk = (self.player.x >> CHUNK_SHIFT, self.player.y >> CHUNK_SHIFT)
+		if chunk != self.active_chunk:
+			self.active_chunk = chunk
+			self.map.compact(self.player.x, self.player.y)
+		
+	def step(self, action):
+		'''Plays one player action followed by everybody else's turn. Actions are tuples:
+		('move', dx, dy), ('wait',), ('get',), ('use', index[, (x, y)]), ('drop', index), ('fireball'[, (x, y)]).
+		The optional (x, y) answers targeting without asking. Returns 'didnt-take-turn' if no time passed.'''
+		if self.state != 'playing':
+			return 'didnt-take-turn'
+		if self.act(action) == 'didnt-take-turn':
+			return 'didnt-take-turn'
+		
+		if self.fov_recompute:
+			self.compute_fov()
+		#everybody near enough and due before the next player turn
+		self.scheduler.thaw(self.player.x, self.player.y)
+		self.wake_watchers()
+		self.scheduler.run((self.turncount + 1) * TURN_TICKS)
+		self.compact_map()
+		self.turncount += 1
+		
+	def act(self, action):
+		#the player's half of a turn
+		kind = action[0]
+		if kind == 'move':
+			player_move_or_attack(action[1], action[2])
+			
+		elif kind == 'wait':
+			pass
+			
+		elif kind == 'get':
+			for object in self.index.at(self.player.x, self.player.y): #picks up items in random order
+				if object.item:
+					object.item.pick_up()
+					break
+			else:
+				message("Nothing to get.")
+				
+		elif kind == 'use' or kind == 'drop':
+			if not 0 <= action[1] < len(self.inventory):
+				return 'didnt-take-turn'
+			item = self.inventory[action[1]].item
+			if kind == 'drop':
+				item.drop()
+			else:
+				if len(action) > 2:
+					self.target = action[2]
+				item.use()
+				self.target = None
+				
+		elif kind == 'fireball':
+			if len(action) > 1:
+				self.target = action[1]
+			used = cast_fireball()
+			self.target = None
+			if not used: return 'didnt-take-turn'
+			
+		else:
+			raise ValueError("Unknown action: {0}".format(action))
+			
+	def close(self):
+		#free the native resources, for when lots of games are made in one process
+		self.perception.close()
+		self.lighting.close()
+		self.renderer.close()
+		libtcod.map_delete(self.fov_map)
+		if self.rng != 0:
+			libtcod.random_delete(self.rng)
 
-fov_map = libtcod.map_new(MAP_WIDTH, MAP_HEIGHT)
-update_fovmap()
+##################
+# INITIALIZATION #
+##################
+game = None
+hint = ""
 
 # MOUSE SUPPORT
 mouse = libtcod.Mouse()
 key = libtcod.Key()
 
-message('Welcome to the first and only floor of the Dungeon of Certain Doom.', libtcod.white)
-turncount = 0
-# MAIN LOOP
-while not libtcod.console_is_window_closed():
-	libtcod.sys_check_for_event(libtcod.EVENT_KEY_PRESS|libtcod.EVENT_MOUSE,key,mouse)
-	render_all()
-	
-	libtcod.console_flush()
-	clear_all()
+def main():
+	game = Game(ConsoleRenderer())
+	renderer = game.renderer
 	
-	#handle keys and exit if requested
-	player_action = handle_keys()
-	
-	if player_action == 'exit':
-		break
-	
-	#handling a turn
-	if game_state == 'playing' and player_action != 'didnt-take-turn':
-		for object in objects:
-			if object.ai:
-				object.ai.take_turn()
-		turncount += 1
+	message('Welcome to the first and only floor of the Dungeon of Certain Doom.', libtcod.white)
+	# MAIN LOOP
+	while not libtcod.console_is_window_closed():
+		libtcod.sys_check_for_event(libtcod.EVENT_KEY_PRESS|libtcod.EVENT_MOUSE,key,mouse)
+		renderer.render()
+		
+		renderer.flush()
+		renderer.clear()
+		
+		#handle keys and exit if requested. the turn itself is played by game.step
+		player_action = handle_keys()
+		
+		if player_action == 'exit':
+			break
+
+if __name__ == '__main__':
+	main()
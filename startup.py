@@ -0,0 +1,72 @@
+'''Startup time of libtcodpy and rogalik, each measured in a fresh interpreter.
+
+Headless test runs and batch simulations start a new process for every game, so this is paid over
+and over. Every statement below is run --runs times in its own python process, timed from inside
+that process so the interpreter's own start up isn't counted; the whole process is timed as well:
+
+	python startup.py
+	python startup.py --runs 20
+	LIBTCODPY_BACKEND=ctypes python startup.py
+
+Where python can't write .pyc files (PYTHONDONTWRITEBYTECODE is set, or the directory is read
+only) every import includes compiling the module; python -m compileall . first leaves that out.
+'''
+import argparse
+import os
+import subprocess
+import sys
+from timeit import default_timer as timer
+
+#(name, statement)
+STATEMENTS = [
+	('import libtcodpy', 'import libtcodpy'),
+	('import rogalik', 'import rogalik'),
+	('rogalik + new game', 'import rogalik; rogalik.Game(seed = 1).close()'),
+	]
+
+CHILD = '''
+import sys
+from timeit import default_timer as timer
+start = timer()
+{0}
+sys.stdout.write(repr(timer() - start))
+'''
+
+def time_statement(statement, directory):
+	'''Runs statement in a new interpreter. Returns the seconds it took in there and for the whole process.'''
+	start = timer()
+	child = subprocess.Popen([sys.executable, '-c', CHILD.format(statement)], cwd = directory, stdout = subprocess.PIPE)
+	(output, ignored) = child.communicate()
+	elapsed = timer() - start
+	if child.returncode != 0:
+		raise RuntimeError('{0!r} failed with exit status {1}'.format(statement, child.returncode))
+	return float(output), elapsed
+
+def median(values):
+	values = sorted(values)
+	middle = len(values) // 2
+	if len(values) % 2:
+		return values[middle]
+	return (values[middle - 1] + values[middle]) / 2.0
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = 'Time importing libtcodpy and rogalik in fresh interpreters.')
+	parser.add_argument('--runs', type = int, default = 10, help = 'processes started per statement (default %(default)s)')
+	args = parser.parse_args(argv)
+
+	#libtcodpy loads ./libtcod.so, so the children start where the game would
+	directory = os.path.dirname(os.path.abspath(__file__))
+	print('{0:<24} {1:>10} {2:>10} {3:>12}'.format('statement', 'best ms', 'median ms', 'process ms'))
+	for (name, statement) in STATEMENTS:
+		inside = []
+		process = []
+		for run in range(args.runs):
+			(seconds, elapsed) = time_statement(statement, directory)
+			inside.append(seconds)
+			process.append(elapsed)
+		print('{0:<24} {1:>10.1f} {2:>10.1f} {3:>12.1f}'.format(name, min(inside) * 1000, median(inside) * 1000, median(process) * 1000))
+		sys.stdout.flush()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,75 @@
+'''bench.py: a tiny run of every phase, baselines and the regression check.'''
+import json
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import bench
+
+TINY = ['--seeds', '1', '--sizes', '60x40', '--monsters', '0,5', '--reps', '1']
+
+class BenchTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.baseline = os.path.join(self.directory, 'baseline.json')
+		self.stdout = sys.stdout
+
+	def tearDown(self):
+		sys.stdout = self.stdout
+		shutil.rmtree(self.directory)
+
+	def main(self, *args):
+		'''bench.main on the tiny setup, returning its status and what it printed.'''
+		sys.stdout = StringIO.StringIO()
+		try:
+			status = bench.main(TINY + ['--baseline', self.baseline] + list(args))
+			return (status, sys.stdout.getvalue())
+		finally:
+			sys.stdout = self.stdout
+
+	def test_every_phase_saved(self):
+		(status, output) = self.main('--save')
+		self.assertEqual(status, 0)
+		with open(self.baseline) as f:
+			results = json.load(f)['results']
+		keys = ['{0} 60x40 m{1}'.format(name, monsters) for (name, function, unit) in bench.PHASES for monsters in (0, 5)]
+		self.assertEqual(sorted(results), sorted(keys))
+		for (key, result) in results.items():
+			self.assertGreater(result['count'], 0, key)
+			self.assertGreater(result['rate'], 0, key)
+			self.assertIn(key, output)
+
+	def test_phases_subset(self):
+		(status, output) = self.main('--phases', 'mapgen,fov', '--monsters', '0', '--save')
+		with open(self.baseline) as f:
+			self.assertEqual(sorted(json.load(f)['results']), ['fov 60x40 m0', 'mapgen 60x40 m0'])
+
+	def test_regressions_flagged(self):
+		self.main('--phases', 'mapgen', '--monsters', '0', '--save')
+		with open(self.baseline) as f:
+			baseline = json.load(f)
+		#a baseline a hundred times faster than anything can be
+		baseline['results']['mapgen 60x40 m0']['rate'] *= 100
+		with open(self.baseline, 'w') as f:
+			json.dump(baseline, f)
+		(status, output) = self.main('--phases', 'mapgen', '--monsters', '0')
+		self.assertEqual(status, 1)
+		self.assertIn('REGRESSION', output)
+
+	def test_compare(self):
+		sys.stdout = StringIO.StringIO()
+		results = {'a': {'rate': 85.0}, 'b': {'rate': 95.0}, 'c': {'rate': 200.0}, 'new': {'rate': 1.0}}
+		baseline = {'results': {'a': {'rate': 100.0}, 'b': {'rate': 100.0}, 'c': {'rate': 100.0}, 'gone': {'rate': 100.0}}}
+		self.assertEqual(bench.compare(results, baseline, 0.1), ['a'])
+		self.assertEqual(bench.compare(results, baseline, 0.01), ['a', 'b'])
+
+	def test_parse(self):
+		self.assertEqual(bench.parse_sizes('80x43,200X150'), [(80, 43), (200, 150)])
+		self.assertEqual(bench.parse_ints('1,2,30'), [1, 2, 30])
+
+if __name__ == '__main__':
+	unittest.main()
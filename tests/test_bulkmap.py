@@ -0,0 +1,111 @@
+'''Bulk map reads and writes, checked cell by cell against libtcod's own calls.'''
+import random
+import unittest
+from array import array
+
+import libtcodpy as libtcod
+
+SIZES = [(1, 1), (8, 1), (7, 3), (33, 17), (80, 43)]
+
+def cells(m, getter):
+	w = libtcod.map_get_width(m)
+	h = libtcod.map_get_height(m)
+	return bytearray(1 if getter(m, x, y) else 0 for y in range(h) for x in range(w))
+
+class BulkMapTest(unittest.TestCase):
+	#run once on the cell layout probed from the library, and again by FallbackTest with per-cell calls
+	layout = None
+
+	def setUp(self):
+		self.random = random.Random(19)
+		self.maps = []
+		self.saved = libtcod._map_cells
+		if self.layout is not None:
+			libtcod._map_cells = self.layout
+
+	def tearDown(self):
+		libtcod._map_cells = self.saved
+		for m in self.maps:
+			libtcod.map_delete(m)
+
+	def new_map(self, w, h):
+		m = libtcod.map_new(w, h)
+		self.maps.append(m)
+		return m
+
+	def pattern(self, n):
+		return bytearray(self.random.randint(0, 1) for i in range(n))
+
+	def test_set_matches_per_cell_reads(self):
+		for (w, h) in SIZES:
+			m = self.new_map(w, h)
+			transparent = self.pattern(w * h)
+			walkable = self.pattern(w * h)
+			libtcod.map_set_properties_all(m, transparent, walkable)
+			self.assertEqual(cells(m, libtcod.map_is_transparent), transparent, (w, h))
+			self.assertEqual(cells(m, libtcod.map_is_walkable), walkable, (w, h))
+			self.assertEqual(libtcod.map_get_transparent_all(m), transparent, (w, h))
+			self.assertEqual(libtcod.map_get_walkable_all(m), walkable, (w, h))
+
+	def test_get_matches_per_cell_writes(self):
+		for (w, h) in SIZES:
+			m = self.new_map(w, h)
+			transparent = self.pattern(w * h)
+			walkable = self.pattern(w * h)
+			for i in range(w * h):
+				libtcod.map_set_properties(m, i % w, i // w, transparent[i], walkable[i])
+			self.assertEqual(libtcod.map_get_transparent_all(m), transparent, (w, h))
+			self.assertEqual(libtcod.map_get_walkable_all(m), walkable, (w, h))
+
+	def test_fov_matches_per_cell_reads(self):
+		m = self.new_map(40, 30)
+		libtcod.map_set_properties_all(m, [self.random.random() < 0.8 for i in range(40 * 30)], [1] * (40 * 30))
+		for (x, y) in [(0, 0), (20, 15), (39, 29), (5, 25)]:
+			libtcod.map_compute_fov(m, x, y, 12, True, libtcod.FOV_BASIC)
+			fov = libtcod.map_get_fov_all(m)
+			self.assertEqual(fov, cells(m, libtcod.map_is_in_fov), (x, y))
+			self.assertEqual(fov[y * 40 + x], 1)
+
+	def test_setting_clears_the_fov(self):
+		m = self.new_map(10, 10)
+		libtcod.map_set_properties_all(m, [1] * 100, [1] * 100)
+		libtcod.map_compute_fov(m, 5, 5, 0, True, libtcod.FOV_BASIC)
+		self.assertTrue(any(libtcod.map_get_fov_all(m)))
+		libtcod.map_set_properties_all(m, [1] * 100, [0] * 100)
+		self.assertEqual(libtcod.map_get_fov_all(m), bytearray(100))
+		self.assertEqual(cells(m, libtcod.map_is_in_fov), bytearray(100))
+
+	def test_any_truthy_values(self):
+		m = self.new_map(4, 2)
+		expected = bytearray([0, 1, 1, 0, 1, 0, 1, 1])
+		values = [0, 2, 255, 0, 1, 0, 7, 128]
+		for given in (values, bytearray(values), array('B', values), [bool(v) for v in values]):
+			libtcod.map_set_properties_all(m, given, given)
+			self.assertEqual(cells(m, libtcod.map_is_transparent), expected, given)
+			self.assertEqual(cells(m, libtcod.map_is_walkable), expected, given)
+
+	def test_other_maps_are_left_alone(self):
+		(a, b, c) = (self.new_map(9, 5), self.new_map(9, 5), self.new_map(9, 5))
+		for m in (a, c):
+			libtcod.map_set_properties_all(m, [1] * 45, [1] * 45)
+		libtcod.map_set_properties_all(b, self.pattern(45), self.pattern(45))
+		for m in (a, c):
+			self.assertEqual(cells(m, libtcod.map_is_transparent), bytearray([1] * 45))
+			self.assertEqual(cells(m, libtcod.map_is_walkable), bytearray([1] * 45))
+
+	def test_wrong_length(self):
+		m = self.new_map(3, 3)
+		self.assertRaises(ValueError, libtcod.map_set_properties_all, m, [1] * 8, [1] * 9)
+		self.assertRaises(ValueError, libtcod.map_set_properties_all, m, [1] * 9, [1] * 10)
+
+class FallbackTest(BulkMapTest):
+	layout = False
+
+class LayoutTest(unittest.TestCase):
+
+	def test_layout_is_recognised(self):
+		#otherwise BulkMapTest only tests the fallback
+		self.assertTrue(libtcod._map_layout())
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,116 @@
+'''The cffi backend: its calls against the ctypes ones they stand in for.'''
+import random
+import unittest
+
+import libtcodpy as libtcod
+
+def setUpModule():
+	libtcod.console_set_custom_font('resource/celtic_garamond_10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
+
+@unittest.skipUnless(libtcod.BACKEND == 'cffi', 'cffi is not the backend here')
+class CffiTest(unittest.TestCase):
+	#each cffi call against its ctypes original, on a console and a map of its own
+
+	def setUp(self):
+		self.random = random.Random(22)
+		self.ctypes = libtcod._CTYPES_CALLS
+		self.consoles = [libtcod.console_new(6, 5) for i in range(2)]
+		self.maps = [libtcod.map_new(6, 5) for i in range(2)]
+
+	def tearDown(self):
+		for con in self.consoles:
+			libtcod.console_delete(con)
+		for m in self.maps:
+			libtcod.map_delete(m)
+
+	def color(self):
+		return libtcod.Color(self.random.randint(0, 255), self.random.randint(0, 255), self.random.randint(0, 255))
+
+	def cells(self, con):
+		return [(libtcod.console_get_char(con, x, y), tuple(libtcod.console_get_char_foreground(con, x, y)), tuple(libtcod.console_get_char_background(con, x, y)))
+			for x in range(6) for y in range(5)]
+
+	def test_console_calls(self):
+		(cffi_con, ctypes_con) = self.consoles
+		for i in range(300):
+			(x, y) = (self.random.randint(0, 5), self.random.randint(0, 4))
+			char = self.random.choice([self.random.randint(32, 126), chr(self.random.randint(32, 126))])
+			(fore, back) = (self.color(), self.color())
+			name = self.random.choice(['console_put_char', 'console_put_char_ex', 'console_set_char_background',
+				'console_set_char_foreground', 'console_set_char', 'console_set_default_background', 'console_set_default_foreground'])
+			args = {
+				'console_put_char': (x, y, char, libtcod.BKGND_SET),
+				'console_put_char_ex': (x, y, char, fore, back),
+				'console_set_char_background': (x, y, back, libtcod.BKGND_SET),
+				'console_set_char_foreground': (x, y, fore),
+				'console_set_char': (x, y, char),
+				'console_set_default_background': (back,),
+				'console_set_default_foreground': (fore,),
+				}[name]
+			getattr(libtcod, name)(cffi_con, *args)
+			self.ctypes[name](ctypes_con, *args)
+		self.assertEqual(self.cells(cffi_con), self.cells(ctypes_con))
+		self.assertEqual([libtcod.console_get_char(cffi_con, x, 2) for x in range(6)], [self.ctypes['console_get_char'](cffi_con, x, 2) for x in range(6)])
+
+	def test_changed_colors(self):
+		#a Color set after it was drawn with once has to go over as it is now
+		(con, ignored) = self.consoles
+		col = libtcod.Color(10, 20, 30)
+		libtcod.console_set_char_background(con, 0, 0, col)
+		col.r = 200
+		libtcod.console_set_char_background(con, 1, 0, col)
+		libtcod.color_set_hsv(col, 120.0, 1.0, 1.0)
+		libtcod.console_set_char_background(con, 2, 0, col)
+		self.assertEqual([tuple(libtcod.console_get_char_background(con, x, 0)) for x in range(3)], [(10, 20, 30), (200, 20, 30), tuple(col)])
+
+	def test_map_calls(self):
+		(cffi_map, ctypes_map) = self.maps
+		for x in range(6):
+			for y in range(5):
+				(transparent, walkable) = (self.random.random() < 0.7, self.random.random() < 0.6)
+				libtcod.map_set_properties(cffi_map, x, y, transparent, walkable)
+				self.ctypes['map_set_properties'](ctypes_map, x, y, transparent, walkable)
+		for m in self.maps:
+			libtcod.map_compute_fov(m, 2, 2, 0, True, libtcod.FOV_SHADOW)
+		for name in ('map_is_in_fov', 'map_is_transparent', 'map_is_walkable'):
+			self.assertEqual([bool(getattr(libtcod, name)(cffi_map, x, y)) for x in range(6) for y in range(5)],
+				[bool(self.ctypes[name](ctypes_map, x, y)) for x in range(6) for y in range(5)], name)
+
+	def test_random_get_int(self):
+		rngs = [libtcod.random_new_from_seed(22) for i in range(2)]
+		try:
+			self.assertEqual([libtcod.random_get_int(rngs[0], -50, 50) for i in range(100)], [self.ctypes['random_get_int'](rngs[1], -50, 50) for i in range(100)])
+		finally:
+			for rng in rngs:
+				libtcod.random_delete(rng)
+
+class LooseArgumentsTest(unittest.TestCase):
+	#ctypes passes any truthy flag and None for a handle, so both backends have to take them, with the same
+	#results. with ctypes as the backend this checks the ctypes calls against what the flags mean
+
+	def setUp(self):
+		self.ctypes = libtcod._CTYPES_CALLS
+		self.maps = [libtcod.map_new(6, 5) for i in range(2)]
+
+	def tearDown(self):
+		for m in self.maps:
+			libtcod.map_delete(m)
+
+	def test_truthy_flags(self):
+		flags = [2, 3, 256, -1, 'x', 0.5, [1], True, 1, 0, None, '', []]
+		for (m, set_properties) in zip(self.maps, [libtcod.map_set_properties, self.ctypes['map_set_properties']]):
+			for (i, flag) in enumerate(flags):
+				set_properties(m, i % 6, i // 6, flag, not flag)
+		for m in self.maps:
+			self.assertEqual([(bool(libtcod.map_is_transparent(m, i % 6, i // 6)), bool(libtcod.map_is_walkable(m, i % 6, i // 6))) for i in range(len(flags))],
+				[(bool(flag), not flag) for flag in flags])
+
+	#None as the root console is left out: with no root console open libtcod crashes on some of the writes
+	def test_none_handles(self):
+		for name in ('map_is_in_fov', 'map_is_transparent', 'map_is_walkable'):
+			self.assertEqual(getattr(libtcod, name)(None, 0, 0), self.ctypes[name](None, 0, 0), name)
+		libtcod.map_set_properties(None, 0, 0, True, True)
+		self.assertEqual(libtcod.random_get_int(None, 7, 7), self.ctypes['random_get_int'](None, 7, 7))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,118 @@
+'''ChaseField: distances to the player over the fov window, and monsters stepping down them.'''
+import heapq
+import random
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+def reference_distances(game):
+	'''Dijkstra over the walkable tiles of the fov window, diagonals costing 1.41 like libtcod's dijkstra.'''
+	size = rogalik.FOV_WINDOW
+	walkable = libtcod.map_get_walkable_all(game.fov_map)
+	(ox, oy) = game.fov_offset
+	start = (game.player.x - ox, game.player.y - oy)
+	distances = {start: 0.0}
+	queue = [(0.0, start)]
+	while queue:
+		(d, (x, y)) = heapq.heappop(queue)
+		if d > distances[(x, y)]:
+			continue
+		for (dx, dy) in rogalik.NEIGHBOURS:
+			(nx, ny) = (x + dx, y + dy)
+			if 0 <= nx < size and 0 <= ny < size and walkable[ny * size + nx]:
+				nd = d + (1.41 if dx and dy else 1.0)
+				if nd < distances.get((nx, ny), float('inf')) - 1e-9:
+					distances[(nx, ny)] = nd
+					heapq.heappush(queue, (nd, (nx, ny)))
+	return dict(((x + ox, y + oy), d) for ((x, y), d) in distances.items())
+
+class ChaseFieldTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = None
+
+	def tearDown(self):
+		if self.game is not None:
+			self.game.close()
+
+	def test_distances_match_dijkstra(self):
+		for seed in (1, 2, 3):
+			self.game = game = rogalik.Game(seed = seed)
+			walk = random.Random(seed)
+			for turn in range(40):
+				game.step(('move',) + walk.choice(rogalik.NEIGHBOURS))
+				if turn % 10:
+					continue
+				game.chase.update()
+				expected = reference_distances(game)
+				(ox, oy) = game.fov_offset
+				for x in range(ox - 1, ox + rogalik.FOV_WINDOW + 1):
+					for y in range(oy - 1, oy + rogalik.FOV_WINDOW + 1):
+						self.assertAlmostEqual(game.chase.distance(x, y), expected.get((x, y), -1), 3, (seed, turn, x, y))
+			game.close()
+			self.game = None
+
+	def test_computed_when_something_changed(self):
+		self.game = game = rogalik.Game(seed = 2)
+		computed = []
+		compute = game.chase.compute
+		game.chase.compute = lambda *args: (computed.append(game.turncount), compute(*args))
+		for i in range(3):
+			game.chase.update()
+		#the player waits: same distances
+		game.step(('wait',))
+		game.chase.update()
+		self.assertEqual(computed, [0])
+		#the player moves, whoever asks first after that computes them
+		(dx, dy) = [(dx, dy) for (dx, dy) in rogalik.NEIGHBOURS if not rogalik.is_blocked(game.player.x + dx, game.player.y + dy)][0]
+		game.step(('move', dx, dy))
+		game.chase.update()
+		game.chase.update()
+		self.assertEqual(len(computed), 2)
+		#a tile in the window changes
+		game.opacity_version += 1
+		game.chase.update()
+		self.assertEqual(len(computed), 3)
+
+	def test_monsters_walk_down_to_the_player(self):
+		self.game = game = rogalik.Game(seed = 1)
+		player = game.player
+		game.chase.update()
+		distances = reference_distances(game)
+		#the walkable tile furthest from the player, to walk a kobold from
+		start = max(distances, key = lambda xy: (distances[xy], xy))
+		kobold = rogalik.Object(start[0], start[1], 'k', 'kobold', blocks = True)
+		rogalik.add_object(kobold)
+		for i in range(int(distances[start]) + 1):
+			here = game.chase.distance(kobold.x, kobold.y)
+			if here < 1.5:
+				break
+			self.assertTrue(game.chase.step(kobold))
+			self.assertLess(game.chase.distance(kobold.x, kobold.y), here)
+		self.assertLess(kobold.distance_to(player), 2)
+		#next to the player nothing free is any closer
+		self.assertFalse(game.chase.step(kobold))
+
+	def test_blocked_neighbours_are_skipped(self):
+		self.game = game = rogalik.Game(seed = 1)
+		player = game.player
+		game.chase.update()
+		#a kobold two steps away with every closer tile taken
+		for (x, y) in sorted(reference_distances(game)):
+			if max(abs(x - player.x), abs(y - player.y)) != 2:
+				continue
+			kobold = rogalik.Object(x, y, 'k', 'kobold', blocks = True)
+			rogalik.add_object(kobold)
+			here = game.chase.distance(x, y)
+			for (dx, dy) in rogalik.NEIGHBOURS:
+				d = game.chase.distance(x + dx, y + dy)
+				if 0 <= d < here and not rogalik.is_blocked(x + dx, y + dy):
+					rogalik.add_object(rogalik.Object(x + dx, y + dy, 'w', 'wall of kobolds', blocks = True))
+			self.assertFalse(game.chase.step(kobold))
+			self.assertEqual((kobold.x, kobold.y), (x, y))
+			return
+		self.fail('no tile two steps from the player')
+
+if __name__ == '__main__':
+	unittest.main()
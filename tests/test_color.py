@@ -0,0 +1,81 @@
+'''The whole-array color ops against libtcod's own per-Color calls, element by element.'''
+import random
+import unittest
+
+import libtcodpy as libtcod
+
+#coefficients that leave 0..255, don't fit in an int or aren't numbers at all, on top of random ones
+EXTREMES = [0.0, 1.0, -0.5, 2.0, 300.5, 1e5, -1e5, 8.4e6, 1.1e7, -1e7, 1e10, -1e10, 1e38, 3.4e38, 1e39,
+	float('inf'), float('-inf'), float('nan')]
+
+def channels(colors):
+	return tuple([c[k] for c in colors] for k in range(3))
+
+def rgb(colors):
+	return [tuple(c) for c in colors]
+
+class ChannelOpsTest(unittest.TestCase):
+	
+	def setUp(self):
+		rng = random.Random(7)
+		self.coefs = EXTREMES + [rng.uniform(-3, 3) for n in range(200)]
+		#every pair of channel values is too many, the corners and random ones will do
+		values = [0, 1, 127, 128, 254, 255]
+		self.a = [libtcod.Color(r, g, b) for r in values for g in values for b in values]
+		self.a += [libtcod.Color(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)) for n in range(300)]
+		self.b = list(reversed(self.a))
+		
+	def combine(self, function, a, b):
+		#the channel op applied to a and b, back as a list of (r, g, b)
+		return zip(*[function(x, y) for (x, y) in zip(channels(a), channels(b))])
+		
+	def test_add(self):
+		self.assertEqual(self.combine(libtcod.color_add_channels, self.a, self.b), rgb(x + y for (x, y) in zip(self.a, self.b)))
+		
+	def test_subtract(self):
+		self.assertEqual(self.combine(libtcod.color_subtract_channels, self.a, self.b), rgb(x - y for (x, y) in zip(self.a, self.b)))
+		
+	def test_multiply(self):
+		self.assertEqual(self.combine(libtcod.color_multiply_channels, self.a, self.b), rgb(x * y for (x, y) in zip(self.a, self.b)))
+		
+	def test_scale(self):
+		for coef in self.coefs:
+			scaled = zip(*[libtcod.color_scale_channels(x, coef) for x in channels(self.a)])
+			self.assertEqual(scaled, rgb(x * coef for x in self.a), 'scaling by {0!r}'.format(coef))
+			
+	def test_lerp(self):
+		for coef in self.coefs:
+			lerped = self.combine(lambda x, y: libtcod.color_lerp_channels(x, y, coef), self.a, self.b)
+			self.assertEqual(lerped, rgb(libtcod.color_lerp(x, y, coef) for (x, y) in zip(self.a, self.b)), 'lerp by {0!r}'.format(coef))
+			
+	def test_lerp_coefficient_per_element(self):
+		coefs = [self.coefs[n % len(self.coefs)] for n in range(len(self.a))]
+		lerped = self.combine(lambda x, y: libtcod.color_lerp_channels(x, y, coefs), self.a, self.b)
+		self.assertEqual(lerped, rgb(libtcod.color_lerp(x, y, coef) for (x, y, coef) in zip(self.a, self.b, coefs)))
+
+class ColorTest(unittest.TestCase):
+	
+	def test_equality(self):
+		self.assertTrue(libtcod.Color(1, 2, 3) == libtcod.Color(1, 2, 3))
+		self.assertFalse(libtcod.Color(1, 2, 3) != libtcod.Color(1, 2, 3))
+		self.assertTrue(libtcod.Color(1, 2, 3) != libtcod.Color(1, 2, 4))
+		
+	def test_huge_scalars_come_out_like_the_library(self):
+		#x86 turns floats that don't fit in an int into INT_MIN, which clamps to 0
+		self.assertEqual(tuple(libtcod.Color(200, 1, 0) * 1e10), (0, 0, 0))
+		self.assertEqual(tuple(libtcod.Color(200, 1, 0) * float('nan')), (0, 0, 0))
+		self.assertEqual(list(libtcod.color_scale_channels([200, 1, 0], 1.1e7)), [0, 255, 0])
+		
+	def test_gradient(self):
+		colors = [libtcod.black, libtcod.Color(200, 120, 40), libtcod.white]
+		indexes = [0, 7, 15]
+		native = libtcod.color_gen_map(colors, indexes)
+		gradient = libtcod.color_gradient(colors, indexes)
+		self.assertEqual(len(gradient), len(native))
+		self.assertEqual([tuple(gradient[i]) for i in range(len(gradient))], rgb(native))
+		self.assertIs(libtcod.color_gradient(colors, indexes), gradient)
+		levels = [15, 0, 3, 3, 9]
+		self.assertEqual(zip(*gradient.lookup(levels)), [tuple(native[i]) for i in levels])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,126 @@
+'''ArrayConsoleBuffer: copy-on-write snapshots, rectangle writes and the bulk blit to a console.'''
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+def setUpModule():
+	#the console fills go through the character mapping the font sets up
+	libtcod.console_set_custom_font('resource/celtic_garamond_10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
+
+def cells(buffer):
+	return [list(getattr(buffer, name)) for name in libtcod.ArrayConsoleBuffer._LAYERS]
+
+class CopyOnWriteTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.buffer = libtcod.ArrayConsoleBuffer(4, 3)
+		self.buffer.set(1, 1, 1, 2, 3, 4, 5, 6, '@')
+		
+	def test_copy_keeps_the_contents(self):
+		self.assertEqual(cells(self.buffer.copy()), cells(self.buffer))
+		
+	def test_writes_after_a_copy_stay_on_their_side(self):
+		writes = [
+			lambda b: b.set(0, 0, 9, 9, 9, 9, 9, 9, '#'),
+			lambda b: b.set_fore(0, 0, 9, 9, 9, '#'),
+			lambda b: b.set_back(0, 0, 9, 9, 9),
+			lambda b: b.fill_rect(0, 0, 2, 2, back = (9, 9, 9), fore = (9, 9, 9), char = '#'),
+			lambda b: b.set_rect(0, 0, 2, 1, fore = ([9, 9], [9, 9], [9, 9]), char = [35, 35]),
+			]
+		for write in writes:
+			self.setUp()
+			original = cells(self.buffer)
+			snapshot = self.buffer.copy()
+			write(self.buffer)
+			self.assertEqual(cells(snapshot), original)
+			self.assertNotEqual(cells(self.buffer), original)
+			#and the other way around
+			snapshot = self.buffer.copy()
+			changed = cells(self.buffer)
+			write(snapshot)
+			self.assertEqual(cells(self.buffer), changed)
+
+	def test_fills_outside_leave_a_copy_shared(self):
+		snapshot = self.buffer.copy()
+		for (x, y, w, h) in [(4, 0, 2, 2), (0, -3, 4, 3), (-2, -2, 1, 9), (1, 1, 0, 2)]:
+			self.buffer.fill_rect(x, y, w, h, back = (9, 9, 9), fore = (9, 9, 9), char = '#')
+		self.buffer.fill_rect(0, 0, 4, 3)
+		self.assertTrue(self.buffer.shared)
+		self.assertIs(self.buffer.char, snapshot.char)
+		self.assertEqual(cells(self.buffer), cells(snapshot))
+
+class SetRectTest(unittest.TestCase):
+	
+	def test_rows_land_in_place(self):
+		buffer = libtcod.ArrayConsoleBuffer(4, 3)
+		buffer.set_rect(1, 1, 2, 2, back = ([1, 2, 3, 4],) * 3, char = [65, 66, 67, 68])
+		self.assertEqual(list(buffer.back_r), [0, 0, 0, 0, 0, 1, 2, 0, 0, 3, 4, 0])
+		self.assertEqual(list(buffer.char), [32] * 5 + [65, 66, 32, 32, 67, 68, 32])
+		self.assertEqual(list(buffer.fore_g), [0] * 12)
+		
+	def test_outside_the_buffer(self):
+		buffer = libtcod.ArrayConsoleBuffer(4, 3)
+		self.assertRaises(ValueError, buffer.set_rect, 3, 0, 2, 1, char = [65, 66])
+		self.assertRaises(ValueError, buffer.set_rect, -1, 0, 1, 1, char = [65])
+
+class BlitTest(unittest.TestCase):
+	
+	def test_blit_fills_the_console(self):
+		buffer = libtcod.ArrayConsoleBuffer(5, 4)
+		buffer.set(2, 3, 10, 20, 30, 40, 50, 60, 'x')
+		buffer.fill_rect(0, 0, 2, 1, fore = (200, 100, 0), char = '#')
+		con = libtcod.console_new(5, 4)
+		try:
+			buffer.blit(con)
+			self.assertEqual(libtcod.console_get_char(con, 2, 3), ord('x'))
+			self.assertEqual(tuple(libtcod.console_get_char_background(con, 2, 3)), (10, 20, 30))
+			self.assertEqual(tuple(libtcod.console_get_char_foreground(con, 2, 3)), (40, 50, 60))
+			self.assertEqual(libtcod.console_get_char(con, 1, 0), ord('#'))
+			self.assertEqual(tuple(libtcod.console_get_char_foreground(con, 1, 0)), (200, 100, 0))
+		finally:
+			libtcod.console_delete(con)
+			
+	def test_size_has_to_match(self):
+		con = libtcod.console_new(5, 4)
+		try:
+			self.assertRaises(ValueError, libtcod.ArrayConsoleBuffer(4, 4).blit, con)
+		finally:
+			libtcod.console_delete(con)
+
+class RenderCacheTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.renderer = rogalik.ConsoleRenderer(window = False)
+		self.game = rogalik.Game(self.renderer, seed = 3)
+		
+	def tearDown(self):
+		self.game.close()
+		
+	def test_snapshot_survives_redraws(self):
+		self.renderer.render()
+		cache = self.renderer.cache
+		snapshot = cache.buffer.copy()
+		frame = cells(snapshot)
+		#steps redraw the tiles around the player in place, once it's out of the room it started in
+		player = self.game.player
+		room = self.game.rooms[-1]
+		for (x, y) in self.game.room_graph.find_path(player.x, player.y, *room.center())[1:]:
+			self.game.step(('move', x - player.x, y - player.y))
+			self.renderer.render()
+			if cells(cache.buffer) != frame:
+				break
+		self.assertNotEqual(cells(cache.buffer), frame)
+		self.assertEqual(cells(snapshot), frame)
+		
+	def test_console_matches_the_buffer(self):
+		self.renderer.render()
+		cache = self.renderer.cache
+		buffer = cache.buffer
+		for (x, y) in [(0, 0), (buffer.width / 2, buffer.height / 2), (buffer.width - 1, buffer.height - 1)]:
+			i = y * buffer.width + x
+			self.assertEqual(libtcod.console_get_char(cache.con, x, y), buffer.char[i])
+			self.assertEqual(tuple(libtcod.console_get_char_foreground(cache.con, x, y)), (buffer.fore_r[i], buffer.fore_g[i], buffer.fore_b[i]))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,56 @@
+'''Disc stencils: circle(), circle_mask() and Area against the distance test they replaced.'''
+import unittest
+
+import rogalik
+
+def scanned_circle(x, y, radius):
+	'''circle() as it used to be: every tile of the square around x, y checked by distance, kept if on the map.'''
+	coords = []
+	for cx in range(x - radius, x + radius):
+		for cy in range(y - radius, y + radius):
+			if rogalik.distance(x, y, cx, cy) <= radius - 1 and rogalik.game.map.in_bounds(cx, cy):
+				coords.append((cx, cy))
+	return coords
+
+class DiscTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 1)
+		m = self.game.map
+		#the middle, the corners and just past the edges
+		self.centers = [(m.width // 2, m.height // 2), (0, 0), (m.width - 1, m.height - 1), (2, m.height - 3), (-2, 5), (m.width + 1, m.height + 1)]
+
+	def tearDown(self):
+		self.game.close()
+
+	def test_circle(self):
+		for radius in range(0, 14):
+			for (x, y) in self.centers:
+				self.assertEqual(rogalik.circle(x, y, radius), scanned_circle(x, y, radius), (x, y, radius))
+
+	def test_stencils_are_kept(self):
+		self.assertIs(rogalik.disc(5), rogalik.disc(5))
+		self.assertIs(rogalik.disc_mask(5), rogalik.disc_mask(5))
+
+	def test_circle_mask(self):
+		for radius in range(0, 14):
+			for (x, y) in self.centers:
+				(x1, y1, w, h, mask) = rogalik.circle_mask(x, y, radius)
+				self.assertEqual(len(mask), w * h)
+				covered = set((x1 + i % w, y1 + i // w) for i in range(len(mask)) if mask[i])
+				self.assertEqual(covered, set(scanned_circle(x, y, radius)), (x, y, radius))
+
+	def test_area(self):
+		game = self.game
+		objects = list(game.objects)
+		for obj in objects[:10]:
+			for size in (1, 2, 3, 6):
+				area = rogalik.Area(obj.x, obj.y, size)
+				tiles = set(scanned_circle(obj.x, obj.y, size))
+				self.assertEqual(set(area.caught), set(other for other in objects if (other.x, other.y) in tiles))
+				for x in range(obj.x - size - 1, obj.x + size + 2):
+					for y in range(obj.y - size - 1, obj.y + size + 2):
+						self.assertEqual((x, y) in area, (x, y) in tiles, (x, y, size))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,48 @@
+'''EntityStore: stable handles, reused slots and per-layer change counts.'''
+import unittest
+
+import rogalik
+from rogalik import Object, EntityStore
+
+class EntityStoreTest(unittest.TestCase):
+
+	def setUp(self):
+		self.store = EntityStore()
+
+	def test_handles_stay_and_get_reused(self):
+		objects = [Object(i, 0) for i in range(5)]
+		handles = [self.store.add(obj) for obj in objects]
+		self.assertEqual(handles, range(5))
+		self.store.remove(objects[1])
+		self.store.remove(objects[3])
+		self.assertIs(objects[1].handle, None)
+		self.assertNotIn(objects[1], self.store)
+		self.assertEqual([self.store.get(h) for h in (0, 2, 4)], [objects[0], objects[2], objects[4]])
+		newcomer = Object(9, 9)
+		self.assertIn(self.store.add(newcomer), (1, 3))
+		self.assertIn(newcomer, self.store)
+		self.assertEqual(len(self.store), 4)
+		self.assertEqual(list(self.store), sorted([objects[0], objects[2], objects[4], newcomer], key = lambda obj: obj.handle))
+
+	def test_iterating_is_a_snapshot(self):
+		objects = [Object(i, 0) for i in range(4)]
+		for obj in objects:
+			self.store.add(obj)
+		seen = []
+		for obj in self.store:
+			seen.append(obj)
+			self.store.remove(obj)
+		self.assertEqual(seen, objects)
+		self.assertEqual(len(self.store), 0)
+
+	def test_versions_count_changes_per_layer(self):
+		item = Object(0, 0, item = rogalik.Item())
+		actor = Object(0, 0)
+		self.store.add(item)
+		self.store.add(actor)
+		self.store.remove(actor)
+		self.assertEqual(self.store.versions[rogalik.Z_ITEMS], 1)
+		self.assertEqual(self.store.versions[rogalik.Z_ACTORS], 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,215 @@
+'''The fov map: kept in step with the map window by update_fovmap, tile by tile or all at once, and
+the player's fov computed on it, the same as on a map of the whole level.'''
+import random
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+def window_layers(game):
+	'''(transparent, walkable) the fov window should hold, straight from the map, walls past its edges.'''
+	(ox, oy) = game.fov_offset
+	transparent = bytearray()
+	walkable = bytearray()
+	for y in range(oy, oy + rogalik.FOV_WINDOW):
+		for x in range(ox, ox + rogalik.FOV_WINDOW):
+			inside = game.map.in_bounds(x, y)
+			transparent.append(1 if inside and not game.map.get('block_sight', x, y) else 0)
+			walkable.append(1 if inside and not game.map.get('blocked', x, y) else 0)
+	return (transparent, walkable)
+
+class FovSyncTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 5, width = 150, height = 120, max_rooms = 120)
+		self.random = random.Random(2)
+
+	def tearDown(self):
+		self.game.close()
+
+	def assertInStep(self):
+		self.assertEqual((libtcod.map_get_transparent_all(self.game.fov_map), libtcod.map_get_walkable_all(self.game.fov_map)), window_layers(self.game))
+
+	def test_new_game(self):
+		self.assertInStep()
+
+	def test_single_tiles(self):
+		game = self.game
+		(ox, oy) = game.fov_offset
+		for i in range(200):
+			#some outside the window, which it mustn't pick up
+			(x, y) = (self.random.randint(ox - 5, ox + rogalik.FOV_WINDOW + 5), self.random.randint(oy - 5, oy + rogalik.FOV_WINDOW + 5))
+			if not game.map.in_bounds(x, y):
+				continue
+			tile = game.map[x][y]
+			if self.random.random() < 0.5:
+				tile.blocked = not tile.blocked
+			else:
+				tile.block_sight = not tile.block_sight
+			if i % 7 == 0:
+				rogalik.update_fovmap()
+				self.assertInStep()
+		rogalik.update_fovmap()
+		self.assertInStep()
+		self.assertEqual(game.map.fov_dirty, set())
+
+	def test_bulk_edits(self):
+		game = self.game
+		(ox, oy) = game.fov_offset
+		game.map.dig(ox - 3, oy + 2, ox + 9, oy + 6)
+		game.map.fill_rect(ox + 4, oy - 2, ox + 6, oy + rogalik.FOV_WINDOW + 2, True, True, '#')
+		rogalik.update_fovmap()
+		self.assertInStep()
+
+	def test_opacity_version(self):
+		game = self.game
+		version = game.opacity_version
+		rogalik.update_fovmap()
+		self.assertEqual(game.opacity_version, version)
+		(ox, oy) = game.fov_offset
+		game.map[ox + 1][oy + 1].block_sight = True
+		rogalik.update_fovmap()
+		self.assertEqual(game.opacity_version, version + 1)
+
+	def test_walking_around(self):
+		#the window moves along with the player and gets refilled
+		game = self.game
+		player = game.player
+		player.fighter.max_hp = player.fighter.hp = 10 ** 6
+		far = max(game.rooms, key = lambda room: rogalik.distance(player.x, player.y, *room.center()))
+		path = game.room_graph.find_path(player.x, player.y, *far.center())
+		offsets = set([game.fov_offset])
+		for (n, (x, y)) in enumerate(path[1:]):
+			#a monster or a closed door in the way takes a few turns
+			for attempt in range(50):
+				if (player.x, player.y) == (x, y):
+					break
+				game.step(('move', x - player.x, y - player.y))
+			self.assertEqual((player.x, player.y), (x, y))
+			offsets.add(game.fov_offset)
+			if n % 10 == 0:
+				self.assertInStep()
+		self.assertInStep()
+		self.assertGreater(len(offsets), 2)
+
+def whole_map_fov(game):
+	'''The tiles the player would see with the fov computed on a libtcod map as big as the whole map.'''
+	m = game.map
+	full = libtcod.map_new(m.width, m.height)
+	try:
+		transparent = [not m.get('block_sight', x, y) for y in range(m.height) for x in range(m.width)]
+		walkable = [not m.get('blocked', x, y) for y in range(m.height) for x in range(m.width)]
+		libtcod.map_set_properties_all(full, transparent, walkable)
+		libtcod.map_compute_fov(full, game.player.x, game.player.y, rogalik.TORCH_RADIUS, rogalik.FOV_LIGHT_WALLS, libtcod.FOV_SHADOW)
+		seen = libtcod.map_get_fov_all(full)
+	finally:
+		libtcod.map_delete(full)
+	return set((i % m.width, i // m.width) for i in range(len(seen)) if seen[i])
+
+class WindowedFovTest(unittest.TestCase):
+	#FOV_BASIC casts its rays towards the edges of the whole libtcod map, so which walls at the far end of
+	#a corridor it lights depends a little on the map's size and where the player stands in it. shadow
+	#casting only looks inside the radius, so with it the window has to give exactly what the whole map does
+
+	def setUp(self):
+		self.algo = rogalik.FOV_ALGO
+		rogalik.FOV_ALGO = libtcod.FOV_SHADOW
+		self.game = rogalik.Game(seed = 7, width = 150, height = 120, max_rooms = 120)
+		self.game.player.fighter.max_hp = self.game.player.fighter.hp = 10 ** 6
+
+	def tearDown(self):
+		self.game.close()
+		rogalik.FOV_ALGO = self.algo
+
+	def seen(self):
+		game = self.game
+		return set((x, y) for x in range(game.map.width) for y in range(game.map.height) if rogalik.in_fov(x, y))
+
+	def test_same_as_the_whole_map(self):
+		game = self.game
+		player = game.player
+		for room in game.rooms[:12]:
+			path = game.room_graph.find_path(player.x, player.y, *room.center())
+			for (x, y) in path[1:]:
+				for attempt in range(50):
+					if (player.x, player.y) == (x, y):
+						break
+					game.step(('move', x - player.x, y - player.y))
+			self.assertEqual(self.seen(), whole_map_fov(game), (player.x, player.y))
+
+	def test_map_edges(self):
+		#in a corner the window hangs off the map, past the edge is all wall
+		game = self.game
+		game.map.dig(1, 1, 12, 12)
+		game.player.place(1, 1)
+		game.fov_offset = None
+		game.compute_fov()
+		(ox, oy) = game.fov_offset
+		self.assertTrue(ox < 0 and oy < 0)
+		self.assertEqual(self.seen(), whole_map_fov(game))
+
+class VisibilityTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 3)
+		self.game.player.fighter.max_hp = self.game.player.fighter.hp = 10 ** 6
+		self.random = random.Random(18)
+
+	def tearDown(self):
+		self.game.close()
+
+	def test_in_fov_matches_the_fov_map(self):
+		game = self.game
+		for turn in range(30):
+			game.step(('move',) + self.random.choice(rogalik.NEIGHBOURS))
+			(ox, oy) = game.fov_offset
+			for x in range(ox - 2, ox + rogalik.FOV_WINDOW + 2):
+				for y in range(oy - 2, oy + rogalik.FOV_WINDOW + 2):
+					inside = 0 <= x - ox < rogalik.FOV_WINDOW and 0 <= y - oy < rogalik.FOV_WINDOW
+					self.assertEqual(rogalik.in_fov(x, y), inside and bool(libtcod.map_is_in_fov(game.fov_map, x - ox, y - oy)), (turn, x, y))
+
+	def test_exported_once_per_fov(self):
+		game = self.game
+		exported = []
+		map_get_fov_all = libtcod.map_get_fov_all
+		libtcod.map_get_fov_all = lambda m: exported.append(m) or map_get_fov_all(m)
+		try:
+			game.compute_fov()
+			self.assertEqual(exported, [])
+			first = rogalik.visibility()
+			rogalik.in_fov(game.player.x, game.player.y)
+			self.assertIs(rogalik.visibility(), first)
+			self.assertEqual(len(exported), 1)
+			game.compute_fov()
+			self.assertIsNot(rogalik.visibility(), first)
+			self.assertEqual(len(exported), 2)
+		finally:
+			libtcod.map_get_fov_all = map_get_fov_all
+
+	def test_readers(self):
+		game = self.game
+		player = game.player
+		#kobolds that can't move, scattered around the player, some in sight and some not
+		for i in range(40):
+			(x, y) = (player.x + self.random.randint(-12, 12), player.y + self.random.randint(-12, 12))
+			if game.map.in_bounds(x, y) and not rogalik.is_blocked(x, y):
+				rogalik.add_object(rogalik.Object(x, y, 'k', 'kobold', blocks = True, fighter = rogalik.Fighter(10 ** 6, 0, 0)))
+		seen = 0
+		for turn in range(60):
+			game.step(('move',) + self.random.choice(rogalik.NEIGHBOURS))
+			targets = [obj for obj in game.objects if obj.fighter and obj is not player and rogalik.in_fov(obj.x, obj.y)
+				and rogalik.distance(player.x, player.y, obj.x, obj.y) < rogalik.TORCH_RADIUS + 1]
+			found = rogalik.closest_monster(rogalik.TORCH_RADIUS)
+			if targets:
+				seen += 1
+				self.assertEqual(rogalik.distance(player.x, player.y, found.x, found.y), min(rogalik.distance(player.x, player.y, obj.x, obj.y) for obj in targets))
+			else:
+				self.assertIs(found, None)
+			#everything on a tile in view is named, nothing on one out of view
+			for obj in game.objects:
+				names = ', '.join(other.name for other in game.index.at(obj.x, obj.y)) if rogalik.in_fov(obj.x, obj.y) else ''
+				self.assertEqual(rogalik.get_names(obj.x, obj.y), names)
+		self.assertGreater(seen, 10)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,94 @@
+'''Game and its step() API: headless play, seeded games that repeat, and what each action does.'''
+import random
+import unittest
+
+import rogalik
+
+STEPS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]
+
+def play(seed, turns):
+	'''The state a seeded game ends up in after some random moves, waits and pickups.'''
+	game = rogalik.Game(seed = seed)
+	game.player.fighter.max_hp = game.player.fighter.hp = 10 ** 6
+	actions = random.Random(seed)
+	try:
+		for i in range(turns):
+			roll = actions.random()
+			if roll < 0.1:
+				game.step(('wait',))
+			elif roll < 0.2:
+				game.step(('get',))
+			else:
+				game.step(('move',) + actions.choice(STEPS))
+		return (game.turncount, (game.player.x, game.player.y), game.player.fighter.hp, sorted((obj.name, obj.x, obj.y) for obj in game.objects),
+			[obj.name for obj in game.inventory], list(game.messages))
+	finally:
+		game.close()
+
+class StepTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 4)
+		self.player = self.game.player
+
+	def tearDown(self):
+		self.game.close()
+
+	def free_tile_next_to_the_player(self):
+		for (dx, dy) in STEPS:
+			if not rogalik.is_blocked(self.player.x + dx, self.player.y + dy):
+				return (self.player.x + dx, self.player.y + dy)
+
+	def test_turns(self):
+		self.assertEqual(self.game.step(('wait',)), None)
+		self.assertEqual(self.game.turncount, 1)
+		#nothing in the pack to use or drop, so no time passes
+		self.assertEqual(self.game.step(('use', 0)), 'didnt-take-turn')
+		self.assertEqual(self.game.step(('drop', 3)), 'didnt-take-turn')
+		self.assertEqual(self.game.turncount, 1)
+		self.assertRaises(ValueError, self.game.step, ('dance',))
+
+	def test_move(self):
+		(x, y) = self.free_tile_next_to_the_player()
+		self.game.step(('move', x - self.player.x, y - self.player.y))
+		self.assertEqual((self.player.x, self.player.y), (x, y))
+		self.assertEqual(self.game.fov_origin, (x, y))
+
+	def test_get_and_drop(self):
+		potion = rogalik.Object(self.player.x, self.player.y, '!', 'potion', item = rogalik.Item())
+		rogalik.add_object(potion)
+		self.game.step(('get',))
+		self.assertEqual(self.game.inventory, [potion])
+		self.assertNotIn(potion, self.game.objects)
+		(x, y) = self.free_tile_next_to_the_player()
+		self.game.step(('move', x - self.player.x, y - self.player.y))
+		self.game.step(('drop', 0))
+		self.assertEqual(self.game.inventory, [])
+		self.assertIn(potion, self.game.index.at(x, y))
+
+	def test_fireball_at_a_target(self):
+		kobold = rogalik.Object(self.player.x + 2, self.player.y, 'k', 'kobold', blocks = True, fighter = rogalik.Fighter(100, 0, 0))
+		rogalik.add_object(kobold)
+		self.game.step(('fireball', (kobold.x, kobold.y)))
+		self.assertEqual(kobold.fighter.hp, 100 - rogalik.FIREBALL_DAMAGE)
+		self.assertEqual(self.game.turncount, 1)
+		#out of range, or nobody to ask where to throw it: no turn taken
+		self.assertEqual(self.game.step(('fireball', (self.player.x + rogalik.FIREBALL_RANGE + 3, self.player.y))), 'didnt-take-turn')
+		self.assertEqual(self.game.step(('fireball',)), 'didnt-take-turn')
+		self.assertEqual(self.game.turncount, 1)
+
+	def test_no_turns_once_dead(self):
+		self.game.state = 'dead'
+		self.assertEqual(self.game.step(('wait',)), 'didnt-take-turn')
+		self.assertEqual(self.game.turncount, 0)
+
+class SeedTest(unittest.TestCase):
+
+	def test_same_seed_same_game(self):
+		self.assertEqual(play(6, 150), play(6, 150))
+
+	def test_other_seed_other_level(self):
+		self.assertNotEqual(play(6, 0), play(7, 0))
+
+if __name__ == '__main__':
+	unittest.main()
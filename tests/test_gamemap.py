@@ -0,0 +1,107 @@
+'''GameMap: chunked layers, rectangle fills, spans across chunk borders and packing away chunks.'''
+import random
+import unittest
+
+import rogalik
+from rogalik import GameMap, Tile, CHUNK_SIZE
+
+WALL = (1, 1, 0, ord('&'))
+
+def tiles(gamemap):
+	'''Every tile as (blocked, block_sight, explored, glyph), by (x, y).'''
+	return dict(((x, y), tuple(gamemap.get(layer, x, y) for layer in rogalik.LAYERS))
+		for x in range(gamemap.width) for y in range(gamemap.height))
+
+class GameMapTest(unittest.TestCase):
+
+	def setUp(self):
+		#not a multiple of the chunk size, so the last chunks are cut off
+		self.map = GameMap(3 * CHUNK_SIZE + 5, 2 * CHUNK_SIZE + 3)
+		self.expected = dict(((x, y), WALL) for x in range(self.map.width) for y in range(self.map.height))
+		self.random = random.Random(8)
+
+	def fill(self, x1, y1, x2, y2, blocked, block_sight, symbol):
+		self.map.fill_rect(x1, y1, x2, y2, blocked, block_sight, symbol)
+		for x in range(max(x1, 0), min(x2, self.map.width)):
+			for y in range(max(y1, 0), min(y2, self.map.height)):
+				self.expected[(x, y)] = (int(blocked), int(block_sight), self.expected[(x, y)][2], ord(symbol))
+
+	def random_rect(self):
+		(x1, x2) = sorted(self.random.randint(-3, self.map.width + 3) for i in range(2))
+		(y1, y2) = sorted(self.random.randint(-3, self.map.height + 3) for i in range(2))
+		return (x1, y1, x2, y2)
+
+	def test_new_map_is_solid_and_empty(self):
+		self.assertEqual(tiles(self.map), self.expected)
+		self.assertEqual(self.map.chunks, {})
+
+	def test_fill_rect_across_chunks(self):
+		for i in range(40):
+			(x1, y1, x2, y2) = self.random_rect()
+			self.fill(x1, y1, x2, y2, self.random.random() < 0.5, self.random.random() < 0.5, self.random.choice('.#+'))
+		self.assertEqual(tiles(self.map), self.expected)
+		self.assertEqual(rogalik.SOLID_CHUNK.glyph.tostring(), '&' * rogalik.CHUNK_CELLS)
+
+	def test_only_dug_chunks_are_allocated(self):
+		self.map.dig(CHUNK_SIZE + 1, 1, CHUNK_SIZE + 3, 2)
+		self.assertEqual(sorted(self.map.chunks), [(1, 0)])
+
+	def test_spans_cover_the_rectangle_once(self):
+		self.map.dig(0, 0, self.map.width, self.map.height)
+		for i in range(30):
+			(x1, y1, x2, y2) = self.random_rect()
+			covered = []
+			for (chunk, x, y, start, w) in self.map.spans(x1, y1, x2, y2):
+				for dx in range(w):
+					self.assertIs(self.map.locate(x + dx, y)[0], chunk)
+					self.assertEqual(self.map.locate(x + dx, y)[1], start + dx)
+					covered.append((x + dx, y))
+			inside = [(x, y) for y in range(max(y1, 0), min(y2, self.map.height)) for x in range(max(x1, 0), min(x2, self.map.width))]
+			self.assertEqual(sorted(covered), sorted(inside))
+
+	def test_spans_skip_untouched_chunks(self):
+		self.map.dig(1, 1, 2, 2)
+		pieces = list(self.map.spans(0, 0, self.map.width, self.map.height))
+		self.assertEqual(set(x // CHUNK_SIZE for (chunk, x, y, start, w) in pieces), set([0]))
+
+	def test_tiles_and_views(self):
+		door = rogalik.Usable(lambda: None)
+		self.map[40][10] = Tile(True, False, '+', door)
+		self.map[41][10] = Tile(False)
+		view = self.map[40][10]
+		self.assertEqual((view.blocked, view.block_sight, view.explored, view.symbol), (True, False, False, '+'))
+		self.assertIs(view.usable, door)
+		self.assertEqual((door.owner.x, door.owner.y), (40, 10))
+		self.assertEqual(self.map[41][10].symbol, '&')
+		self.assertIn(self.map.index(40, 10), self.map.fov_dirty)
+		view.blocked = False
+		view.symbol = '/'
+		view.explored = True
+		self.assertEqual(self.map.get('glyph', 40, 10), ord('/'))
+		self.assertEqual((self.map.get('blocked', 40, 10), self.map.get('explored', 40, 10)), (0, 1))
+		self.map[40][10] = Tile(True)
+		self.assertIs(self.map[40][10].usable, None)
+
+	def test_compact_packs_far_chunks_only(self):
+		self.map.dig(0, 0, self.map.width, self.map.height)
+		#4 x 3 chunks, those more than one chunk away from the top left one get packed
+		self.assertEqual(self.map.compact(0, 0, reach = 1), 8)
+		self.assertEqual(sorted(key for (key, chunk) in self.map.chunks.items() if chunk.packed is None), [(0, 0), (0, 1), (1, 0), (1, 1)])
+		self.assertEqual(self.map.compact(0, 0, reach = 1), 0)
+
+	def test_packed_chunks_read_and_write_the_same(self):
+		for i in range(20):
+			(x1, y1, x2, y2) = self.random_rect()
+			self.fill(x1, y1, x2, y2, False, self.random.random() < 0.3, '.')
+		for (x, y) in [(3, 4), (3 * CHUNK_SIZE + 2, 2 * CHUNK_SIZE + 1), (CHUNK_SIZE, CHUNK_SIZE)]:
+			self.map[x][y].explored = True
+			self.expected[(x, y)] = self.expected[(x, y)][:2] + (1,) + self.expected[(x, y)][3:]
+		self.assertEqual(self.map.compact(-10 * CHUNK_SIZE, 0), len(self.map.chunks))
+		self.assertEqual(tiles(self.map), self.expected)
+		#reading unpacked them, write to some after packing them again
+		self.map.compact(-10 * CHUNK_SIZE, 0)
+		self.fill(CHUNK_SIZE - 2, CHUNK_SIZE - 2, CHUNK_SIZE + 2, CHUNK_SIZE + 2, True, True, '#')
+		self.assertEqual(tiles(self.map), self.expected)
+
+if __name__ == '__main__':
+	unittest.main()
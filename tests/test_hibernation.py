@@ -0,0 +1,105 @@
+'''The active zone: only actors near the player take turns, and frozen ones come back caught up.'''
+import random
+import unittest
+
+import rogalik
+
+class Wanderer(object):
+	'''AI that never sleeps, stepping about at random and writing down where the player was each turn.'''
+
+	def __init__(self, log, rng):
+		self.log = log
+		self.rng = rng
+
+	def take_turn(self):
+		player = rogalik.game.player
+		self.log.append(max(abs(self.owner.x - player.x), abs(self.owner.y - player.y)))
+		self.owner.move(self.rng.randint(-1, 1), self.rng.randint(-1, 1))
+
+class ActiveZoneTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 13, width = 200, height = 160, max_rooms = 200)
+		self.game.player.fighter.max_hp = self.game.player.fighter.hp = 10 ** 6
+		self.rng = random.Random(13)
+		self.log = []
+		#wanderers all over the map, awake from the start
+		for room in self.game.rooms:
+			(x, y) = room.center()
+			if not rogalik.is_blocked(x, y):
+				wanderer = rogalik.Object(x, y, 'w', 'wanderer', blocks = True, ai = Wanderer(self.log, self.rng))
+				rogalik.add_object(wanderer)
+				self.game.scheduler.wake(wanderer)
+
+	def tearDown(self):
+		self.game.close()
+
+	def test_only_the_zone_takes_turns(self):
+		game = self.game
+		player = game.player
+		scheduler = game.scheduler
+		radius = scheduler.active_radius
+		far = max(game.rooms, key = lambda room: rogalik.distance(player.x, player.y, *room.center()))
+		path = game.room_graph.find_path(player.x, player.y, *far.center())
+		thawed = 0
+		for (x, y) in path[1:]:
+			for attempt in range(20):
+				if (player.x, player.y) == (x, y):
+					break
+				frozen = len(scheduler.frozen)
+				game.step(('move', x - player.x, y - player.y))
+				thawed += max(0, frozen - len(scheduler.frozen))
+				#nobody near the player is left frozen
+				self.assertEqual([obj for obj in scheduler.frozen if max(abs(obj.x - player.x), abs(obj.y - player.y)) <= radius], [])
+		self.assertTrue(self.log)
+		self.assertLessEqual(max(self.log), radius)
+		self.assertGreater(len(scheduler.frozen), 10)
+		self.assertGreater(thawed, 0)
+
+class CatchUpTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 1)
+		self.scheduler = self.game.scheduler = rogalik.Scheduler(active_radius = 5)
+		player = self.game.player
+		self.kobold = rogalik.Object(player.x + 20, player.y, 'k', 'kobold', ai = rogalik.BasicMelee())
+		self.kobold.ai = rogalik.Confused(self.kobold.ai, num_turns = 10)
+		self.kobold.ai.owner = self.kobold
+		rogalik.add_object(self.kobold)
+		self.scheduler.schedule(self.kobold, 0)
+		self.scheduler.run(rogalik.TURN_TICKS)
+
+	def tearDown(self):
+		self.game.close()
+
+	def bring_near(self):
+		player = self.game.player
+		self.kobold.place(player.x + 2, player.y)
+
+	def test_confusion_wears_off_while_frozen(self):
+		self.assertEqual(list(self.scheduler.frozen), [self.kobold])
+		self.scheduler.run(4 * rogalik.TURN_TICKS)
+		self.bring_near()
+		self.scheduler.thaw(self.game.player.x, self.game.player.y)
+		self.assertEqual(self.kobold.ai.num_turns, 6)
+		self.assertIn(self.kobold, self.scheduler.awake)
+
+	def test_long_freeze_ends_the_confusion(self):
+		self.scheduler.run(30 * rogalik.TURN_TICKS)
+		self.bring_near()
+		self.scheduler.wake(self.kobold)
+		self.assertEqual(self.scheduler.frozen, {})
+		self.assertEqual(self.kobold.ai.num_turns, 0)
+		#its next turn gives it its own mind back
+		self.scheduler.run(31 * rogalik.TURN_TICKS)
+		self.assertIsInstance(self.kobold.ai, rogalik.BasicMelee)
+
+	def test_dead_while_frozen(self):
+		self.kobold.ai = None
+		self.bring_near()
+		self.scheduler.thaw(self.game.player.x, self.game.player.y)
+		self.assertEqual(self.scheduler.frozen, {})
+		self.assertNotIn(self.kobold, self.scheduler.awake)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,103 @@
+'''SpatialIndex queries against a plain scan of every object.'''
+import random
+import unittest
+
+import rogalik
+from rogalik import Object, SpatialIndex, distance
+
+class SpatialIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.random = random.Random(4)
+		self.index = SpatialIndex()
+		self.objects = []
+		for i in range(300):
+			self.add(self.random.randint(0, 99), self.random.randint(0, 59))
+
+	def add(self, x, y):
+		obj = Object(x, y, 'k', 'kobold', blocks = self.random.random() < 0.5)
+		self.index.add(obj)
+		self.objects.append(obj)
+		return obj
+
+	def shuffle(self):
+		#move some around, within the map and a bit past its edges, and take some away
+		for obj in self.random.sample(self.objects, 100):
+			(ox, oy) = (obj.x, obj.y)
+			(obj.x, obj.y) = (self.random.randint(-5, 104), self.random.randint(-5, 64))
+			self.index.relocate(obj, ox, oy)
+		for obj in self.random.sample(self.objects, 50):
+			self.index.remove(obj)
+			self.objects.remove(obj)
+
+	def check_queries(self):
+		for i in range(100):
+			(x, y) = (self.random.randint(-10, 110), self.random.randint(-10, 70))
+			(w, h) = (self.random.randint(1, 30), self.random.randint(1, 30))
+			self.assertEqual(set(self.index.in_rect(x, y, w, h)), set(obj for obj in self.objects if x <= obj.x < x + w and y <= obj.y < y + h))
+			radius = self.random.randint(0, 20)
+			self.assertEqual(set(self.index.in_radius(x, y, radius)), set(obj for obj in self.objects if distance(x, y, obj.x, obj.y) <= radius))
+			self.assertEqual(set(self.index.at(x % 100, y % 60)), set(obj for obj in self.objects if (obj.x, obj.y) == (x % 100, y % 60)))
+			blocker = self.index.blocker_at(x % 100, y % 60)
+			if blocker is None:
+				self.assertFalse([obj for obj in self.objects if (obj.x, obj.y) == (x % 100, y % 60) and obj.blocks])
+			else:
+				self.assertTrue(blocker.blocks)
+				self.assertEqual((blocker.x, blocker.y), (x % 100, y % 60))
+
+	def check_nearest(self, check = None):
+		for i in range(100):
+			(x, y) = (self.random.randint(-10, 110), self.random.randint(-10, 70))
+			(w, h) = (self.random.randint(1, 30), self.random.randint(1, 30))
+			self.assertEqual(set(self.index.in_rect(x, y, w, h)), set(obj for obj in self.objects if x <= obj.x < x + w and y <= obj.y < y + h))
+			max_dist = self.random.choice([0.5, 3, 8, 17.5, 40])
+			found = self.index.nearest(x, y, max_dist, check)
+			near = [distance(x, y, obj.x, obj.y) for obj in self.objects if distance(x, y, obj.x, obj.y) < max_dist and (check is None or check(obj))]
+			if not near:
+				self.assertIs(found, None)
+			else:
+				self.assertEqual(distance(x, y, found.x, found.y), min(near))
+
+	def test_queries(self):
+		self.check_queries()
+
+	def test_queries_after_moves_and_removals(self):
+		self.shuffle()
+		self.check_queries()
+
+	def test_nearest(self):
+		self.check_nearest()
+		self.check_nearest(lambda obj: obj.blocks)
+		self.shuffle()
+		self.check_nearest()
+
+	def test_at_is_a_copy(self):
+		(x, y) = (self.objects[0].x, self.objects[0].y)
+		for obj in self.index.at(x, y):
+			self.index.remove(obj)
+		self.assertEqual(self.index.at(x, y), [])
+
+	def test_relocate_ignores_objects_never_added(self):
+		stray = Object(1, 1)
+		stray.x = 2
+		self.index.relocate(stray, 1, 1)
+		self.assertNotIn(stray, self.index.at(2, 2))
+
+class GameIndexTest(unittest.TestCase):
+
+	def test_everything_placed_is_indexed(self):
+		game = rogalik.Game(seed = 2)
+		index = game.index
+		self.assertEqual(sorted(map(id, game.objects)), sorted(id(obj) for bucket in index.cells.values() for obj in bucket))
+		for obj in game.objects:
+			self.assertIn(obj, index.at(obj.x, obj.y))
+		#the player walking about moves its entry along
+		player = game.player
+		for (dx, dy) in [(1, 0), (0, 1), (-1, 0), (0, -1)] * 3:
+			game.step(('move', dx, dy))
+			self.assertEqual([obj for obj in index.at(player.x, player.y) if obj is player], [player])
+		self.assertEqual(sum(bucket.count(player) for bucket in index.cells.values()), 1)
+		game.close()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,98 @@
+'''Render layers: what ends up on top of a tile, and which layer consoles get redrawn.'''
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+class LayersTest(unittest.TestCase):
+
+	def setUp(self):
+		self.renderer = rogalik.ConsoleRenderer(window = False)
+		self.game = rogalik.Game(self.renderer, seed = 17)
+		player = self.game.player
+		#a free tile next to the player, in sight
+		for (dx, dy) in rogalik.NEIGHBOURS:
+			if not rogalik.is_blocked(player.x + dx, player.y + dy):
+				(self.x, self.y) = (player.x + dx, player.y + dy)
+				break
+		self.renderer.render()
+
+	def tearDown(self):
+		self.game.close()
+
+	def add(self, char, name, **kwargs):
+		obj = rogalik.Object(self.x, self.y, char, name, **kwargs)
+		rogalik.add_object(obj)
+		return obj
+
+	def shown(self, x = None, y = None):
+		'''The character the composed frame has at map tile x, y.'''
+		camera = self.renderer.camera
+		(x, y) = (self.x if x is None else x, self.y if y is None else y)
+		return chr(libtcod.console_get_char(self.renderer.con, x - camera.x, y - camera.y))
+
+	def terrain(self, x = None, y = None):
+		camera = self.renderer.camera
+		(x, y) = (self.x if x is None else x, self.y if y is None else y)
+		return chr(self.renderer.cache.buffer.char[(y - camera.y) * camera.width + x - camera.x])
+
+	def test_order_on_a_tile(self):
+		potion = self.add('!', 'potion', item = rogalik.Item())
+		corpse = self.add('%', 'remains', layer = rogalik.Z_CORPSES)
+		kobold = self.add('k', 'kobold', blocks = True)
+		self.assertEqual((potion.layer, corpse.layer, kobold.layer), (rogalik.Z_ITEMS, rogalik.Z_CORPSES, rogalik.Z_ACTORS))
+		#whatever order they're taken off in, the highest one left shows
+		for (obj, below) in [(kobold, '%'), (corpse, '!'), (potion, self.terrain())]:
+			self.renderer.render()
+			self.assertEqual(self.shown(), obj.char)
+			rogalik.remove_object(obj)
+			self.renderer.render()
+			self.assertEqual(self.shown(), below)
+
+	def test_player_over_other_actors(self):
+		player = self.game.player
+		self.add('k', 'ghost')
+		player.place(self.x, self.y)
+		self.renderer.render()
+		self.assertEqual(self.shown(), '@')
+
+	def test_dying_moves_to_the_corpse_layer(self):
+		#over what was dropped there, under whoever walks over it
+		self.add('!', 'potion', item = rogalik.Item())
+		kobold = self.add('k', 'kobold', blocks = True, fighter = rogalik.Fighter(1, 0, 0, death_function = rogalik.monster_death))
+		self.renderer.render()
+		kobold.fighter.take_damage(5)
+		self.assertEqual(kobold.layer, rogalik.Z_CORPSES)
+		self.renderer.render()
+		self.assertEqual(self.shown(), '%')
+		self.add('k', 'kobold', blocks = True)
+		self.renderer.render()
+		self.assertEqual(self.shown(), 'k')
+
+	def test_only_changed_layers_redrawn(self):
+		kobold = self.add('k', 'kobold', blocks = True)
+		self.renderer.render()
+		cleared = []
+		console_clear = libtcod.console_clear
+		#the panel and the frame are cleared every time, only the layers count
+		libtcod.console_clear = lambda con: (con in self.renderer.layers and cleared.append(con), console_clear(con))
+		try:
+			self.renderer.render()
+			self.assertEqual(cleared, [])
+			kobold.place(self.x, self.y)
+			self.renderer.render()
+			self.assertEqual(cleared, [self.renderer.layers[rogalik.Z_ACTORS]])
+		finally:
+			libtcod.console_clear = console_clear
+
+	def test_empty_tiles_show_the_terrain(self):
+		camera = self.renderer.camera
+		player = self.game.player
+		taken = set((obj.x, obj.y) for obj in self.game.objects if obj.known)
+		for x in range(player.x - 5, player.x + 6):
+			for y in range(player.y - 5, player.y + 6):
+				if camera.in_view(x, y) and (x, y) not in taken:
+					self.assertEqual(self.shown(x, y), self.terrain(x, y), (x, y))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,177 @@
+'''Lighting: the kept shares against lighting every light afresh, and what the renderer draws with them.'''
+import random
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+def lights(lighting):
+	return [light for bucket in lighting.buckets.values() for light in bucket] + lighting.carried
+
+def reference_light(game):
+	'''The light on every tile the player sees, each light's stencil over a fov of its own on a map filled
+	straight from game.map, added up and clamped at 255. A light where the player stands uses the torch's fov.'''
+	(ox, oy) = game.fov_offset
+	size = rogalik.FOV_WINDOW
+	totals = [[0] * (size * size) for channel in range(3)]
+	fov_map = libtcod.map_new(size, size)
+	try:
+		for y in range(size):
+			for x in range(size):
+				if game.map.in_bounds(x + ox, y + oy):
+					libtcod.map_set_properties(fov_map, x, y, not game.map.get('block_sight', x + ox, y + oy), not game.map.get('blocked', x + ox, y + oy))
+		for light in lights(game.lighting):
+			(lx, ly) = light.position()
+			if not (0 <= lx - ox < size and 0 <= ly - oy < size):
+				continue
+			radius = light.radius
+			if (lx, ly) == game.fov_origin and radius <= rogalik.TORCH_RADIUS:
+				radius = rogalik.TORCH_RADIUS
+			libtcod.map_compute_fov(fov_map, lx - ox, ly - oy, radius, rogalik.FOV_LIGHT_WALLS, rogalik.FOV_ALGO)
+			stencil = rogalik.light_stencil(light.radius, light.falloff, light.color)
+			side = 2 * light.radius + 1
+			for dy in range(-light.radius, light.radius + 1):
+				for dx in range(-light.radius, light.radius + 1):
+					(x, y) = (lx - ox + dx, ly - oy + dy)
+					if 0 <= x < size and 0 <= y < size and libtcod.map_is_in_fov(fov_map, x, y):
+						for (total, channel) in zip(totals, stencil):
+							total[y * size + x] += channel[(dy + light.radius) * side + dx + light.radius]
+	finally:
+		libtcod.map_delete(fov_map)
+	return [[min(value, 255) for value in total] for total in totals]
+
+class LightingTest(unittest.TestCase):
+
+	def setUp(self):
+		self.renderer = rogalik.ConsoleRenderer(window = False)
+		self.game = rogalik.Game(self.renderer, seed = 25)
+		self.game.player.fighter.max_hp = self.game.player.fighter.hp = 10 ** 6
+		self.random = random.Random(25)
+
+	def tearDown(self):
+		self.game.close()
+
+	def play(self, turns):
+		'''Random steps and fireballs around the player, rendering after each, yielding the turn.'''
+		game = self.game
+		self.renderer.render()
+		for turn in range(turns):
+			roll = self.random.random()
+			if roll < 0.8:
+				game.step(('move',) + self.random.choice(rogalik.NEIGHBOURS))
+			elif roll < 0.9:
+				game.step(('fireball', (game.player.x + self.random.randint(-3, 3), game.player.y + self.random.randint(-3, 3))))
+			else:
+				game.step(('wait',))
+			self.renderer.render()
+			yield turn
+
+	def assertSameAsAfresh(self, message = None):
+		lighting = self.game.lighting
+		fresh = rogalik.Lighting()
+		try:
+			for light in lights(lighting):
+				fresh.add(light)
+			fresh.update()
+			self.assertEqual((fresh.r, fresh.g, fresh.b), (lighting.r, lighting.g, lighting.b), message)
+		finally:
+			fresh.close()
+
+	def test_same_as_lighting_afresh(self):
+		lighting = self.game.lighting
+		flashed = False
+		for turn in self.play(120):
+			self.assertSameAsAfresh(turn)
+			flashed = flashed or bool(lighting.timed)
+		self.assertTrue(flashed)
+
+	def test_seen_tiles_against_the_reference(self):
+		game = self.game
+		for turn in self.play(40):
+			if turn % 8:
+				continue
+			visible = rogalik.visibility()
+			expected = reference_light(game)
+			for (name, channel, total) in zip('rgb', (game.lighting.r, game.lighting.g, game.lighting.b), expected):
+				self.assertEqual([channel[i] for i in range(len(visible)) if visible[i]], [total[i] for i in range(len(visible)) if visible[i]], (turn, name))
+
+	def test_walls_changing_around_a_still_player(self):
+		#the torch doesn't move, but what it lights does
+		game = self.game
+		player = game.player
+		self.renderer.render()
+		around = [(player.x + dx, player.y + dy) for (dx, dy) in rogalik.NEIGHBOURS if not game.map.get('block_sight', player.x + dx, player.y + dy)]
+		self.assertTrue(around)
+		for block in (True, False):
+			for (x, y) in around:
+				game.map[x][y].block_sight = block
+			rogalik.update_fovmap()
+			game.fov_recompute = True
+			game.step(('wait',))
+			self.renderer.render()
+			self.assertSameAsAfresh(block)
+			visible = rogalik.visibility()
+			for (channel, total) in zip((game.lighting.r, game.lighting.g, game.lighting.b), reference_light(game)):
+				self.assertEqual([channel[i] for i in range(len(visible)) if visible[i]], [total[i] for i in range(len(visible)) if visible[i]], block)
+
+	def test_stencil(self):
+		color = libtcod.Color(200, 100, 50)
+		for (radius, falloff) in [(1, 1.0), (4, 0.5), (8, 2.0)]:
+			side = 2 * radius + 1
+			stencil = rogalik.light_stencil(radius, falloff, color)
+			self.assertIs(rogalik.light_stencil(radius, falloff, color), stencil)
+			for (channel, full) in zip(stencil, color):
+				self.assertEqual(len(channel), side * side)
+				#full at the middle, dying away outwards and nothing past radius
+				self.assertEqual(channel[radius * side + radius], full)
+				for dy in range(-radius, radius + 1):
+					for dx in range(-radius, radius + 1):
+						level = channel[(dy + radius) * side + dx + radius]
+						if dx * dx + dy * dy > radius * radius:
+							self.assertEqual(level, 0)
+						elif dx > 0:
+							self.assertLessEqual(level, channel[(dy + radius) * side + dx - 1 + radius])
+
+	def test_drawn_like_a_full_refresh(self):
+		game = self.game
+		cache = self.renderer.cache
+		layers = ('fore_r', 'fore_g', 'fore_b', 'back_r', 'back_g', 'back_b', 'char')
+		for turn in self.play(60):
+			drawn = [getattr(cache.buffer, name)[:] for name in layers]
+			game.map.render_stale = True
+			cache.refresh()
+			self.assertEqual(drawn, [getattr(cache.buffer, name)[:] for name in layers], turn)
+
+	def test_flashes_go_out(self):
+		game = self.game
+		lighting = game.lighting
+		self.renderer.render()
+		game.step(('fireball', (game.player.x + 1, game.player.y)))
+		self.renderer.render()
+		self.assertEqual(len(lighting.timed), 1)
+		flash = lighting.timed[0]
+		for turn in range(rogalik.FLASH_TURNS + 1):
+			game.step(('wait',))
+			self.renderer.render()
+		self.assertEqual(lighting.timed, [])
+		self.assertNotIn(flash, lights(lighting))
+		self.assertNotIn(flash, lighting.shares)
+
+	def test_nothing_relit_when_nothing_changed(self):
+		game = self.game
+		lighting = game.lighting
+		self.renderer.render()
+		version = lighting.version
+		computed = []
+		map_compute_fov = libtcod.map_compute_fov
+		libtcod.map_compute_fov = lambda *args: (computed.append(args), map_compute_fov(*args))
+		try:
+			lighting.update()
+			self.renderer.render()
+		finally:
+			libtcod.map_compute_fov = map_compute_fov
+		self.assertEqual(computed, [])
+		self.assertEqual(lighting.version, version)
+
+if __name__ == '__main__':
+	unittest.main()
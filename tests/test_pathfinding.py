@@ -0,0 +1,57 @@
+'''RoomGraph.find_path: paths are made of single steps over passable cells and end on the goal.'''
+import random
+import unittest
+
+import rogalik
+
+class FindPathTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.game = rogalik.Game(seed = 2)
+		self.graph = self.game.room_graph
+		self.graph.build()
+		m = self.game.map
+		self.passable = [(x, y) for y in range(m.height) for x in range(m.width) if self.graph.kind[m.index(x, y)]]
+		self.doors = [(i % m.width, i // m.width) for i in m.usable]
+		
+	def tearDown(self):
+		self.game.close()
+		
+	def check_path(self, start, goal):
+		path = self.graph.find_path(start[0], start[1], goal[0], goal[1])
+		self.assertNotEqual(path, None, 'no path from {0} to {1}'.format(start, goal))
+		if start == goal:
+			self.assertEqual(path, [])
+			return
+		self.assertEqual(path[-1], goal)
+		m = self.game.map
+		for (a, b) in zip([start] + path, path):
+			self.assertEqual(max(abs(a[0] - b[0]), abs(a[1] - b[1])), 1, 'step from {0} to {1} on the way from {2} to {3}'.format(a, b, start, goal))
+			self.assertTrue(self.graph.kind[m.index(b[0], b[1])])
+			
+	def test_path_to_a_door(self):
+		#the door ends the corridor walked to it, it's only on the path once
+		self.assertIn((44, 20), self.doors)
+		path = self.graph.find_path(31, 20, 44, 20)
+		self.assertEqual(path[-2:], [(43, 20), (44, 20)])
+		self.check_path((31, 20), (44, 20))
+		
+	def test_paths_to_every_door(self):
+		start = self.game.player.x, self.game.player.y
+		for door in self.doors:
+			self.check_path(start, door)
+			self.check_path(door, start)
+			
+	def test_random_paths(self):
+		rng = random.Random(5)
+		for n in range(500):
+			self.check_path(rng.choice(self.passable), rng.choice(self.passable))
+			
+	def test_no_path_into_walls(self):
+		m = self.game.map
+		wall = next((x, y) for y in range(m.height) for x in range(m.width) if not self.graph.kind[m.index(x, y)])
+		self.assertEqual(self.graph.find_path(self.game.player.x, self.game.player.y, wall[0], wall[1]), None)
+		self.assertEqual(self.graph.find_path(self.game.player.x, self.game.player.y, -1, 0), None)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,124 @@
+'''Perception: what monsters see, against a fov computed from scratch, and when the views get recomputed.'''
+import random
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+def fresh_sight(game, viewer):
+	'''The tiles viewer sees, on a new libtcod map filled straight from game.map over the fov window.'''
+	(ox, oy) = game.fov_offset
+	size = rogalik.FOV_WINDOW
+	fov_map = libtcod.map_new(size, size)
+	try:
+		for y in range(size):
+			for x in range(size):
+				if game.map.in_bounds(x + ox, y + oy):
+					libtcod.map_set_properties(fov_map, x, y, not game.map.get('block_sight', x + ox, y + oy), not game.map.get('blocked', x + ox, y + oy))
+		libtcod.map_compute_fov(fov_map, viewer.x - ox, viewer.y - oy, rogalik.MONSTER_SIGHT, rogalik.FOV_LIGHT_WALLS, rogalik.FOV_ALGO)
+		return set((x + ox, y + oy) for y in range(size) for x in range(size) if libtcod.map_is_in_fov(fov_map, x, y))
+	finally:
+		libtcod.map_delete(fov_map)
+
+class PerceptionTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 15)
+		self.random = random.Random(15)
+		self.perception = self.game.perception
+		#viewers on free tiles around the player, inside the window
+		self.viewers = []
+		player = self.game.player
+		while len(self.viewers) < 6:
+			(x, y) = (player.x + self.random.randint(-15, 15), player.y + self.random.randint(-15, 15))
+			if self.game.map.in_bounds(x, y) and not rogalik.is_blocked(x, y):
+				self.viewers.append(rogalik.Object(x, y, 'k', 'kobold'))
+
+	def tearDown(self):
+		self.game.close()
+
+	def seen_by(self, viewer):
+		(ox, oy) = self.game.fov_offset
+		size = rogalik.FOV_WINDOW
+		return set((x, y) for x in range(ox, ox + size) for y in range(oy, oy + size) if self.perception.sees(viewer, x, y))
+
+	def count_computes(self):
+		computed = []
+		map_compute_fov = libtcod.map_compute_fov
+		def counted(*args):
+			computed.append(args)
+			return map_compute_fov(*args)
+		libtcod.map_compute_fov = counted
+		self.addCleanup(setattr, libtcod, 'map_compute_fov', map_compute_fov)
+		return computed
+
+	def test_same_as_a_fresh_fov(self):
+		for viewer in self.viewers:
+			self.assertEqual(self.seen_by(viewer), fresh_sight(self.game, viewer), (viewer.x, viewer.y))
+
+	def test_outside_the_window(self):
+		(ox, oy) = self.game.fov_offset
+		viewer = self.viewers[0]
+		self.assertFalse(self.perception.sees(viewer, ox - 1, viewer.y))
+		self.assertFalse(self.perception.sees(viewer, viewer.x, oy + rogalik.FOV_WINDOW))
+		far = rogalik.Object(ox + rogalik.FOV_WINDOW, oy, 'k', 'kobold')
+		self.assertFalse(self.perception.sees(far, far.x - 1, far.y))
+
+	def test_standing_still_is_free(self):
+		viewer = self.viewers[0]
+		computed = self.count_computes()
+		self.seen_by(viewer)
+		self.seen_by(viewer)
+		self.assertEqual(len(computed), 1)
+
+	def test_moving_recomputes(self):
+		computed = self.count_computes()
+		seen = []
+		for viewer in self.viewers:
+			self.seen_by(viewer)
+			for (dx, dy) in rogalik.NEIGHBOURS:
+				if not rogalik.is_blocked(viewer.x + dx, viewer.y + dy):
+					viewer.x += dx
+					viewer.y += dy
+					break
+			seen.append(self.seen_by(viewer))
+		self.assertEqual(len(computed), 2 * len(self.viewers))
+		for (viewer, tiles) in zip(self.viewers, seen):
+			self.assertEqual(tiles, fresh_sight(self.game, viewer))
+
+	def test_opacity_change_recomputes(self):
+		game = self.game
+		viewer = self.viewers[0]
+		self.seen_by(viewer)
+		#wall off the tiles right around the viewer, then knock the walls down again
+		around = [(viewer.x + dx, viewer.y + dy) for (dx, dy) in rogalik.NEIGHBOURS if game.map.in_bounds(viewer.x + dx, viewer.y + dy)]
+		for (x, y) in around:
+			game.map[x][y].block_sight = True
+		rogalik.update_fovmap()
+		self.assertEqual(self.seen_by(viewer), fresh_sight(game, viewer))
+		self.assertTrue(self.seen_by(viewer) <= set(around + [(viewer.x, viewer.y)]))
+		for (x, y) in around:
+			game.map[x][y].block_sight = False
+		rogalik.update_fovmap()
+		self.assertEqual(self.seen_by(viewer), fresh_sight(game, viewer))
+
+	def test_pool_reuses_the_least_recently_used(self):
+		perception = rogalik.Perception(size = 3)
+		try:
+			(a, b, c, d) = self.viewers[:4]
+			for viewer in (a, b, c, a, d):
+				perception.look(viewer)
+			#b was used least recently, so d took its map
+			self.assertEqual(list(perception.views), [c, a, d])
+			computed = self.count_computes()
+			perception.look(a)
+			self.assertEqual(computed, [])
+			perception.look(b)
+			self.assertEqual(len(computed), 1)
+			self.assertEqual(len(perception.views), 3)
+		finally:
+			perception.close()
+		self.assertEqual(len(perception.views), 0)
+
+if __name__ == '__main__':
+	unittest.main()
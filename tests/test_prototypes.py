@@ -0,0 +1,61 @@
+'''libtcodpy's declared ctypes prototypes: handles, bools, floats and Colors coming back as they should.'''
+import unittest
+
+import libtcodpy as libtcod
+
+def setUpModule():
+	libtcod.console_set_custom_font('resource/celtic_garamond_10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
+
+class PrototypesTest(unittest.TestCase):
+
+	def test_declared_when_looked_up(self):
+		for (name, (restype, argtypes)) in sorted(libtcod._PROTOTYPES.items()):
+			try:
+				function = getattr(libtcod._lib, name)
+			except AttributeError:
+				#left out of this build
+				continue
+			self.assertEqual(function.restype, restype, name)
+			if name in libtcod._FAST_CALLS:
+				self.assertEqual(function.argtypes, argtypes[:1], name)
+			elif argtypes is not None and not (libtcod.MINGW or libtcod.MSVC):
+				self.assertEqual(function.argtypes, argtypes, name)
+
+	def test_handles_survive(self):
+		#with handles coming back as C ints, pointers past 4GB lost their top half and the calls made
+		#with them crashed. a few dozen of each, so some land high enough
+		consoles = [libtcod.console_new(3, 2) for i in range(40)]
+		maps = [libtcod.map_new(3, 2) for i in range(40)]
+		try:
+			for (i, (con, m)) in enumerate(zip(consoles, maps)):
+				libtcod.console_put_char(con, i % 3, 1, 65 + i)
+				libtcod.map_set_properties(m, i % 3, 1, True, i % 2 == 0)
+			for (i, (con, m)) in enumerate(zip(consoles, maps)):
+				self.assertEqual(libtcod.console_get_char(con, i % 3, 1), 65 + i)
+				self.assertEqual(bool(libtcod.map_is_walkable(m, i % 3, 1)), i % 2 == 0)
+				self.assertTrue(libtcod.map_is_transparent(m, i % 3, 1))
+		finally:
+			for con in consoles:
+				libtcod.console_delete(con)
+			for m in maps:
+				libtcod.map_delete(m)
+
+	def test_results_come_back_typed(self):
+		self.assertIsInstance(libtcod.console_get_fade(), int)
+		self.assertEqual(tuple(libtcod.color_lerp(libtcod.Color(0, 0, 0), libtcod.Color(200, 100, 50), 0.5)), (100, 50, 25))
+		hm = libtcod.heightmap_new(4, 4)
+		try:
+			libtcod.heightmap_set_value(hm, 1, 1, 3.0)
+			self.assertIsInstance(libtcod.heightmap_get_slope(hm, 1, 1), float)
+			self.assertEqual(libtcod.heightmap_get_value(hm, 1, 1), 3.0)
+		finally:
+			libtcod.heightmap_delete(hm)
+		rng = libtcod.random_new_from_seed(5)
+		try:
+			self.assertTrue(0.0 <= libtcod.random_get_float(rng, 0.0, 1.0) <= 1.0)
+			self.assertEqual(libtcod.random_get_int(rng, 7, 7), 7)
+		finally:
+			libtcod.random_delete(rng)
+
+if __name__ == '__main__':
+	unittest.main()
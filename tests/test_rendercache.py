@@ -0,0 +1,134 @@
+'''RenderCache: the terrain it keeps drawn, tile by tile against the map, through steps, doors and edits.'''
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+def expected_terrain(game, camera):
+	'''(fore_r, fore_g, fore_b, char) the camera should show, worked out a tile at a time from the map, the
+	fov and the light: blank until explored, dark out of sight, dark to lit by the light on a seen tile.'''
+	visible = rogalik.visibility()
+	lighting = game.lighting
+	(ox, oy) = game.fov_offset
+	layers = ([], [], [], [])
+	for y in range(camera.y, camera.y + camera.height):
+		for x in range(camera.x, camera.x + camera.width):
+			fore = (0, 0, 0)
+			char = ord(' ')
+			if game.map.in_bounds(x, y) and game.map.get('explored', x, y):
+				wall = game.map.get('block_sight', x, y)
+				dark = (rogalik.color_dark_wall if wall else rogalik.color_dark_ground)
+				lit = (rogalik.color_lit_wall if wall else rogalik.color_lit_ground)
+				fore = tuple(dark)
+				j = (y - oy) * rogalik.FOV_WINDOW + x - ox
+				if 0 <= x - ox < rogalik.FOV_WINDOW and 0 <= y - oy < rogalik.FOV_WINDOW and visible[j]:
+					light = (lighting.r[j], lighting.g[j], lighting.b[j])
+					fore = tuple(d + (l - d) * level // 255 for (d, l, level) in zip(dark, lit, light))
+				char = game.map.get('glyph', x, y)
+			for (layer, value) in zip(layers, fore + (char,)):
+				layer.append(value)
+	return [list(layer) for layer in layers]
+
+class RenderCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.renderer = rogalik.ConsoleRenderer(window = False)
+		self.game = rogalik.Game(self.renderer, seed = 3, width = 150, height = 100, max_rooms = 100)
+		self.game.player.fighter.max_hp = self.game.player.fighter.hp = 10 ** 6
+		self.cache = self.renderer.cache
+
+	def tearDown(self):
+		self.game.close()
+
+	def drawn(self):
+		return [list(getattr(self.cache.buffer, name)) for name in ('fore_r', 'fore_g', 'fore_b', 'char')]
+
+	def assertDrawn(self, message = None):
+		self.assertEqual(self.drawn(), expected_terrain(self.game, self.renderer.camera), message)
+
+	def test_walking_to_the_farthest_room(self):
+		#the camera scrolls along the way
+		game = self.game
+		player = game.player
+		far = max(game.rooms, key = lambda room: rogalik.distance(player.x, player.y, *room.center()))
+		path = game.room_graph.find_path(player.x, player.y, *far.center())
+		views = set()
+		for (n, (x, y)) in enumerate(path[1:]):
+			#a monster or a closed door in the way takes a few turns
+			for attempt in range(50):
+				if (player.x, player.y) == (x, y):
+					break
+				game.step(('move', x - player.x, y - player.y))
+				self.renderer.render()
+			views.add(self.cache.view)
+			if n % 5 == 0:
+				self.assertDrawn(n)
+		self.assertDrawn()
+		self.assertGreater(len(views), 2)
+
+	def test_tiles_changed_in_view(self):
+		#a door opening and tiles edited under the player's nose are redrawn without a full refresh
+		game = self.game
+		self.renderer.render()
+		camera = self.renderer.camera
+		player = game.player
+		for (dx, dy) in rogalik.NEIGHBOURS:
+			tile = game.map[player.x + dx][player.y + dy]
+			tile.symbol = '%'
+			tile.block_sight = not tile.block_sight
+		game.map[camera.x + 1][camera.y + 1].explored = True
+		doors = [(i % game.map.width, i // game.map.width) for i in game.map.usable]
+		doors = [(x, y) for (x, y) in doors if camera.x <= x < camera.x + camera.width and camera.y <= y < camera.y + camera.height]
+		for (x, y) in doors:
+			game.map[x][y].explored = True
+			game.map[x][y].usable.activate()
+		rogalik.update_fovmap()
+		game.fov_recompute = True
+		redrawn = []
+		draw_rect = self.cache.draw_rect
+		self.cache.draw_rect = lambda *rect: (redrawn.append(rect), draw_rect(*rect))
+		self.renderer.render()
+		self.assertDrawn()
+		self.assertNotIn((camera.x, camera.y, camera.x + camera.width, camera.y + camera.height), redrawn)
+
+	def test_explored_from_outside(self):
+		#marking a tile explored away from the renderer, like a map would, shows it on the next frame
+		m = self.game.map
+		self.renderer.render()
+		camera = self.renderer.camera
+		(x, y) = min((x, y) for y in range(camera.y, camera.y + camera.height) for x in range(camera.x, camera.x + camera.width)
+			if not m.get('explored', x, y) and not m.get('blocked', x, y))
+		m[x][y].explored = True
+		self.renderer.render()
+		self.assertEqual(libtcod.console_get_char(self.renderer.con, x - camera.x, y - camera.y), ord('.'))
+		self.assertDrawn()
+
+	def test_bulk_edit(self):
+		game = self.game
+		self.renderer.render()
+		camera = self.renderer.camera
+		game.map.fill_rect(camera.x, camera.y, camera.x + 10, camera.y + 10, True, True, '&')
+		self.renderer.render()
+		self.assertDrawn()
+		self.assertFalse(game.map.render_stale)
+
+	def test_nothing_drawn_when_nothing_changed(self):
+		self.renderer.render()
+		redrawn = []
+		blitted = []
+		draw_rect = self.cache.draw_rect
+		self.cache.draw_rect = lambda *rect: (redrawn.append(rect), draw_rect(*rect))
+		blit = self.cache.buffer.blit
+		self.cache.buffer.blit = lambda con: (blitted.append(con), blit(con))
+		self.renderer.render()
+		self.assertEqual((redrawn, blitted), ([], []))
+
+	def test_console_gets_the_buffer(self):
+		self.renderer.render()
+		camera = self.renderer.camera
+		con = self.cache.con
+		chars = [libtcod.console_get_char(con, x, y) for y in range(camera.height) for x in range(camera.width)]
+		self.assertEqual(chars, list(self.cache.buffer.char))
+
+if __name__ == '__main__':
+	unittest.main()
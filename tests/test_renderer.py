@@ -0,0 +1,58 @@
+'''The offscreen ConsoleRenderer: it draws without a window and gives back every console it made.'''
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+class ConsoleLeakTest(unittest.TestCase):
+
+	def setUp(self):
+		#every console made and deleted from here on, by handle
+		self.made = []
+		self.deleted = []
+		(self.console_new, self.console_delete) = (libtcod.console_new, libtcod.console_delete)
+		def console_new(w, h):
+			con = self.console_new(w, h)
+			self.made.append(con)
+			return con
+		def console_delete(con):
+			self.deleted.append(con)
+			self.console_delete(con)
+		libtcod.console_new = console_new
+		libtcod.console_delete = console_delete
+
+	def tearDown(self):
+		libtcod.console_new = self.console_new
+		libtcod.console_delete = self.console_delete
+
+	def test_game_close_deletes_every_console(self):
+		game = rogalik.Game(rogalik.ConsoleRenderer(window = False), seed = 1)
+		game.renderer.render()
+		game.step(('move', 1, 0))
+		game.renderer.render()
+		self.assertTrue(self.made)
+		game.close()
+		self.assertEqual(sorted(self.deleted), sorted(self.made))
+		self.assertNotIn(0, self.deleted)
+
+	def test_close_twice(self):
+		renderer = rogalik.ConsoleRenderer(window = False)
+		game = rogalik.Game(renderer, seed = 2)
+		game.close()
+		renderer.close()
+		self.assertEqual(sorted(self.deleted), sorted(self.made))
+
+	def test_new_game_on_the_same_renderer(self):
+		renderer = rogalik.ConsoleRenderer(window = False)
+		rogalik.Game(renderer, seed = 2)
+		game = rogalik.Game(renderer, seed = 3)
+		game.close()
+		self.assertEqual(sorted(self.deleted), sorted(self.made))
+
+	def test_null_renderer(self):
+		game = rogalik.Game(seed = 3)
+		game.close()
+		self.assertEqual(self.made, [])
+
+if __name__ == '__main__':
+	unittest.main()
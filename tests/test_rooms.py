@@ -0,0 +1,66 @@
+'''Room placement: RoomGrid overlap tests and Rect borders against checking every room and tile.'''
+import random
+import unittest
+
+import rogalik
+from rogalik import Rect, RoomGrid
+
+def scanned_borders(room):
+	'''Rect.borders as it used to be: every tile of the bounding box that isn't inside the room.'''
+	return [(x, y) for x in range(room.x1, room.x2 + 1) for y in range(room.y1, room.y2 + 1) if (x, y) not in room]
+
+class RoomGridTest(unittest.TestCase):
+
+	def setUp(self):
+		self.random = random.Random(10)
+
+	def random_room(self, width = 200, height = 150):
+		w = self.random.randint(rogalik.ROOM_MIN_SIZE, rogalik.ROOM_MAX_SIZE)
+		h = self.random.randint(rogalik.ROOM_MIN_SIZE, rogalik.ROOM_MAX_SIZE)
+		return Rect(self.random.randint(0, width - w - 1), self.random.randint(0, height - h - 1), w, h)
+
+	def test_intersects_and_room_at(self):
+		grid = RoomGrid()
+		rooms = []
+		for i in range(2000):
+			room = self.random_room()
+			overlapping = any(room.intersect(other) for other in rooms)
+			self.assertEqual(grid.intersects(room), overlapping)
+			if not overlapping:
+				grid.add(room)
+				rooms.append(room)
+		self.assertGreater(len(rooms), 50)
+		for i in range(3000):
+			(x, y) = (self.random.randint(0, 199), self.random.randint(0, 149))
+			owners = [room for room in rooms if room.x1 <= x <= room.x2 and room.y1 <= y <= room.y2]
+			self.assertEqual(grid.room_at(x, y), owners[0] if owners else None)
+
+	def test_touching_rooms_intersect(self):
+		#a shared wall counts, on grid cell borders too
+		grid = RoomGrid()
+		grid.add(Rect(10, 10, rogalik.ROOM_GRID_SIZE - 10, 8))
+		self.assertTrue(grid.intersects(Rect(rogalik.ROOM_GRID_SIZE, 12, 6, 6)))
+		self.assertFalse(grid.intersects(Rect(rogalik.ROOM_GRID_SIZE + 1, 12, 6, 6)))
+
+	def test_borders(self):
+		for i in range(200):
+			room = self.random_room()
+			self.assertEqual(room.borders(), scanned_borders(room))
+
+class MakeMapTest(unittest.TestCase):
+
+	def test_rooms_never_overlap(self):
+		for (seed, width, height, max_rooms) in [(1, 80, 43, 30), (2, 200, 200, 400), (3, 300, 120, 500)]:
+			game = rogalik.Game(seed = seed, width = width, height = height, max_rooms = max_rooms)
+			rooms = game.rooms
+			try:
+				self.assertGreater(len(rooms), 5)
+				for (i, room) in enumerate(rooms):
+					self.assertTrue(0 <= room.x1 and room.x2 < width and 0 <= room.y1 and room.y2 < height)
+					for other in rooms[i + 1:]:
+						self.assertFalse(room.intersect(other), (seed, i))
+			finally:
+				game.close()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,159 @@
+'''Scheduler: turn order by speed, freezing and thawing far from the player, and monsters waking up.'''
+import unittest
+
+import rogalik
+
+class Recorder(object):
+	'''AI that writes down who acted at which tick.'''
+
+	def __init__(self, log, reply = None):
+		self.log = log
+		self.reply = reply
+		self.missed = 0
+
+	def take_turn(self):
+		self.log.append((self.owner.name, rogalik.game.scheduler.time))
+		return self.reply
+
+	def catch_up(self, turns):
+		self.missed += turns
+
+class SchedulerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 1)
+		self.scheduler = self.game.scheduler = rogalik.Scheduler(active_radius = 5)
+		self.log = []
+
+	def tearDown(self):
+		self.game.close()
+
+	def actor(self, name, dx = 0, dy = 0, speed = rogalik.NORMAL_SPEED, reply = None):
+		player = self.game.player
+		obj = rogalik.Object(player.x + dx, player.y + dy, 'k', name, speed = speed, ai = Recorder(self.log, reply))
+		rogalik.add_object(obj)
+		return obj
+
+	def test_faster_actors_act_more_often_in_time_order(self):
+		slow = self.actor('slow')
+		fast = self.actor('fast', speed = rogalik.NORMAL_SPEED * 2)
+		self.scheduler.schedule(slow, 0)
+		self.scheduler.schedule(fast, 0)
+		self.scheduler.run(2 * rogalik.TURN_TICKS)
+		half = rogalik.TURN_TICKS // 2
+		self.assertEqual(self.log, [('slow', 0), ('fast', 0), ('fast', half), ('slow', 2 * half), ('fast', 2 * half), ('fast', 3 * half)])
+
+	def test_sleeping_actors_wait_to_be_woken(self):
+		sleeper = self.actor('sleeper', reply = 'sleep')
+		self.scheduler.schedule(sleeper, 0)
+		self.scheduler.run(3 * rogalik.TURN_TICKS)
+		self.assertEqual(self.log, [('sleeper', 0)])
+		self.scheduler.wake(sleeper)
+		self.scheduler.wake(sleeper)
+		self.scheduler.run(4 * rogalik.TURN_TICKS)
+		self.assertEqual(self.log, [('sleeper', 0), ('sleeper', 3 * rogalik.TURN_TICKS)])
+
+	def test_dead_actors_drop_out(self):
+		victim = self.actor('victim')
+		self.scheduler.schedule(victim, 0)
+		victim.ai = None
+		self.assertEqual(self.scheduler.run(3 * rogalik.TURN_TICKS), 0)
+		self.assertEqual(self.scheduler.awake, {})
+
+	def test_freezing_and_thawing_agree_at_the_corners(self):
+		player = self.game.player
+		near = self.actor('near', 5, 5)
+		far = self.actor('far', 6, -6)
+		self.scheduler.schedule(near, 0)
+		self.scheduler.schedule(far, 0)
+		self.scheduler.run(rogalik.TURN_TICKS)
+		self.assertEqual(self.log, [('near', 0)])
+		self.assertEqual(list(self.scheduler.frozen), [far])
+		#the player steps towards it: now it's as close as near was, which never froze
+		(player.x, player.y) = (player.x + 1, player.y - 1)
+		self.scheduler.thaw(player.x, player.y)
+		self.assertEqual(self.scheduler.frozen, {})
+		self.scheduler.run(3 * rogalik.TURN_TICKS)
+		self.assertEqual(far.ai.missed, 1)
+		self.assertEqual(self.log.count(('far', rogalik.TURN_TICKS)), 1)
+
+	def test_thaw_leaves_actors_further_away(self):
+		far = self.actor('far', 0, 6)
+		self.scheduler.schedule(far, 0)
+		self.scheduler.run(rogalik.TURN_TICKS)
+		self.scheduler.thaw(self.game.player.x, self.game.player.y)
+		self.assertEqual(list(self.scheduler.frozen), [far])
+
+class WakeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 2)
+
+	def tearDown(self):
+		self.game.close()
+
+	def monsters(self):
+		return [obj for obj in self.game.objects if obj.ai is not None and obj is not self.game.player]
+
+	def test_perception_decides_who_wakes(self):
+		#whatever Perception answers goes, even where the player's own fov disagrees
+		game = self.game
+		player = game.player
+		monsters = self.monsters()
+		for monster in monsters:
+			game.scheduler.sleep(monster)
+		(blind, watcher) = (monsters[0], monsters[1])
+		for (dx, dy) in rogalik.NEIGHBOURS:
+			if not rogalik.is_blocked(player.x + dx, player.y + dy):
+				blind.place(player.x + dx, player.y + dy)
+				break
+		#in a corner of its sight, too far away for the player's torch
+		sight = rogalik.MONSTER_SIGHT
+		watcher.place(player.x + (sight if player.x < game.map.width // 2 else -sight), player.y + (sight if player.y < game.map.height // 2 else -sight))
+		self.assertFalse(rogalik.in_fov(watcher.x, watcher.y))
+		sees = game.perception.sees
+		game.perception.sees = lambda viewer, x, y: viewer is watcher
+		try:
+			game.wake_watchers()
+		finally:
+			game.perception.sees = sees
+		self.assertEqual([monster for monster in monsters if monster in game.scheduler.awake], [watcher])
+
+	def test_monsters_that_see_the_player_wake(self):
+		game = self.game
+		player = game.player
+		for monster in self.monsters():
+			game.scheduler.sleep(monster)
+		game.wake_watchers()
+		for monster in self.monsters():
+			self.assertEqual(monster in game.scheduler.awake, game.perception.sees(monster, player.x, player.y))
+
+	def test_checked_while_the_player_waits(self):
+		#the player's fov stays as it was, a monster coming to see them wakes all the same
+		game = self.game
+		watcher = self.monsters()[0]
+		for monster in self.monsters():
+			game.scheduler.sleep(monster)
+		sees = game.perception.sees
+		game.perception.sees = lambda viewer, x, y: viewer is watcher and max(abs(viewer.x - x), abs(viewer.y - y)) <= rogalik.MONSTER_SIGHT
+		try:
+			watcher.place(game.player.x + rogalik.MONSTER_SIGHT, game.player.y)
+			game.step(('wait',))
+			self.assertFalse(game.fov_recompute)
+			self.assertIn(watcher, game.scheduler.awake)
+		finally:
+			game.perception.sees = sees
+
+	def test_awake_means_seeing_the_player(self):
+		#after every turn, the monsters awake are the ones that could see the player when it ended
+		game = self.game
+		for turn in range(60):
+			game.step(('move', 1, 0) if turn % 20 < 10 else ('move', -1, 0))
+			player = game.player
+			for monster in self.monsters():
+				if monster in game.scheduler.awake:
+					continue
+				self.assertFalse(game.perception.sees(monster, player.x, player.y), (turn, monster.x, monster.y))
+
+if __name__ == '__main__':
+	unittest.main()
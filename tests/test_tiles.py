@@ -0,0 +1,79 @@
+'''The map's layers on a real level: rooms, doors that open when walked into, and is_blocked.'''
+import unittest
+
+import libtcodpy as libtcod
+import rogalik
+
+class LevelTest(unittest.TestCase):
+
+	def setUp(self):
+		self.game = rogalik.Game(seed = 1)
+		self.map = self.game.map
+
+	def tearDown(self):
+		self.game.close()
+
+	def doors(self):
+		return sorted((i % self.map.width, i // self.map.width) for (i, usable) in self.map.usable.items() if usable.use_function is rogalik.open_door)
+
+	def test_rooms_are_dug(self):
+		for room in self.game.rooms:
+			for x in range(room.x1 + 1, room.x2):
+				for y in range(room.y1 + 1, room.y2):
+					tile = self.map[x][y]
+					self.assertEqual((tile.blocked, tile.block_sight, tile.symbol), (False, False, '.'), (x, y))
+
+	def test_doors(self):
+		doors = self.doors()
+		self.assertTrue(doors)
+		for (x, y) in doors:
+			tile = self.map[x][y]
+			self.assertEqual((tile.blocked, tile.block_sight, tile.symbol), (True, True, '+'))
+			self.assertEqual((tile.usable.owner.x, tile.usable.owner.y), (x, y))
+
+	def test_door_opens(self):
+		game = self.game
+		(x, y) = self.doors()[0]
+		self.map.fov_dirty.clear()
+		self.map.render_dirty.clear()
+		self.map[x][y].usable.activate()
+		tile = self.map[x][y]
+		self.assertEqual((tile.blocked, tile.block_sight, tile.symbol, tile.usable), (False, False, '\'', None))
+		self.assertNotIn((x, y), self.doors())
+		self.assertIn(self.map.index(x, y), self.map.render_dirty)
+		#update_fovmap already sent it over
+		self.assertEqual(self.map.fov_dirty, set())
+		(ox, oy) = game.fov_offset
+		if 0 <= x - ox < rogalik.FOV_WINDOW and 0 <= y - oy < rogalik.FOV_WINDOW:
+			self.assertTrue(libtcod.map_is_transparent(game.fov_map, x - ox, y - oy))
+
+	def test_walking_into_a_door(self):
+		game = self.game
+		(x, y) = self.doors()[0]
+		#stand the player next to it, on the side that's free
+		for (dx, dy) in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+			if not rogalik.is_blocked(x + dx, y + dy):
+				game.player.place(x + dx, y + dy)
+				break
+		game.step(('move', -dx, -dy))
+		self.assertFalse(self.map[x][y].blocked)
+		self.assertEqual((game.player.x, game.player.y), (x + dx, y + dy))
+
+	def test_is_blocked(self):
+		blockers = set((obj.x, obj.y) for obj in self.game.objects if obj.blocks)
+		for x in range(-1, self.map.width + 1):
+			for y in range(-1, self.map.height + 1):
+				expected = not self.map.in_bounds(x, y) or self.map[x][y].blocked or (x, y) in blockers
+				self.assertEqual(rogalik.is_blocked(x, y), expected, (x, y))
+
+	def test_tile_assignment(self):
+		#a Tile assigned through map[x][y] lands in every layer, and views see it
+		(x, y) = (1, 1)
+		self.map[x][y] = rogalik.Tile(False, True, '=')
+		self.assertEqual((self.map.get('blocked', x, y), self.map.get('block_sight', x, y)), (0, 1))
+		self.assertEqual(self.map[x][y].symbol, '=')
+		self.map[x][y] = rogalik.Tile(True)
+		self.assertEqual((self.map[x][y].blocked, self.map[x][y].block_sight, self.map[x][y].symbol), (True, True, '&'))
+
+if __name__ == '__main__':
+	unittest.main()